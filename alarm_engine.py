@@ -0,0 +1,199 @@
+# file: alarm_engine.py (控制器内的报警与联锁规则)
+'''
+在控制器进程中按轮询速率检查报警条件，触发时直接执行联锁动作 (停泵、通道电压归零、急停)，
+不经过 UI 往返。以前柱塞泵超压、电源通道过流只能靠人盯着曲线发现。
+
+规则写在设备配置的 "alarms" 列表中 (system_config.json)，例如:
+
+    "alarms": [
+        {"name": "超压", "field": "pressure_mpa", "above": 20.0, "for_seconds": 0.5,
+         "actions": ["stop", "zero_voltage:gpd_power_1:1"]},
+        {"field": "ch1_current", "rate_above": 0.5, "actions": ["zero_voltage"]}
+    ]
+
+    - 条件: above / below 为阈值，rate_above / rate_below 为变化率 (字段单位每秒，由相邻两次读取的 t_ns 计算)；
+      一条规则只写一种条件。for_seconds 为条件需要持续的时间 (默认 0，第一次满足即触发)；
+    - 动作: "stop" 停止泵，"zero_voltage" 把电源通道电压归零 (通道取自字段名 chN_，没有时两个通道都归零)，
+      "stop_all" 急停整个系统集；"动作:设备id[:通道]" 作用于其它设备；也可以直接写完整的指令字典；
+    - 触发后锁存，条件解除后才会再次触发；对规则所在设备或其联锁目标重新下发启动/设定指令也会解除锁存
+      (例如超压停泵后在仍超压时重新启动泵，下一个样本就会再次停泵)。
+
+规则在创建控制器时编译为按设备分组的扁平列 (字段下标、比较符号、限值、持续时间)，每个新样本到达时
+对该设备的全部规则一次性求值。控制器进程不导入 NumPy (启动时间)，列以 Python 列表保存。
+从检测 (样本读取完成) 到联锁动作执行完毕的时间逐次测量，写入报警事件与日志。
+'''
+
+import re
+from typing import NamedTuple
+
+import driver_registry
+from device_registry import ConfigError
+
+CONDITION_KEYS = {'above': (False, 1.0), 'below': (False, -1.0), 'rate_above': (True, 1.0), 'rate_below': (True, -1.0)}
+_CHANNEL_FIELD = re.compile(r'^ch(\d+)_')
+
+
+class AlarmRule(NamedTuple):
+    name: str
+    device_id: str
+    field: str
+    is_rate: bool
+    sign: float              # +1: 值 > 限值 时满足；-1: 值 < 限值 时满足
+    limit: float
+    hold: float              # 条件需要持续的秒数
+    actions: tuple           # 指令字典 (与 UI 发送的指令格式相同)
+
+    def describe(self, value):
+        what = "变化率" if self.is_rate else "值"
+        return f"{self.device_id}.{self.field} {what} {value:.4g} {'>' if self.sign > 0 else '<'} {self.limit:g}"
+
+
+def _expand_action(action, rule_device, field, kinds, problems, where):
+    """把一个动作写法展开为指令字典列表。"""
+    if isinstance(action, dict):
+        if 'type' not in action: problems.append(f"{where}: 指令字典缺少 'type'"); return []
+        return [action]
+    verb, _, rest = str(action).partition(':')
+    target, _, channel = rest.partition(':')
+    target = target or rule_device
+    if verb == 'stop_all': return [{'type': 'stop_all'}]
+    kind = kinds.get(target)
+    if kind is None: problems.append(f"{where}: 动作 {action} 的目标设备 {target} 不在本系统集中"); return []
+    if verb == 'stop':
+        if kind != driver_registry.KIND_PUMP: problems.append(f"{where}: {target} 不是泵，不能执行 stop"); return []
+        return [{'type': 'stop_pump', 'params': {'pump_id': target}}]
+    if verb == 'zero_voltage':
+        if kind != driver_registry.KIND_POWER_SUPPLY: problems.append(f"{where}: {target} 不是电源，不能执行 zero_voltage"); return []
+        if not channel and target == rule_device:
+            match = _CHANNEL_FIELD.match(field)
+            channel = match.group(1) if match else ''
+        channels = [int(channel)] if channel else [1, 2]
+        return [{'type': 'set_channel_output', 'params': {'device_id': target, 'channel': ch, 'enable': False}} for ch in channels]
+    problems.append(f"{where}: 未知的动作 {action}")
+    return []
+
+
+def parse_rules(device_configs):
+    """
+    从设备配置的 "alarms" 中读取并校验规则。
+
+    :raises ConfigError: 规则写法有误 (列出全部问题)。
+    """
+    kinds = {}
+    for config in device_configs:
+        spec = driver_registry.find_driver(config)
+        if spec is not None: kinds[config['id']] = spec.kind
+    rules, problems = [], []
+    for config in device_configs:
+        fields = {name for name, _ in (driver_registry.status_fields(config) or ())}
+        for n, raw in enumerate(config.get('alarms') or ()):
+            name = raw.get('name') or f"{config['id']}#{n + 1}"
+            where = f"设备 {config['id']} 的报警规则 {name}"
+            field = raw.get('field')
+            if field not in fields: problems.append(f"{where}: 设备没有状态字段 {field}"); continue
+            conditions = [key for key in CONDITION_KEYS if key in raw]
+            if len(conditions) != 1: problems.append(f"{where}: 需要且只能有一个条件 ({' / '.join(CONDITION_KEYS)})"); continue
+            is_rate, sign = CONDITION_KEYS[conditions[0]]
+            actions = raw.get('actions') or []
+            if isinstance(actions, (str, dict)): actions = [actions]
+            commands = [command for action in actions for command in _expand_action(action, config['id'], field, kinds, problems, where)]
+            try:
+                limit = float(raw[conditions[0]]); hold = float(raw.get('for_seconds', 0.0))
+            except (TypeError, ValueError):
+                problems.append(f"{where}: 限值和 for_seconds 必须是数字"); continue
+            rules.append(AlarmRule(name, config['id'], field, is_rate, sign, limit, hold, tuple(commands)))
+    if problems: raise ConfigError(problems)
+    return rules
+
+
+class _DeviceRules:
+    """一台设备的规则，编译为扁平列；状态 (上一样本、条件开始时间、锁存) 也按列保存。"""
+    __slots__ = ('rules', 'fields', 'src', 'is_rate', 'sign', 'limit', 'hold', 'prev_value', 'prev_t', 'since', 'latched')
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.fields = list(dict.fromkeys(rule.field for rule in rules))
+        index = {name: i for i, name in enumerate(self.fields)}
+        self.src = [index[rule.field] for rule in rules]
+        self.is_rate = [rule.is_rate for rule in rules]
+        self.sign = [rule.sign for rule in rules]
+        self.limit = [rule.sign * rule.limit for rule in rules]       # 预乘符号：条件统一为 sign * x > limit
+        self.hold = [rule.hold for rule in rules]
+        self.prev_value = [None] * len(self.fields)
+        self.prev_t = None
+        self.since = [None] * len(rules)
+        self.latched = [False] * len(rules)
+
+    def evaluate(self, status, t):
+        values = [status.get(name) for name in self.fields]
+        prev_t = self.prev_t; dt = (t - prev_t) if prev_t is not None else 0.0
+        rates = [(v - p) / dt if dt > 0 and v is not None and p is not None else None for v, p in zip(values, self.prev_value)]
+        self.prev_value = values; self.prev_t = t
+        fired = []
+        since, latched = self.since, self.latched
+        for i, (src, is_rate, sign, limit, hold) in enumerate(zip(self.src, self.is_rate, self.sign, self.limit, self.hold)):
+            x = rates[src] if is_rate else values[src]
+            if x is None or x != x or not sign * x > limit:
+                since[i] = None; latched[i] = False; continue
+            if since[i] is None: since[i] = t
+            if not latched[i] and t - since[i] >= hold:
+                latched[i] = True; fired.append((self.rules[i], float(x)))
+        return fired
+
+
+class AlarmEngine:
+    """
+    控制器的报警规则集合。
+
+    :param rules: AlarmRule 列表 (通常由 from_device_configs 读取)。
+    """
+    def __init__(self, rules):
+        self.rules = list(rules)
+        grouped = {}
+        for rule in self.rules: grouped.setdefault(rule.device_id, []).append(rule)
+        self._devices = {dev_id: _DeviceRules(rules) for dev_id, rules in grouped.items()}
+        # 设备 -> [(该设备的规则组, 规则下标), ...]：规则所在设备与联锁动作的目标设备；None 下为含 stop_all 的规则 (任何设备都解除)
+        self._targets = {}
+        for dev_rules in self._devices.values():
+            for i, rule in enumerate(dev_rules.rules):
+                targets = {rule.device_id}
+                for command in rule.actions:
+                    params = command.get('params') or {}
+                    if command['type'] == 'stop_all': targets.add(None)
+                    elif params.get('pump_id') or params.get('device_id'): targets.add(params.get('pump_id') or params.get('device_id'))
+                for target in targets: self._targets.setdefault(target, []).append((dev_rules, i))
+        self.fired = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0             # 检测到动作完成的最大耗时 (秒)
+        self._total_latency = 0.0
+
+    @classmethod
+    def from_device_configs(cls, device_configs):
+        return cls(parse_rules(device_configs))
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def evaluate(self, device_id, status, t):
+        """
+        用设备的一个新样本求值。
+
+        :param t: 样本的单调时间 (秒)。
+        :return: 本次新触发的 [(AlarmRule, 触发值), ...]。
+        """
+        rules = self._devices.get(device_id)
+        return rules.evaluate(status, t) if rules is not None else []
+
+    def rearm(self, device_id):
+        """设备收到新的启动/设定指令：解除作用于该设备的规则的锁存，条件仍满足时下一个样本再次触发。"""
+        for key in (device_id, None):
+            for dev_rules, i in self._targets.get(key, ()): dev_rules.latched[i] = False
+
+    def record_latency(self, seconds):
+        self.fired += 1
+        self.last_latency = seconds; self.max_latency = max(self.max_latency, seconds); self._total_latency += seconds
+
+    def stats_text(self):
+        if not self.fired: return f"{len(self.rules)} 条报警规则，未触发"
+        return (f"{len(self.rules)} 条报警规则，触发 {self.fired} 次，检测到动作平均 {self._total_latency / self.fired * 1000:.2f} ms，"
+                f"最大 {self.max_latency * 1000:.2f} ms")
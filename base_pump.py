@@ -9,6 +9,10 @@ Base Pump Class. Universal Interface for Pump Control.
 
 '''
 
+from log_pipeline import get_logger
+
+logger = get_logger(__name__)
+
 class BasePump:
     """
     一个通用的泵设备基础类 (接口)。
@@ -27,7 +31,7 @@ class BasePump:
         self.unit_address = unit_address
         self.baudrate = baudrate
         self.is_connected = False
-        print(f"初始化设备: {self.__class__.__name__} on {port} (地址: {unit_address})")
+        logger.info("初始化设备: %s on %s (地址: %s)", self.__class__.__name__, port, unit_address)
 
     def connect(self):
         """建立与设备的连接。"""
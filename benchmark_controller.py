@@ -0,0 +1,97 @@
+# file: benchmark_controller.py (控制器基准测试)
+'''
+用模拟驱动 (见 driver_registry / simulated_devices) 在本进程内运行一个 SystemController，测量:
+
+    1. 指令分发: 通过 _process_command 发送启动/设参/停止等指令的平均耗时；
+    2. 状态发布: 读取全部设备状态、积分累计量、编码为二进制帧并放入队列的平均耗时。
+
+不需要任何硬件；--latency-ms 给每次模拟通讯加上固定耗时，可用来估算真实总线上的轮询周期。
+
+用法:
+    python benchmark_controller.py                           # 使用配置中的第一个系统集
+    python benchmark_controller.py --set power_supply_2_system --commands 50000 --latency-ms 0
+'''
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+
+class _NullQueue:
+    """丢弃所有消息的队列，基准测试只关心控制器本身的开销。"""
+    def put(self, item): pass
+
+
+def _command_mix(registry, set_id):
+    """按注册表中的设备类型生成一组有代表性的指令。"""
+    commands = []
+    for entry in registry.devices_in_set(set_id):
+        if entry.is_power_supply:
+            commands += [{'type': 'set_power_voltage', 'params': {'device_id': entry.id, 'channel': 1, 'voltage': 5.0}},
+                         {'type': 'set_power_current', 'params': {'device_id': entry.id, 'channel': 2, 'current': 0.5}}]
+        else:
+            params = {'speed': 120.0, 'direction': 'forward'} if entry.type == 'kamoer' else {'flow_rate': 2.5}
+            commands += [{'type': 'start_pump', 'params': {'pump_id': entry.id, **params}},
+                         {'type': 'set_pump_params', 'params': {'pump_id': entry.id, **params}},
+                         {'type': 'stop_pump', 'params': {'pump_id': entry.id}}]
+    return commands + [{'type': 'open_main_power', 'params': {}}, {'type': 'close_main_power', 'params': {}}]
+
+
+def _timed(func, count, repeats=5):
+    """返回 repeats 轮中每次调用的中位耗时 (秒)。"""
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        func(count)
+        samples.append((time.perf_counter() - t0) / count)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="控制器指令分发与状态发布的基准测试 (模拟设备)")
+    parser.add_argument('--set', dest='set_id', help="系统集 set_id，默认配置中的第一个")
+    parser.add_argument('--commands', type=int, default=20000, help="每轮发送的指令数")
+    parser.add_argument('--status', type=int, default=2000, help="每轮发布的状态快照数")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="每次模拟通讯的耗时 (毫秒)")
+    args = parser.parse_args(argv)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    from config import get_registry
+    from system_controller import SystemController
+    from log_pipeline import setup_logging, shutdown_logging
+    registry = get_registry()
+    set_id = args.set_id or next(iter(registry.by_set))
+    device_configs = [dict(config, sim_latency_ms=args.latency_ms) for config in registry.device_configs(set_id)]
+
+    setup_logging("benchmark", console=False)
+    try:
+        controller = SystemController(device_configs, None, _NullQueue(), None, binary_status=True, simulate=True)
+        # 累计量写到临时目录，不影响真实的 state 文件
+        controller.integrators.state_path = os.path.join(tempfile.mkdtemp(prefix="mps_bench_"), "integrators.json")
+        if not controller._setup_devices():
+            print("模拟设备创建失败。"); return 1
+        commands = _command_mix(registry, set_id)
+
+        def dispatch(count):
+            for i in range(count): controller._process_command(commands[i % len(commands)])
+
+        def publish(count):
+            for _ in range(count): controller._publish_status(loggable=True)
+
+        dispatch_s = _timed(dispatch, args.commands)
+        publish_s = _timed(publish, args.status)
+        controller._shutdown()
+    finally:
+        shutdown_logging()
+
+    print(f"系统集 {set_id}: {len(device_configs)} 台模拟设备，模拟通讯耗时 {args.latency_ms:g} ms")
+    print(f"  指令分发: {dispatch_s * 1e6:8.1f} µs/条 ({len(commands)} 种指令循环发送)")
+    print(f"  状态发布: {publish_s * 1e6:8.1f} µs/次 (读取 + 积分 + 编码)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,7 +10,11 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('system_config.json', '.')],  # 关键：将配置文件包含进来
-    hiddenimports=['pyvisa_py'],          # 关键：添加 pyvisa 的后端，防止找不到设备
+    # 关键：pyvisa 的后端 pyvisa_py；设备驱动与模拟驱动由 driver_registry 按登记的字符串用 importlib 按需导入，
+    # PyInstaller 的静态分析找不到它们，需要全部列出 (新增驱动时在这里一并添加)
+    hiddenimports=['pyvisa_py', 'pyvisa', 'pymodbus.client',
+                   'kamoer_pump_controller', 'plunger_pump_controller', 'power_supply_controller', 'simulated_devices',
+                   'modbus_transport', 'modbus_transaction', 'base_pump'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,310 @@
+# file: bus_scanner.py (Modbus 总线扫描、设备识别与波特率/地址设置)
+'''
+调试新装置时不必再手工猜端口、地址和波特率 (取代原来写死参数的改地址脚本 address.py，已删除；改地址用 --readdress):
+
+    1. 扫描: 多个端口并发扫描 (每个端口一个线程；同一条总线是半双工的，端口内按 波特率 × 地址 依次探测)，
+       每次探测的超时按波特率取最小值 (见 modbus_transaction)，空地址只花几十毫秒；
+    2. 识别: 按寄存器特征识别设备类型 —— 欧世盛柱塞泵的地址寄存器 (0x09) 读出的就是自己的从机地址，
+       卡莫尔蠕动泵的实时转速寄存器 (0x3005/0x3006) 是一个合理范围内的浮点数；
+    3. 设置 (可选): 把设备改到新地址 (--readdress) 或更高的波特率 (--baudrate-to)，
+       只对登记了对应寄存器的设备类型可用 (见 register_signature)；
+    4. 写入配置 (--write): 按 (类型, 端口, 地址) 匹配 system_config.json 中的设备，更新波特率/地址；
+       配置中的设备在原位置没有找到、而扫描结果中恰好只有一台同类型的未匹配设备时，改为扫描到的端口和地址；
+       只考虑原端口和地址在本次扫描范围内的配置 (--ports COM7 不会把配置在 COM5 上的泵改到 COM7)。
+       写入前用 DeviceRegistry 校验 (地址冲突、同一总线波特率不一致等)，校验失败不写入。
+
+用法:
+    python bus_scanner.py                                  # 扫描全部串口、常用波特率、地址 1-247，只打印结果
+    python bus_scanner.py --ports COM7 COM9 --baudrates 9600 19200 --addresses 1-10 192-200
+    python bus_scanner.py --ports COM7 --readdress 85:2 --write
+    python bus_scanner.py --ports COM9 --baudrate-to 38400 --write
+'''
+
+import sys
+import math
+import struct
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional, Callable
+
+from log_pipeline import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_BAUDRATES = (9600, 19200, 38400, 57600, 115200)
+DEFAULT_ADDRESSES = range(1, 248)
+
+
+class Signature(NamedTuple):
+    """
+    一种设备类型的识别方法与可写的通讯参数寄存器。
+
+    :param probe: probe(client, unit) -> dict 或 None，识别成功时返回读到的信息。
+    :param default_address: 出厂地址，扫描时优先探测。
+    :param address_register: 从机地址寄存器；None 表示不支持改地址。
+    :param baud_register: 波特率寄存器；None 表示不支持改波特率。
+    :param baud_codes: {波特率: 写入 baud_register 的值}。
+    """
+    type_name: str
+    probe: Callable
+    default_address: int
+    address_register: Optional[int] = None
+    baud_register: Optional[int] = None
+    baud_codes: Optional[dict] = None
+
+
+class FoundDevice(NamedTuple):
+    port: str
+    baudrate: Optional[int]         # TCP 网关端点为 None
+    address: int
+    type: str
+    detail: dict
+
+
+_signatures = []
+
+
+def register_signature(type_name, probe, default_address, address_register=None, baud_register=None, baud_codes=None):
+    """登记一种设备的识别方法；按登记顺序依次尝试，特征越强的类型应越早登记。"""
+    signature = Signature(type_name, probe, default_address, address_register, baud_register, dict(baud_codes or {}))
+    _signatures.append(signature)
+    return signature
+
+
+def get_signature(type_name):
+    return next((s for s in _signatures if s.type_name == type_name), None)
+
+
+def _read(client, register, unit, count=1):
+    """读保持寄存器；超时、异常响应都返回 None。"""
+    from pymodbus.exceptions import ModbusException
+    try:
+        r = client.read_holding_registers(register, count=count, device_id=unit)
+    except ModbusException:
+        return None
+    return None if r.isError() else list(r.registers)
+
+
+def _probe_oushisheng(client, unit):
+    regs = _read(client, 0x09, unit)
+    if not regs or regs[0] != unit: return None
+    flow = _read(client, 0x0B, unit)
+    return {'set_flow_ml_min': flow[0] / 1000.0 if flow else None}
+
+
+def _probe_kamoer(client, unit):
+    # 与驱动一致，两个寄存器分两次读取
+    high = _read(client, 0x3005, unit); low = _read(client, 0x3006, unit) if high else None
+    if not low: return None
+    speed = struct.unpack('>f', struct.pack('>HH', high[0], low[0]))[0]
+    if not math.isfinite(speed) or not 0.0 <= speed < 10000.0: return None
+    return {'speed_rpm': speed}
+
+
+# 欧世盛的地址寄存器来自原来的 address.py 脚本 (寄存器 9)；波特率寄存器以及卡莫尔的地址/波特率寄存器未登记，
+# 拿到说明书后在这里补上 address_register / baud_register / baud_codes 即可启用对应的设置功能。
+register_signature('oushisheng', _probe_oushisheng, default_address=55, address_register=0x09)
+register_signature('kamoer', _probe_kamoer, default_address=192)
+
+
+def identify(client, unit):
+    """依次用已登记的特征探测 unit 地址上的设备，返回 (Signature, detail) 或 None。"""
+    for signature in _signatures:
+        detail = signature.probe(client, unit)
+        if detail is not None: return signature, detail
+    return None
+
+
+def probe_order(addresses):
+    """出厂地址排在前面，其余按原顺序。"""
+    defaults = [s.default_address for s in _signatures if s.default_address in addresses]
+    return list(dict.fromkeys(defaults + list(addresses)))
+
+
+def _open_probe_client(port, baudrate):
+    from modbus_transport import ModbusConnectionPool, parse_endpoint
+    from modbus_transaction import MIN_TIMEOUT, FLOOR_CHARS, char_time
+    kind, target = parse_endpoint(port)
+    timeout = MIN_TIMEOUT + FLOOR_CHARS * char_time(baudrate if kind == 'serial' else None)
+    return ModbusConnectionPool._create_client(kind, target, baudrate or 9600, timeout)
+
+
+def scan_port(port, baudrates=DEFAULT_BAUDRATES, addresses=DEFAULT_ADDRESSES, progress=None):
+    """
+    扫描一个端口 (串口或网关端点) 上的设备。
+
+    :param progress: 可选的 progress(port, baudrate, found_devices) 回调，每个波特率扫描完调用一次。
+    :return: [FoundDevice, ...]
+    """
+    from modbus_transport import parse_endpoint
+    is_serial = parse_endpoint(port)[0] == 'serial'
+    found = []
+    for baudrate in (baudrates if is_serial else (None,)):
+        client = _open_probe_client(port, baudrate)
+        if not client.connect():
+            logger.warning("无法打开 %s，跳过。", port); break
+        try:
+            for unit in probe_order(addresses):
+                hit = identify(client, unit)
+                if hit: found.append(FoundDevice(port, baudrate, unit, hit[0].type_name, hit[1]))
+        finally:
+            client.close()
+        if progress: progress(port, baudrate, found)
+    return found
+
+
+def scan(ports, baudrates=DEFAULT_BAUDRATES, addresses=DEFAULT_ADDRESSES, progress=None):
+    """并发扫描多个端口，结果按端口顺序合并。"""
+    if not ports: return []
+    with ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="bus-scan") as pool:
+        results = pool.map(lambda port: scan_port(port, baudrates, addresses, progress), ports)
+        return [device for devices in results for device in devices]
+
+
+def available_ports():
+    """本机的全部串口名。"""
+    from serial.tools import list_ports
+    return sorted(p.device for p in list_ports.comports())
+
+
+def reconfigure(device, new_address=None, new_baudrate=None):
+    """
+    修改设备的从机地址和/或波特率，写入成功后用新参数重新识别一次。
+
+    :return: 新参数下的 FoundDevice (未能重新识别时仍返回新参数，detail 中 verified=False；部分型号需要重新上电才生效)。
+    :raises ValueError: 该设备类型未登记对应的寄存器或不支持该波特率。
+    :raises IOError: 设备拒绝写入或没有响应。
+    """
+    signature = get_signature(device.type)
+    writes = []
+    if new_address is not None and new_address != device.address:
+        if signature.address_register is None: raise ValueError(f"{device.type} 未登记地址寄存器，不能修改地址。")
+        writes.append((signature.address_register, int(new_address)))
+    if new_baudrate is not None and new_baudrate != device.baudrate:
+        if signature.baud_register is None: raise ValueError(f"{device.type} 未登记波特率寄存器，不能修改波特率。")
+        if new_baudrate not in signature.baud_codes: raise ValueError(f"{device.type} 不支持波特率 {new_baudrate}。")
+        writes.append((signature.baud_register, signature.baud_codes[new_baudrate]))
+    if not writes: return device
+    from pymodbus.exceptions import ModbusException
+    client = _open_probe_client(device.port, device.baudrate)
+    if not client.connect(): raise IOError(f"无法打开 {device.port}。")
+    try:
+        for register, value in writes:
+            try:
+                r = client.write_register(register, value, device_id=device.address)
+            except ModbusException as e:
+                raise IOError(f"{device.port} 地址 {device.address}: 写寄存器 {register:#x} 无响应 ({e})。") from e
+            if r.isError(): raise IOError(f"{device.port} 地址 {device.address}: 设备拒绝写寄存器 {register:#x}: {r}")
+    finally:
+        client.close()
+    address = device.address if new_address is None else int(new_address)
+    baudrate = device.baudrate if new_baudrate is None else new_baudrate
+    client = _open_probe_client(device.port, baudrate)
+    verified = False
+    if client.connect():
+        try:
+            hit = identify(client, address); verified = hit is not None and hit[0].type_name == device.type
+        finally:
+            client.close()
+    return FoundDevice(device.port, baudrate, address, device.type, dict(device.detail, verified=verified))
+
+
+def apply_to_config(system_sets, found, scanned_ports, scanned_addresses=None):
+    """
+    把扫描结果写入系统集配置 (原地修改)。
+    只处理端口 (和地址) 在本次扫描范围内的配置：范围外的设备没有被探测过，既不算未找到，也不会被改到别的端口/地址上。
+
+    :param scanned_ports: 本次扫描的端口。
+    :param scanned_addresses: 本次扫描的从机地址，None 表示不限。
+    :return: (修改说明列表, 未匹配到配置的扫描结果, 配置中未找到的设备 id 列表)。
+    """
+    from device_registry import iter_set_devices, normalize_port, DEFAULT_BAUDRATE
+    known = {s.type_name for s in _signatures}
+    ports = {normalize_port(port) for port in scanned_ports}
+    addresses = None if scanned_addresses is None else set(scanned_addresses)
+    configs = [config for system_set in system_sets for _, config in iter_set_devices(system_set)
+               if config.get('type', '').lower() in known and not config.get('node') and normalize_port(config.get('port')) in ports
+               and (addresses is None or config.get('address') in addresses)]
+    unmatched = list(found); changes = []; missing = []
+
+    def update(config, device):
+        for key, value in (('port', device.port), ('address', device.address), ('baudrate', device.baudrate or config.get('baudrate'))):
+            if value is not None and config.get(key, DEFAULT_BAUDRATE if key == 'baudrate' else None) != value:
+                changes.append(f"{config['id']}: {key} {config.get(key)} -> {value}"); config[key] = value
+
+    for config in configs:
+        device = next((d for d in unmatched if d.type == config['type'].lower() and d.address == config.get('address')
+                       and normalize_port(d.port) == normalize_port(config.get('port'))), None)
+        if device is None: missing.append(config); continue
+        unmatched.remove(device); update(config, device)
+    for config in list(missing):
+        candidates = [d for d in unmatched if d.type == config['type'].lower()]
+        if len(candidates) == 1 and sum(c['type'].lower() == config['type'].lower() for c in missing) == 1:
+            unmatched.remove(candidates[0]); missing.remove(config); update(config, candidates[0])
+    return changes, unmatched, [config['id'] for config in missing]
+
+
+def _parse_ranges(items):
+    addresses = []
+    for item in items:
+        low, _, high = str(item).partition('-')
+        addresses.extend(range(int(low), int(high or low) + 1))
+    return list(dict.fromkeys(a for a in addresses if 1 <= a <= 247))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="扫描 Modbus 总线上的泵，识别型号，可选修改地址/波特率并写入配置")
+    parser.add_argument('--ports', nargs='+', help="端口 (串口名或 tcp:// / rtu+tcp:// 网关)，默认本机全部串口")
+    parser.add_argument('--baudrates', nargs='+', type=int, default=list(DEFAULT_BAUDRATES), help="要尝试的波特率")
+    parser.add_argument('--addresses', nargs='+', default=['1-247'], help="从机地址或范围，例如 1-10 55 192-200")
+    parser.add_argument('--readdress', nargs='+', default=[], metavar='OLD:NEW', help="把扫描到的地址 OLD 改为 NEW (只有一个端口时)")
+    parser.add_argument('--baudrate-to', type=int, help="把扫描到的设备改到这个波特率")
+    parser.add_argument('--write', action='store_true', help="把结果写入 system_config.json (默认只打印)")
+    args = parser.parse_args(argv)
+    # pymodbus 对每个无响应的地址都会记一条 ERROR，扫描时关掉
+    logging.getLogger('pymodbus').setLevel(logging.CRITICAL)
+
+    ports = args.ports or available_ports()
+    if not ports:
+        print("没有找到任何串口。"); return 1
+    addresses = _parse_ranges(args.addresses)
+    print(f"扫描 {', '.join(ports)}: 波特率 {args.baudrates}，{len(addresses)} 个地址...")
+    found = scan(ports, args.baudrates, addresses,
+                 progress=lambda port, baud, devices: print(f"  {port} @ {baud or '-'}: 累计找到 {len(devices)} 台"))
+    for device in found:
+        print(f"  {device.type:<12} {device.port:<24} 波特率 {device.baudrate or '-':<7} 地址 {device.address:<4} {device.detail}")
+    if not found:
+        print("没有识别到任何设备。"); return 1
+
+    readdress = dict(tuple(int(x) for x in item.split(':', 1)) for item in args.readdress)
+    if readdress and len({d.port for d in found}) > 1:
+        print("--readdress 只能在扫描一个端口时使用。"); return 1
+    if readdress or args.baudrate_to:
+        for i, device in enumerate(found):
+            new_address = readdress.get(device.address)
+            if new_address is None and args.baudrate_to is None: continue
+            try:
+                found[i] = reconfigure(device, new_address, args.baudrate_to)
+            except (ValueError, IOError) as e:
+                print(f"  {device.port} 地址 {device.address}: {e}"); continue
+            note = "" if found[i].detail.get('verified') else " (未能用新参数重新识别，可能需要重新上电)"
+            print(f"  {device.port} 地址 {device.address} -> 地址 {found[i].address}，波特率 {found[i].baudrate}{note}")
+
+    from config import get_config, save_config
+    from device_registry import DeviceRegistry, ConfigError
+    system_sets = get_config()
+    changes, unmatched, missing = apply_to_config(system_sets, found, ports, addresses)
+    for change in changes: print(f"  配置: {change}")
+    for device in unmatched: print(f"  未在配置中: {device.type} {device.port} 地址 {device.address} 波特率 {device.baudrate}")
+    if missing: print(f"  配置中的设备未找到: {', '.join(missing)}")
+    if not args.write or not changes: return 0
+    try:
+        DeviceRegistry(system_sets)
+    except ConfigError as e:
+        print(f"扫描结果与配置冲突，未写入:\n{e}"); return 1
+    return 0 if save_config() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,8 +7,12 @@ from system_config import SYSTEM_SETS # 导入默认配置作为备用
 # 定义配置文件的名称
 CONFIG_FILE = "system_config.json"
 
-# 全局变量，用于在内存中持有当前配置
+# 全局变量，用于在内存中持有当前配置。
+# 配置不再在导入时加载：需要配置的入口显式调用 get_config()，结果在进程内缓存；
+# 列表对象始终不变 (加载时原地替换内容)，已经持有 CURRENT_CONFIG 引用的代码看到的也是最新配置。
 CURRENT_CONFIG = []
+_loaded = False
+_registry = None   # 由 CURRENT_CONFIG 编译出的 DeviceRegistry，配置重新加载或保存后失效
 
 def get_config_path():
     """获取配置文件的绝对路径，确保打包后也能找到"""
@@ -20,19 +24,40 @@ def get_config_path():
         base_path = os.path.abspath(".")
     return os.path.join(base_path, CONFIG_FILE)
 
+def get_config(reload=False):
+    """返回当前配置；首次调用 (或 reload=True) 时才从文件加载。"""
+    if reload or not _loaded:
+        load_config()
+    return CURRENT_CONFIG
+
+def get_registry():
+    """
+    返回由当前配置编译出的设备注册表 (见 device_registry.py)，在配置变化前只编译一次。
+
+    :raises device_registry.ConfigError: 配置中存在重复 id 或端口/地址冲突。
+    """
+    global _registry
+    if _registry is None:
+        from device_registry import DeviceRegistry
+        _registry = DeviceRegistry(get_config())
+        for warning in _registry.warnings: print(f"配置警告: {warning}")
+    return _registry
+
 def load_config():
     """
     加载配置。
     优先从 system_config.json 文件加载。如果文件不存在或解析失败，
     则加载 system_config.py 中的默认配置 SYSTEM_SETS。
     """
-    global CURRENT_CONFIG
+    global _loaded, _registry
+    _loaded = True
+    _registry = None
     config_path = get_config_path()
     
     if os.path.exists(config_path):
         try:
             with open(config_path, 'r', encoding='utf-8') as f:
-                CURRENT_CONFIG = json.load(f)
+                CURRENT_CONFIG[:] = json.load(f)
                 print(f"成功从 {config_path} 加载配置。")
                 # 校验加载的配置是否与默认结构一致，防止手动修改json导致出错
                 if len(CURRENT_CONFIG) != len(SYSTEM_SETS):
@@ -42,7 +67,7 @@ def load_config():
             print(f"加载 {config_path} 失败: {e}。将使用默认配置。")
     
     print("未找到或无法解析JSON配置文件，正在加载默认配置。")
-    CURRENT_CONFIG = SYSTEM_SETS
+    CURRENT_CONFIG[:] = SYSTEM_SETS
     # 首次加载默认配置后，立即保存一份json，方便用户后续修改
     save_config()
 
@@ -51,7 +76,8 @@ def save_config():
     """
     将当前内存中的配置保存到 system_config.json 文件。
     """
-    global CURRENT_CONFIG
+    global _registry
+    _registry = None  # 配置可能已在界面中被修改，下次 get_registry() 时重新编译
     config_path = get_config_path()
     try:
         with open(config_path, 'w', encoding='utf-8') as f:
@@ -62,6 +88,3 @@ def save_config():
     except Exception as e:
         print(f"保存配置到 {config_path} 时出错: {e}")
         return False
-
-# 在模块被导入时，立即执行一次加载操作
-load_config()
@@ -0,0 +1,167 @@
+# file: controller_checkpoint.py (控制器运行状态检查点)
+'''
+控制器进程崩溃或卡死后由 ControllerSupervisor (controller_supervisor.py) 重启，新进程从这里的检查点继续运行:
+
+    - 设定值: 每台设备最近一次生效的设定 (泵的启停、启动参数与运行中修改的参数；电源各通道电压/电流与总输出)，
+      由控制器在指令执行成功后记录；
+    - 定时任务: 尚未触发的延时指令、定时关闭与协议的下一步 (协议执行到的位置)，到期时间按墙上时间保存，
+      进程停止期间已经到期的任务在恢复后立即执行；协议步骤表在开始运行时单独写入一次，检查点只记录运行编号和位置；
+    - 累计量: 积分器的累计值和最后一个样本 (单调时钟在同一台机器的进程间通用)，停机期间泵仍在运行时，
+      体积/电荷按梯形积分跨越停机时间 (不超过 integrators.MAX_GAP_SECONDS)。
+
+恢复时先读取每台设备的实时状态，与设定值一致的设备 (健康设备) 不再下发任何指令，只对不一致的设备重新下发设定值。
+检查点以临时文件 + 替换的方式原子写入，控制器正常关闭时删除。
+'''
+
+import os
+import glob
+import json
+import time
+
+from driver_registry import ROUTING_KEYS
+
+VOLTAGE_TOLERANCE = 0.05        # 电源实测电压与设定值的允许偏差 (V，或设定值的 2%，取较大者)
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _as_key(key):
+    """JSON 把元组 key 读回为列表，还原为元组 (定时器按 key 去重/取消)。"""
+    return tuple(_as_key(k) for k in key) if isinstance(key, list) else key
+
+
+class SetpointTracker:
+    """
+    每台设备最近一次生效的设定值。
+
+    泵: {'running': bool, 'start': 启动参数, 'params': 运行中修改的参数}；
+    电源: {'output': bool, 'voltage': {通道: V}, 'current': {通道: A}} (通道为字符串，便于写入 JSON)。
+    """
+    def __init__(self, registry, setpoints=None):
+        self.registry = registry
+        self.setpoints = setpoints or {}
+
+    def _entry(self, dev_id):
+        return self.setpoints.setdefault(dev_id, {})
+
+    def record(self, cmd_type, device_id, params, device_ids=(), power_id=None):
+        """
+        记录一条执行成功的指令。
+
+        :param device_ids: 已连接的全部设备 (stop_all 作用于全部设备)。
+        :param power_id: 总电源指令作用的电源设备 id。
+        """
+        args = {k: v for k, v in params.items() if k not in ROUTING_KEYS}
+        if cmd_type == 'start_pump':
+            self.setpoints[device_id] = {'running': True, 'start': args, 'params': {}}
+        elif cmd_type == 'stop_pump':
+            self._entry(device_id)['running'] = False
+        elif cmd_type == 'set_pump_params':
+            self._entry(device_id).setdefault('params', {}).update(args)
+        elif cmd_type in ('set_power_voltage', 'set_power_current'):
+            aspect = 'voltage' if cmd_type == 'set_power_voltage' else 'current'
+            self._entry(device_id).setdefault(aspect, {})[str(params['channel'])] = params[aspect]
+        elif cmd_type == 'set_power_output':
+            self._entry(device_id)['output'] = bool(params.get('enable'))
+        elif cmd_type == 'set_channel_output' and device_id:
+            if params.get('enable'): self._entry(device_id)['output'] = True
+            else: self._entry(device_id).setdefault('voltage', {})[str(params.get('channel'))] = 0.0
+        elif cmd_type == 'open_main_power' and power_id:
+            self._entry(power_id)['output'] = True
+        elif cmd_type == 'close_main_power' and power_id:
+            entry = self._entry(power_id); entry['output'] = False
+            entry['voltage'] = {ch: 0.0 for ch in ('1', '2')}
+        elif cmd_type == 'stop_all':
+            for dev_id in device_ids:
+                self._entry(dev_id)['output' if self.registry.get(dev_id).is_power_supply else 'running'] = False
+
+    def satisfied(self, dev_id, status):
+        """设备的实时状态是否与设定值一致 (没有记录过设定值的设备视为一致)。"""
+        setpoint = self.setpoints.get(dev_id)
+        if not setpoint: return True
+        if 'running' in setpoint and bool(status.get('is_running')) != setpoint['running']: return False
+        if 'output' in setpoint and bool(status.get('output_on')) != setpoint['output']: return False
+        if status.get('output_on'):
+            for ch, voltage in setpoint.get('voltage', {}).items():
+                measured = status.get(f'ch{ch}_voltage')
+                if measured is not None and abs(measured - voltage) > max(VOLTAGE_TOLERANCE, 0.02 * abs(voltage)): return False
+        return True
+
+    def apply(self, dev_id, device):
+        """把记录的设定值重新下发到设备。"""
+        setpoint = self.setpoints.get(dev_id) or {}
+        for ch, current in setpoint.get('current', {}).items(): device.set_current(int(ch), current)
+        for ch, voltage in setpoint.get('voltage', {}).items(): device.set_voltage(int(ch), voltage)
+        if 'output' in setpoint: device.set_output(setpoint['output'])
+        if setpoint.get('running'):
+            device.start(**setpoint.get('start', {}))
+            if setpoint.get('params'): device.set_parameters(**setpoint['params'])
+        elif 'running' in setpoint:
+            device.stop()
+
+
+class ControllerCheckpoint:
+    """
+    一个控制器的检查点文件 (state/<日志名>_checkpoint.json) 及其协议步骤表文件。
+
+    :param state_dir: 状态目录 (与积分器状态文件相同)。
+    :param name: 控制器的日志名。
+    """
+    def __init__(self, state_dir, name):
+        self.path = os.path.join(state_dir, f"{name}_checkpoint.json")
+        self._protocol_prefix = os.path.join(state_dir, f"{name}_protocol_")
+        self.writes = 0
+
+    def protocol_path(self, run_id):
+        return f"{self._protocol_prefix}{run_id}.json"
+
+    def save_protocol(self, run_id, protocol):
+        _write_json(self.protocol_path(run_id), protocol)
+
+    def load_protocol(self, run_id):
+        return _read_json(self.protocol_path(run_id))
+
+    def drop_protocol(self, run_id):
+        try:
+            os.remove(self.protocol_path(run_id))
+        except OSError:
+            pass
+
+    def save(self, setpoints, timers, protocol_runs, integrators, protocol_tags=None):
+        """
+        写入检查点。
+
+        :param timers: [{'key', 'due', 'command'} 或 {'key', 'due', 'protocol_run', 'index'}]，due 为墙上时间。
+        :param integrators: IntegratorBank.snapshot()。
+        :param protocol_tags: {协议运行编号: run_tag}，恢复后协议结束时仍能报告给实验编排器。
+        """
+        _write_json(self.path, {'saved_at': time.time(), 'setpoints': setpoints, 'timers': timers,
+                                'protocol_runs': protocol_runs, 'protocol_tags': protocol_tags or {}, 'integrators': integrators})
+        self.writes += 1
+
+    def load(self):
+        """读取检查点；不存在或已损坏时返回 None。定时器的 key 还原为元组。"""
+        data = _read_json(self.path)
+        if not isinstance(data, dict): return None
+        for timer in data.get('timers', []): timer['key'] = _as_key(timer.get('key'))
+        return data
+
+    def discard(self):
+        """删除检查点和全部协议步骤表 (控制器正常关闭或重新开始时)。"""
+        for path in [self.path] + glob.glob(f"{glob.escape(self._protocol_prefix)}*.json"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
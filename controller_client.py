@@ -0,0 +1,263 @@
+# file: controller_client.py (控制服务客户端库)
+'''
+controller_service.py 的 Python 客户端。
+
+典型用法 (自动化脚本 / 批量实验):
+
+    from controller_client import ControllerClient
+
+    with ControllerClient("127.0.0.1:8765") as client:           # 服务要求口令时: token="..." 或环境变量 MPS_SERVICE_TOKEN
+        client.subscribe("power_supply_1_system")
+        client.send_command("power_supply_1_system", "start_pump", pump_id="kamoer_pump_1A", speed=120.0)
+        set_id, status = client.get_status(timeout=5)
+
+FakeControllerClient 提供相同的接口但不连接任何服务，
+用于在测试中替代真实客户端：它记录所有发出的指令，并允许测试代码注入状态。
+'''
+
+import os
+import json
+import time
+import socket
+import threading
+from queue import Queue, Empty
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+TOKEN_ENV = "MPS_SERVICE_TOKEN"     # 服务的共享口令：服务端 --token 与客户端 token 的默认值
+
+
+def parse_address(address):
+    """
+    解析服务地址字符串。
+
+    :param address: 'unix:/path/to.sock' 或 'host:port' 或 'port'。
+    :return: ('unix', path) 或 ('tcp', (host, port))。
+    """
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+class ControllerServiceError(Exception):
+    """服务端返回 ok=false 或连接异常时抛出。"""
+
+
+class ControllerClient:
+    """
+    连接无界面控制服务的同步客户端。
+    后台读线程负责把回复分发给等待中的请求，把状态消息放入本地状态队列。
+
+    :param address: 服务地址，'host:port' 或 'unix:/path/to.sock'。
+    :param timeout: 等待请求回复的超时时间 (秒)。
+    :param token: 服务要求的共享口令，连接后立即认证；None 时取环境变量 MPS_SERVICE_TOKEN，都没有时不认证。
+    """
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=5.0, token=None):
+        self.address = address
+        self.timeout = timeout
+        self.token = token if token is not None else os.environ.get(TOKEN_ENV) or None
+        self.status_queue = Queue()
+        self._sock = None
+        self._reader = None
+        self._req_counter = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._connected = False
+
+    # --- 连接管理 ---
+    def connect(self):
+        kind, target = parse_address(self.address)
+        if kind == 'unix':
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.connect(target)
+        self._sock = sock
+        self._connected = True
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+        if self.token:
+            try:
+                self._request({'op': 'auth', 'token': self.token})
+            except ControllerServiceError:
+                self.close(); raise
+        return self
+
+    def is_connected(self):
+        """读线程仍在运行 (连接未被对端关闭) 时返回 True。"""
+        return self._connected
+
+    def close(self):
+        self._connected = False
+        if self._sock:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # --- 公共接口 ---
+    def ping(self):
+        return self._request({'op': 'ping'})['time']
+
+    def list_sets(self):
+        return self._request({'op': 'list_sets'})['sets']
+
+    def send_command(self, set_id, cmd_type, **params):
+        """向指定系统集下发一条与 UI 相同格式的指令。"""
+        self._request({'op': 'command', 'set_id': set_id, 'command': {'type': cmd_type, 'params': params}})
+
+    def run_protocol(self, set_id, protocol):
+        """提交一个协议 (步骤字典列表，格式与 ProtocolWidget 保存的 JSON 相同)。"""
+        self._request({'op': 'run_protocol', 'set_id': set_id, 'protocol': list(protocol)})
+
+    def subscribe(self, set_id=None, batch_interval=None):
+        """
+        订阅状态流；set_id 为 None 时订阅所有系统集。
+
+        :param batch_interval: 可选，秒。服务把该时间窗内的状态合并为一条 status_batch 消息推送，
+                               适合跨网络的汇聚端；接收端拆开后与逐条推送没有区别。
+        """
+        message = {'op': 'subscribe', 'set_id': set_id}
+        if batch_interval: message['batch_interval'] = batch_interval
+        self._request(message)
+
+    def unsubscribe(self):
+        self._request({'op': 'unsubscribe'})
+
+    def get_status(self, timeout=None):
+        """
+        取出下一条状态消息。
+
+        :return: (set_id, status_dict)；超时抛出 queue.Empty。
+        """
+        return self.status_queue.get(timeout=timeout)
+
+    def latest_status(self):
+        """清空本地状态队列，只返回每个系统集最新的一条状态。"""
+        latest = {}
+        try:
+            while True:
+                set_id, data = self.status_queue.get_nowait(); latest[set_id] = data
+        except Empty:
+            pass
+        return latest
+
+    # --- 内部实现 ---
+    def _request(self, message):
+        if self._sock is None:
+            raise ControllerServiceError("客户端尚未连接。")
+        waiter = Queue(maxsize=1)
+        with self._lock:
+            self._req_counter += 1; req = self._req_counter; self._pending[req] = waiter
+        message['req'] = req
+        data = (json.dumps(message, ensure_ascii=False) + "\n").encode('utf-8')
+        try:
+            with self._send_lock: self._sock.sendall(data)
+            reply = waiter.get(timeout=self.timeout)
+        except Empty:
+            raise ControllerServiceError(f"等待服务回复超时: {message['op']}")
+        except OSError as e:
+            raise ControllerServiceError(f"与服务通讯失败: {e}")
+        finally:
+            with self._lock: self._pending.pop(req, None)
+        if not reply.get('ok'):
+            raise ControllerServiceError(reply.get('error', '未知错误'))
+        return reply
+
+    def _read_loop(self):
+        try:
+            for raw_line in self._sock.makefile('rb'):
+                try:
+                    message = json.loads(raw_line.decode('utf-8'))
+                except (ValueError, UnicodeDecodeError):
+                    continue
+                op = message.get('op')
+                if op == 'status':
+                    self.status_queue.put((message.get('set_id'), message.get('data')))
+                elif op == 'status_batch':
+                    for set_id, data in message.get('items', []): self.status_queue.put((set_id, data))
+                elif op == 'reply':
+                    with self._lock: waiter = self._pending.get(message.get('req'))
+                    if waiter: waiter.put(message)
+        except (OSError, ValueError, AttributeError):
+            pass
+        finally:
+            self._connected = False
+
+
+class FakeControllerClient:
+    """
+    ControllerClient 的测试替身，接口完全一致，不需要运行服务。
+
+    :param sets: 可选，{set_id: [device_id, ...]}，用于 list_sets 和指令校验。
+    """
+    def __init__(self, sets=None, address=DEFAULT_ADDRESS, timeout=5.0, token=None):
+        self.address = address
+        self.timeout = timeout
+        self.token = token
+        self.sets = dict(sets or {})
+        self.status_queue = Queue()
+        self.sent_commands = []          # [(set_id, command_dict), ...]
+        self.subscriptions = set()
+        self.connected = False
+
+    def connect(self):
+        self.connected = True
+        return self
+
+    def close(self):
+        self.connected = False
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def ping(self):
+        return time.time()
+
+    def list_sets(self):
+        return [{'set_id': set_id, 'description': set_id, 'devices': list(devices), 'alive': True}
+                for set_id, devices in self.sets.items()]
+
+    def send_command(self, set_id, cmd_type, **params):
+        self._check_set(set_id)
+        self.sent_commands.append((set_id, {'type': cmd_type, 'params': params}))
+
+    def run_protocol(self, set_id, protocol):
+        self._check_set(set_id)
+        self.sent_commands.append((set_id, {'type': 'run_protocol', 'params': {'protocol': list(protocol)}}))
+
+    def is_connected(self):
+        return self.connected
+
+    def subscribe(self, set_id=None, batch_interval=None):
+        if set_id is not None: self._check_set(set_id)
+        self.subscriptions.add(set_id)
+
+    def unsubscribe(self):
+        self.subscriptions.clear()
+
+    def get_status(self, timeout=None):
+        return self.status_queue.get(timeout=timeout)
+
+    latest_status = ControllerClient.latest_status
+
+    def push_status(self, set_id, status):
+        """测试辅助：模拟服务推送一条状态 (仅在已订阅时投递，与真实服务一致)。"""
+        if None in self.subscriptions or set_id in self.subscriptions:
+            self.status_queue.put((set_id, status))
+
+    def _check_set(self, set_id):
+        if self.sets and set_id not in self.sets:
+            raise ControllerServiceError(f"未知的系统集: {set_id}")
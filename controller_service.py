@@ -0,0 +1,458 @@
+# file: controller_service.py (无界面控制服务)
+'''
+无界面 (headless) 控制服务。
+
+在独立进程中运行一个或多个系统集的 SystemController，并通过本地套接字
+(Unix socket 或 localhost TCP) 对外提供指令下发、状态订阅和协议提交接口。
+监听网卡地址时即作为多节点部署中的一个节点，由启动器的 node_aggregator 汇聚。
+
+安全: 服务能启停泵、打开电源输出、提交协议，本身没有加密。监听非本机回环地址时必须至少指定
+--token (共享口令，客户端连接后先发送 auth) 或 --allow (允许连接的主机/网段)，否则拒绝启动；
+部署在隔离的实验室网络中，只监听面向启动器的网卡地址，不要监听 0.0.0.0 后直接暴露在办公网/公网上。
+多个客户端可以同时订阅状态流，串口始终只由服务内的控制器进程打开一次。
+
+通讯协议: 每条消息为一行 UTF-8 JSON，以 '\\n' 结尾。
+  客户端 -> 服务:
+    {"op": "auth", "req": 0, "token": "..."}          # 服务带 --token 启动时，必须是连接上的第一个请求
+    {"op": "list_sets", "req": 1}
+    {"op": "command", "req": 2, "set_id": "...", "command": {"type": "start_pump", "params": {...}}}
+    {"op": "run_protocol", "req": 3, "set_id": "...", "protocol": [...]}
+    {"op": "subscribe", "req": 4, "set_id": "..."}      # set_id 省略表示订阅所有系统集
+    {"op": "subscribe", "req": 4, "set_id": "...", "batch_interval": 0.2}   # 批量推送 (跨网络汇聚时使用)
+    {"op": "unsubscribe", "req": 5}
+    {"op": "ping", "req": 6}
+  服务 -> 客户端:
+    {"op": "reply", "req": 2, "ok": true, ...}
+    {"op": "status", "set_id": "...", "data": {...}}
+    {"op": "status_batch", "items": [["set_id", {...}], ...]}           # 仅批量订阅的客户端
+
+用法:
+    python controller_service.py                                  # 启动配置中的所有系统集
+    python controller_service.py --sets power_supply_1_system --address unix:/tmp/mps.sock
+    python controller_service.py --sets power_supply_2_system --address 192.168.10.5:8765 --token <口令> --allow 192.168.10.2
+'''
+
+import os
+import sys
+import json
+import hmac
+import time
+import signal
+import ipaddress
+import argparse
+import threading
+import socketserver
+import multiprocessing
+from collections import deque
+from queue import Empty
+
+from controller_supervisor import ControllerSupervisor
+from controller_client import DEFAULT_ADDRESS, TOKEN_ENV, parse_address
+from log_pipeline import get_logger, setup_logging, shutdown_logging
+from device_registry import ConfigError, iter_set_devices
+from driver_registry import SIMULATE_ENV, find_driver
+
+logger = get_logger(__name__)
+
+# 每个客户端最多缓存的待发送状态快照数，慢客户端超出后丢弃最旧的快照，不会拖慢其它客户端 (回复与事件不受限制)
+CLIENT_SEND_BUFFER = 256
+# 客户端指令参数的取值类型 (未列出的参数不检查)；控制器级指令的必需参数 (设备指令的必需参数取自 driver_registry)
+PARAM_TYPES = {'channel': 'int', 'enable': 'bool', 'direction': 'str', 'voltage': 'number', 'current': 'number', 'speed': 'number',
+               'flow_rate': 'number', 'delay_seconds': 'number', 'start_at': 'number', 'auto_stop_seconds': 'number',
+               'auto_off_seconds': 'number', 'duration': 'number'}
+CONTROLLER_COMMAND_ARGS = {'set_channel_output': ('device_id', 'channel', 'enable'), 'run_protocol': ('protocol',)}
+_TYPE_CHECKS = {'int': lambda v: isinstance(v, int) and not isinstance(v, bool), 'bool': lambda v: isinstance(v, bool),
+                'str': lambda v: isinstance(v, str),
+                'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool) and v == v and abs(v) != float('inf')}
+
+
+def collect_set_devices(system_set):
+    """按 ControlSystemWindow 的方式汇总一个系统集中的全部设备配置。"""
+    return [config for _, config in iter_set_devices(system_set)]
+
+
+def parse_allow(hosts):
+    """
+    把 --allow 的主机/网段列表解析为 ip_network 列表。
+
+    :raises ValueError: 写法有误。
+    """
+    return [ipaddress.ip_network(host, strict=False) for host in hosts]
+
+
+def is_loopback(host):
+    if host == 'localhost': return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def check_command(command, devices):
+    """
+    在放入控制器的指令队列之前检查客户端提交的指令：目标设备、必需参数与参数类型。
+    run_protocol 的每一步按同样的规则检查。
+
+    :param devices: {设备 id: 设备配置}，本系统集的全部设备。
+    :return: 问题描述；没有问题时返回 None。
+    """
+    if not isinstance(command, dict) or not isinstance(command.get('type'), str):
+        return "指令格式错误，需要包含 'type' 字段。"
+    cmd_type = command['type']; params = command.get('params', {})
+    if not isinstance(params, dict): return f"指令 {cmd_type} 的 params 必须是对象。"
+    target = params.get('pump_id') or params.get('device_id')
+    if target is not None and target not in devices: return f"指令 {cmd_type}: 系统集中没有设备 {target}。"
+    required = CONTROLLER_COMMAND_ARGS.get(cmd_type, ())
+    if target is not None and cmd_type not in CONTROLLER_COMMAND_ARGS:
+        spec = find_driver(devices[target]); entry = spec.commands.get(cmd_type) if spec else None
+        if spec is not None and entry is None: return f"设备 {target} 不支持指令 {cmd_type}。"
+        if entry is not None and entry.args: required = entry.args
+    missing = [name for name in required if name not in params]
+    if missing: return f"指令 {cmd_type} 缺少参数: {', '.join(missing)}"
+    for name, value in params.items():
+        kind = PARAM_TYPES.get(name)
+        if kind is not None and not _TYPE_CHECKS[kind](value): return f"指令 {cmd_type} 的参数 {name}={value!r} 类型错误，需要 {kind}。"
+    if cmd_type == 'run_protocol':
+        steps = params['protocol']
+        if not isinstance(steps, list): return "协议必须是步骤列表。"
+        for n, step in enumerate(steps, 1):
+            if not isinstance(step, dict): return f"协议第 {n} 步格式错误。"
+            if not step.get('command'): continue
+            rest = {k: v for k, v in step.items() if k != 'command'}
+            problem = check_command({'type': step['command'], 'params': rest}, devices) if step['command'] != 'delay' else \
+                      (None if _TYPE_CHECKS['number'](rest.get('duration', 0)) else f"延时时长 {rest.get('duration')!r} 不是数字。")
+            if problem: return f"协议第 {n} 步: {problem}"
+    return None
+
+
+class ControllerHandle:
+    """服务端持有的单个系统集控制器进程及其队列。"""
+    def __init__(self, system_set):
+        self.set_id = system_set['set_id']
+        self.description = system_set.get('set_description', self.set_id)
+        self.devices = {dev['id']: dev for dev in collect_set_devices(system_set)}
+        self.device_ids = list(self.devices)
+        self.command_queue = multiprocessing.Queue()
+        self.status_queue = multiprocessing.Queue()
+        self.log_queue = multiprocessing.Queue()
+        # 控制器进程由 ControllerSupervisor 监护，崩溃或卡死后从检查点重启，客户端连接不受影响
+        self.process = ControllerSupervisor(collect_set_devices(system_set), self.command_queue, self.status_queue, self.log_queue)
+        self.command_queue = self.process.commands
+        self.last_status = None
+        self.last_event = None          # 最近一条 error/info 消息，晚到的订阅者同样能看到
+
+    def start(self):
+        self.process.start()
+
+    def stop(self, timeout=3):
+        if self.process.is_alive():
+            self.command_queue.put({'type': 'shutdown'})
+            self.process.join(timeout=timeout)
+            if self.process.is_alive(): self.process.terminate()
+
+    def describe(self):
+        return {'set_id': self.set_id, 'description': self.description,
+                'devices': self.device_ids, 'alive': self.process.is_alive()}
+
+
+class ClientSession:
+    """
+    一个已连接的客户端。
+    发送走独立的写线程，广播线程永远不会被某个慢客户端阻塞；写线程每次把积压的全部消息合并为一次 sendall。
+    请求回复与 error/info 事件放入不限长度的队列，从不丢弃 (客户端在等待回复)；只有状态快照进入有界缓冲区，
+    慢客户端积压时丢弃最旧的快照 (dropped 计数)。
+    设置了 batch_interval 的客户端，状态快照先进入批次，每个时间窗合并成一条 status_batch 发出。
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.subscriptions = set()      # 订阅的 set_id；包含 None 表示订阅全部
+        self.batch_interval = 0.0
+        self._outbox = deque()                             # 回复与事件，不丢弃
+        self._snapshots = deque(maxlen=CLIENT_SEND_BUFFER)  # 状态快照，满时丢弃最旧的
+        self._batch = deque(maxlen=CLIENT_SEND_BUFFER)
+        self._batch_deadline = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+        self.authenticated = False
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def wants(self, set_id):
+        return None in self.subscriptions or set_id in self.subscriptions
+
+    def send(self, message):
+        """发送回复或事件 (保证送达，不受缓冲区上限影响)。"""
+        self._put(self._outbox, message)
+
+    def _put(self, queue, message):
+        data = (json.dumps(message, ensure_ascii=False) + "\n").encode('utf-8')
+        with self._cond:
+            if self._closed: return
+            if queue.maxlen is not None and len(queue) == queue.maxlen: self.dropped += 1
+            queue.append(data)
+            self._cond.notify()
+
+    def send_status(self, set_id, data):
+        message = {'op': 'status', 'set_id': set_id, 'data': data}
+        # error/info 等事件 (不含 devices) 不能丢，也不进入批次
+        if 'devices' not in data: self.send(message); return
+        if self.batch_interval <= 0:
+            self._put(self._snapshots, message); return
+        with self._cond:
+            if self._closed: return
+            if len(self._batch) == self._batch.maxlen: self.dropped += 1
+            self._batch.append([set_id, data])
+            if self._batch_deadline is None:
+                self._batch_deadline = time.monotonic() + self.batch_interval
+                self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _take_due_batch(self):
+        """在持有锁时调用：批次到期 (或会话关闭) 则取出并编码为一条 status_batch。"""
+        if not self._batch or (not self._closed and time.monotonic() < self._batch_deadline): return None
+        items = list(self._batch); self._batch.clear(); self._batch_deadline = None
+        return (json.dumps({'op': 'status_batch', 'items': items}, ensure_ascii=False) + "\n").encode('utf-8')
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    batch = self._take_due_batch()
+                    if self._outbox or self._snapshots or batch or self._closed: break
+                    self._cond.wait(None if self._batch_deadline is None else max(0.0, self._batch_deadline - time.monotonic()))
+                if self._closed and not self._outbox and not self._snapshots and not batch: return
+                chunks = list(self._outbox) + list(self._snapshots); self._outbox.clear(); self._snapshots.clear()
+                if batch: chunks.append(batch)
+            try:
+                self.sock.sendall(b"".join(chunks))
+            except OSError:
+                self.close(); return
+
+
+class ServiceRequestHandler(socketserver.StreamRequestHandler):
+    """每个客户端连接一个处理线程，逐行读取 JSON 请求。"""
+    def handle(self):
+        service = self.server.service
+        if not service.client_allowed(self.client_address):
+            logger.warning("拒绝来自 %s 的连接 (不在 --allow 列表中)", self.client_address[0]); return
+        session = ClientSession(self.request)
+        session.authenticated = service.token is None
+        service.add_session(session)
+        try:
+            for raw_line in self.rfile:
+                line = raw_line.strip()
+                if not line: continue
+                try:
+                    request = json.loads(line.decode('utf-8'))
+                except (ValueError, UnicodeDecodeError) as e:
+                    session.send(service._error(None, f"无法解析请求: {e}")); continue
+                # 单个请求处理出错只回复错误，不结束会话 (同一连接上后续的请求照常处理)
+                try:
+                    reply = service.handle_request(session, request)
+                except Exception as e:
+                    logger.exception("处理请求出错: %r", request)
+                    reply = service._error(request.get('req') if isinstance(request, dict) else None, f"处理请求出错: {type(e).__name__}: {e}")
+                session.send(reply)
+        except OSError:
+            pass
+        finally:
+            service.remove_session(session)
+            session.close()
+
+
+class ThreadingTCPServiceServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class ThreadingUnixServiceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+class ControllerService:
+    """
+    无界面控制服务主体。
+
+    :param system_sets: 要运行的系统集配置列表 (与 CURRENT_CONFIG 中的元素结构一致)。
+    :param address: 监听地址，见 parse_address。
+    :param token: 共享口令；不为 None 时客户端必须先用 auth 请求认证，之后的请求才会被处理。
+    :param allow: 允许连接的主机/网段 (ip_network 列表，见 parse_allow)；None 表示不限制 (Unix socket 不检查)。
+    """
+    def __init__(self, system_sets, address=DEFAULT_ADDRESS, token=None, allow=None):
+        self.address = address
+        self.token = token
+        self.allow = allow
+        self.controllers = {s['set_id']: ControllerHandle(s) for s in system_sets}
+        self.sessions = set()
+        self._sessions_lock = threading.Lock()
+        self._running = False
+        self._server = None
+        self._threads = []
+
+    # --- 生命周期 ---
+    def start(self):
+        self._running = True
+        # 先启动控制器子进程再创建监听套接字，避免子进程继承监听 fd：
+        # 否则服务异常退出后遗留的子进程仍占着端口，客户端能连上却永远收不到回复
+        for handle in self.controllers.values():
+            handle.start()
+            t = threading.Thread(target=self._pump_status, args=(handle,), daemon=True); t.start(); self._threads.append(t)
+        kind, target = parse_address(self.address)
+        if kind == 'unix':
+            if not hasattr(socketserver, 'UnixStreamServer'):
+                raise ValueError("当前平台不支持 Unix socket，请使用 host:port 地址。")
+            if os.path.exists(target): os.unlink(target)
+            self._server = ThreadingUnixServiceServer(target, ServiceRequestHandler)
+        else:
+            self._server = ThreadingTCPServiceServer(target, ServiceRequestHandler)
+        self._server.service = self
+        t = threading.Thread(target=self._server.serve_forever, daemon=True); t.start(); self._threads.append(t)
+        logger.info("控制服务已启动，监听 %s，系统集: %s", self.address, ', '.join(self.controllers))
+
+    def stop(self):
+        self._running = False
+        if self._server:
+            self._server.shutdown(); self._server.server_close()
+        for handle in self.controllers.values(): handle.stop()
+        with self._sessions_lock:
+            for session in self.sessions: session.close()
+            self.sessions.clear()
+        logger.info("控制服务已停止。")
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while self._running: time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    # --- 客户端管理 ---
+    def client_allowed(self, client_address):
+        if not self.allow or not isinstance(client_address, tuple): return True
+        try:
+            host = ipaddress.ip_address(client_address[0])
+        except ValueError:
+            return False
+        return any(host in network for network in self.allow)
+
+    def add_session(self, session):
+        with self._sessions_lock: self.sessions.add(session)
+
+    def remove_session(self, session):
+        with self._sessions_lock: self.sessions.discard(session)
+
+    def broadcast(self, set_id, data):
+        with self._sessions_lock: targets = [s for s in self.sessions if s.wants(set_id)]
+        for session in targets: session.send_status(set_id, data)
+
+    def _pump_status(self, handle):
+        """把一个控制器进程的状态队列扇出给所有订阅者，同时清空其日志队列。"""
+        while self._running:
+            try:
+                data = handle.status_queue.get(timeout=0.2)
+                if 'devices' in data: handle.last_status = data
+                else: handle.last_event = data
+                self.broadcast(handle.set_id, data)
+            except Empty:
+                pass
+            try:
+                while True: handle.log_queue.get_nowait()
+            except Empty:
+                pass
+
+    # --- 请求处理 ---
+    def handle_request(self, session, request):
+        if not isinstance(request, dict): return self._error(None, "请求必须是 JSON 对象。")
+        op = request.get('op'); req = request.get('req')
+        reply = {'op': 'reply', 'req': req, 'ok': True}
+        if op == 'auth':
+            token = request.get('token')
+            session.authenticated = self.token is None or (isinstance(token, str) and hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8')))
+            if not session.authenticated:
+                logger.warning("客户端认证失败"); return self._error(req, "认证失败：口令错误。")
+        elif not session.authenticated:
+            return self._error(req, "服务要求认证：请先发送 {\"op\": \"auth\", \"token\": ...}。")
+        elif op == 'ping':
+            reply['time'] = time.time()
+        elif op == 'list_sets':
+            reply['sets'] = [h.describe() for h in self.controllers.values()]
+        elif op == 'subscribe':
+            set_id = request.get('set_id')
+            if set_id is not None and set_id not in self.controllers:
+                return self._error(req, f"未知的系统集: {set_id}")
+            batch_interval = request.get('batch_interval')
+            if batch_interval is not None:
+                if not _TYPE_CHECKS['number'](batch_interval): return self._error(req, f"batch_interval 必须是数字，收到 {batch_interval!r}")
+                session.batch_interval = max(0.0, float(batch_interval))
+            session.subscriptions.add(set_id)
+            # 新订阅者立即收到最近一次快照，无需等待下一个轮询周期
+            for handle in self.controllers.values():
+                if not session.wants(handle.set_id): continue
+                for data in (handle.last_event, handle.last_status):
+                    if data: session.send_status(handle.set_id, data)
+        elif op == 'unsubscribe':
+            session.subscriptions.clear()
+        elif op in ('command', 'run_protocol'):
+            handle = self.controllers.get(request.get('set_id'))
+            if handle is None:
+                return self._error(req, f"未知的系统集: {request.get('set_id')}")
+            if op == 'command': command = request.get('command')
+            else: command = {'type': 'run_protocol', 'params': {'protocol': request.get('protocol', [])}}
+            # 参数缺失或类型错误的指令在这里就拒绝，不进入控制器
+            problem = check_command(command, handle.devices)
+            if problem: return self._error(req, problem)
+            handle.command_queue.put(command)
+        else:
+            return self._error(req, f"未知的操作: {op}")
+        return reply
+
+    @staticmethod
+    def _error(req, message):
+        return {'op': 'reply', 'req': req, 'ok': False, 'error': message}
+
+
+def main(argv=None):
+    from config import get_config, get_registry
+    parser = argparse.ArgumentParser(description="无界面控制服务 (headless controller service)")
+    parser.add_argument('--sets', nargs='*', help="要启动的系统集 set_id，默认全部")
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help="监听地址: host:port 或 unix:/path/to.sock")
+    parser.add_argument('--token', default=os.environ.get(TOKEN_ENV) or None, help=f"共享口令，客户端须先认证 (默认取环境变量 {TOKEN_ENV})")
+    parser.add_argument('--allow', nargs='*', default=[], help="只接受这些主机/网段的连接，例如 192.168.10.2 192.168.10.0/24")
+    parser.add_argument('--simulate', action='store_true', help="使用模拟设备代替真实硬件 (见 driver_registry.py)")
+    args = parser.parse_args(argv)
+    if args.simulate: os.environ[SIMULATE_ENV] = "1"
+    try:
+        allow = parse_allow(args.allow) or None
+    except ValueError as e:
+        print(f"错误: --allow 写法有误: {e}"); return 1
+    kind, target = parse_address(args.address)
+    if kind == 'tcp' and not is_loopback(target[0]) and not args.token and not allow:
+        print(f"错误: 监听 {args.address} 会把指令接口暴露给网络，请指定 --token (或环境变量 {TOKEN_ENV}) 和/或 --allow。"); return 1
+    try:
+        get_registry()
+    except ConfigError as e:
+        print(f"错误: {e}"); return 1
+    system_sets = [s for s in get_config() if not args.sets or s['set_id'] in args.sets]
+    if not system_sets:
+        print(f"错误: 配置中没有匹配的系统集: {args.sets}"); return 1
+    setup_logging("service")
+    # 节点机上通常由 systemd / kill 停止服务：把 SIGTERM 转为正常退出，确保控制器子进程被关闭
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        ControllerService(system_sets, args.address, token=args.token, allow=allow).serve_forever()
+    finally:
+        shutdown_logging()
+    return 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
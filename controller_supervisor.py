@@ -0,0 +1,170 @@
+# file: controller_supervisor.py (控制器进程的监护与热重启)
+'''
+在 UI 进程中监护一个 SystemController 子进程。以前驱动抛出未处理的异常后控制器进程直接退出，
+窗口仍然打开却再也收不到任何状态；只能关闭窗口重新连接全部设备，协议执行到哪一步也随之丢失。
+
+    - 心跳: 控制器主循环每次迭代把 time.monotonic() 写入共享的 multiprocessing.Value；
+      进程以非零退出码结束 (崩溃)，或心跳超过 heartbeat_timeout 没有更新 (卡死，例如驱动调用不再返回，先终止进程)，
+      都会立即重启；
+    - 重启的控制器沿用原来的 StatusChannel 与日志队列，窗口无需重新连接；指令队列每次重启时换新，
+      窗口通过 supervisor.commands 发送指令，尚未执行的指令转入新队列 (被终止的进程可能正持有旧队列的读锁，
+      控制器空闲时一直阻塞在读取指令上，沿用旧队列会使新进程再也收不到指令)；新进程从检查点 (controller_checkpoint.py)
+      恢复设定值、定时任务、协议位置与累计量，与设定值一致的设备不会收到任何指令；
+    - 重启次数限制: restart_window 秒内最多重启 max_restarts 次，超过后放弃并向窗口报告错误 (避免配置错误导致反复崩溃)；
+    - 控制器正常退出 (关闭指令、没有设备连接成功) 时退出码为 0，不会重启。
+
+ControllerSupervisor 提供与 multiprocessing.Process 相同的 start / is_alive / join / terminate，
+窗口把它当作控制器进程使用；监护在一个后台线程中进行，不依赖 Qt。
+
+被终止的进程如果恰好在写状态通道，通道可能损坏 (multiprocessing 文档中的限制)；写入只持有极短的时间，实际影响很小。
+'''
+
+import time
+import threading
+import multiprocessing
+from queue import Empty
+
+from system_controller import SystemController
+from log_pipeline import get_logger
+
+logger = get_logger(__name__)
+
+HEARTBEAT_TIMEOUT = 15.0        # 主循环超过该时间没有心跳视为卡死 (秒)
+STARTUP_TIMEOUT = 60.0          # 连接设备阶段 (尚无心跳) 的超时
+MAX_RESTARTS = 5
+RESTART_WINDOW = 600.0          # 统计重启次数的时间窗 (秒)
+POLL_INTERVAL = 0.5
+DRAIN_TIMEOUT = 0.05            # 从旧指令队列转移待执行指令时的读取超时 (旧队列的锁被死进程持有时放弃)
+
+
+class CommandRelay:
+    """窗口使用的指令入口，put() 总是放入当前控制器进程的指令队列。"""
+    def __init__(self, queue):
+        self.queue = queue
+
+    def put(self, command):
+        self.queue.put(command)
+
+
+class ControllerSupervisor:
+    """
+    带监护的控制器进程。
+
+    :param device_configs, command_queue, status_queue, log_queue: 与 SystemController 相同；command_queue 为第一个进程的指令队列，
+                                  之后的指令应通过 self.commands 发送。
+    :param controller_kwargs: 传给 SystemController 的其它参数 (binary_status、record_dir 等)。
+    """
+    def __init__(self, device_configs, command_queue, status_queue, log_queue, heartbeat_timeout=HEARTBEAT_TIMEOUT,
+                 startup_timeout=STARTUP_TIMEOUT, max_restarts=MAX_RESTARTS, restart_window=RESTART_WINDOW, **controller_kwargs):
+        self.device_configs = device_configs
+        self.commands = CommandRelay(command_queue)
+        self.status_queue = status_queue
+        self.log_queue = log_queue
+        self.controller_kwargs = controller_kwargs
+        self.heartbeat_timeout = heartbeat_timeout
+        self.startup_timeout = startup_timeout
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.heartbeat = multiprocessing.Value('d', 0.0, lock=False)
+        self.process = None
+        self.restarts = []                    # 每次重启的 time.monotonic() 时间
+        self._started_at = 0.0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._monitor = None
+
+    # --- 与 multiprocessing.Process 相同的接口 ---
+    def start(self):
+        self._spawn(None)
+        self._monitor = threading.Thread(target=self._watch, name="controller-supervisor", daemon=True)
+        self._monitor.start()
+        return self
+
+    def is_alive(self):
+        """控制器进程在运行，或正在被重启。"""
+        with self._lock:
+            process = self.process
+        return process is not None and (process.is_alive() or (self._monitor is not None and self._monitor.is_alive() and not self._stopping.is_set()))
+
+    def join(self, timeout=None):
+        """等待控制器退出 (窗口发送关闭指令之后调用)；等待期间不再重启。"""
+        self._stopping.set()
+        with self._lock:
+            process = self.process
+        if process is not None: process.join(timeout)
+
+    def terminate(self):
+        self._stopping.set()
+        with self._lock:
+            process = self.process
+        if process is not None and process.is_alive(): process.terminate()
+
+    @property
+    def exitcode(self):
+        return self.process.exitcode if self.process is not None else None
+
+    # --- 监护 ---
+    def _spawn(self, reason):
+        """
+        启动 (或重启) 控制器进程。
+
+        :param reason: None 表示首次启动；否则为重启原因，控制器据此从检查点恢复。
+        """
+        self.heartbeat.value = 0.0
+        controller = SystemController(self.device_configs, self.commands.queue, self.status_queue, self.log_queue,
+                                      heartbeat=self.heartbeat, checkpoint=True, resume=reason, **self.controller_kwargs)
+        process = multiprocessing.Process(target=controller.run, daemon=True)
+        process.start()
+        with self._lock:
+            self.process = process
+        self._started_at = time.monotonic()
+
+    def _watch(self):
+        while not self._stopping.wait(POLL_INTERVAL):
+            reason = self.check()
+            if reason is None: continue
+            if self._stopping.is_set(): return
+            if not self._restart(reason): return
+
+    def check(self):
+        """
+        检查一次控制器：返回需要重启的原因，正常运行时返回 None；进程正常退出时停止监护。
+        """
+        process = self.process
+        if not process.is_alive():
+            if process.exitcode == 0: self._stopping.set(); return None
+            return f"进程异常退出 (退出码 {process.exitcode})"
+        beat = self.heartbeat.value; now = time.monotonic()
+        if beat < self._started_at:
+            if now - self._started_at > self.startup_timeout: return f"启动超过 {self.startup_timeout:.0f} 秒没有完成"
+        elif now - beat > self.heartbeat_timeout:
+            return f"主循环 {now - beat:.1f} 秒没有响应"
+        return None
+
+    def _restart(self, reason):
+        now = time.monotonic()
+        self.restarts = [t for t in self.restarts if now - t < self.restart_window]
+        process = self.process
+        if process.is_alive():
+            logger.error("控制器%s，终止进程 %s", reason, process.pid)
+            process.terminate(); process.join(timeout=5)
+            if process.is_alive(): process.kill(); process.join(timeout=5)
+        if len(self.restarts) >= self.max_restarts:
+            message = f"控制器{reason}。{self.restart_window / 60:.0f} 分钟内已重启 {len(self.restarts)} 次，不再自动重启，请检查设备与日志后重新打开窗口。"
+            logger.error(message); self.status_queue.put({'error': message}); self._stopping.set()
+            return False
+        self.restarts.append(now)
+        logger.warning("控制器%s，从检查点重启 (第 %d 次)", reason, len(self.restarts))
+        self._renew_command_queue()
+        self._spawn(reason)
+        return True
+
+    def _renew_command_queue(self):
+        old, new = self.commands.queue, multiprocessing.Queue()
+        self.commands.queue = new
+        moved = 0
+        try:
+            while True: new.put(old.get(timeout=DRAIN_TIMEOUT)); moved += 1
+        except Empty:
+            pass
+        if moved: logger.info("已把 %d 条待执行指令转入新的指令队列", moved)
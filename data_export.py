@@ -0,0 +1,148 @@
+# file: data_export.py (分块流式数据导出: CSV / Parquet / XLSX)
+'''
+把一张 "时间 + 若干数值列" 的表按块流式写入文件，可在工作线程中运行，支持进度回调与取消。
+以前导出时在 Qt 线程里构建 DataFrame 再 to_excel(engine='openpyxl')，大数据量要卡住界面几分钟。
+
+    - CSV:     每块用 np.savetxt 直接写入文件；
+    - Parquet: 需要 pyarrow，每块写成一个 row group；
+    - XLSX:    安装了 xlsxwriter 时使用它的 constant_memory 模式 (逐行写出，内存占用与行数无关)，
+               否则退回 openpyxl 的 write_only 模式；超过 Excel 单表行数上限时自动续写到下一张工作表。
+
+格式由文件扩展名决定。取消或出错时删除写了一半的文件。界面部分 (进度对话框) 在 control_ui.py 中。
+'''
+
+import os
+
+import numpy as np
+
+from log_pipeline import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_CHUNK_ROWS = 20000
+EXCEL_MAX_ROWS = 1048576            # 含表头
+EXPORT_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.xlsx': 'xlsx'}
+FILE_FILTER = "Excel Files (*.xlsx);;CSV Files (*.csv);;Parquet Files (*.parquet)"
+
+
+class ExportError(Exception):
+    """导出失败 (缺少可选依赖、写文件出错等)。"""
+
+
+class ExportCancelled(ExportError):
+    """导出被用户取消。"""
+
+
+def export_format(path):
+    """按扩展名返回 'csv' / 'parquet' / 'xlsx'。"""
+    fmt = EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None: raise ExportError(f"不支持的导出格式: {path} (可用: {', '.join(EXPORT_FORMATS)})")
+    return fmt
+
+
+def _chunks(n, chunk_rows):
+    for start in range(0, n, chunk_rows): yield start, min(n, start + chunk_rows)
+
+
+def export_table(path, columns, t, data, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None, cancel=None):
+    """
+    把表写入 path。
+
+    :param columns: 数值列名 (不含时间列)。
+    :param t: (n,) 时间数组，写为第一列 'time'。
+    :param data: (len(columns), n) 数值数组。
+    :param progress: 可选的 progress(已写行数, 总行数) 回调，每块调用一次 (在调用线程中)。
+    :param cancel: 可选的 threading.Event，置位后在下一块之前停止并抛出 ExportCancelled。
+    :return: 写入的行数。
+    """
+    fmt = export_format(path)
+    writer = {'csv': _write_csv, 'parquet': _write_parquet, 'xlsx': _write_xlsx}[fmt]
+    header = ['time'] + list(columns)
+    n = len(t)
+
+    def step(done):
+        if cancel is not None and cancel.is_set(): raise ExportCancelled("导出已取消。")
+        if progress: progress(done, n)
+
+    try:
+        writer(path, header, np.asarray(t, dtype=np.float64), np.asarray(data), chunk_rows, step)
+    except ExportCancelled:
+        _remove_partial(path); raise
+    except ExportError:
+        _remove_partial(path); raise
+    except Exception as e:
+        _remove_partial(path); raise ExportError(f"写入 {path} 失败: {e}") from e
+    logger.info("已导出 %d 行到 %s", n, path)
+    return n
+
+
+def _remove_partial(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _write_csv(path, header, t, data, chunk_rows, step):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(",".join(header) + "\n")
+        for start, end in _chunks(len(t), chunk_rows):
+            step(start)
+            np.savetxt(f, np.column_stack([t[start:end], data[:, start:end].T]), delimiter=",", fmt="%.10g")
+        step(len(t))
+
+
+def _write_parquet(path, header, t, data, chunk_rows, step):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ExportError("导出 Parquet 需要安装 pyarrow (pip install pyarrow)。") from e
+    schema = pa.schema([(header[0], pa.float64())] + [(name, pa.from_numpy_dtype(data.dtype)) for name in header[1:]])
+    with pq.ParquetWriter(path, schema) as writer:
+        for start, end in _chunks(len(t), chunk_rows):
+            step(start)
+            arrays = [pa.array(t[start:end])] + [pa.array(row[start:end]) for row in data]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        step(len(t))
+
+
+def _write_xlsx(path, header, t, data, chunk_rows, step):
+    try:
+        import xlsxwriter
+    except ImportError:
+        xlsxwriter = None
+    rows_per_sheet = EXCEL_MAX_ROWS - 1
+    if xlsxwriter is not None:
+        # NaN/inf 写成空单元格 (Excel 不支持)
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': False})
+        sheet = None
+        try:
+            for start, end in _chunks(len(t), chunk_rows):
+                step(start)
+                block = np.column_stack([t[start:end], data[:, start:end].T]).tolist()
+                for i, row in enumerate(block, start):
+                    if i % rows_per_sheet == 0:
+                        sheet = workbook.add_worksheet(f"Data{i // rows_per_sheet + 1}"); sheet.write_row(0, 0, header)
+                    sheet.write_row(i % rows_per_sheet + 1, 0, [v if v == v else None for v in row])
+            if sheet is None: workbook.add_worksheet("Data1").write_row(0, 0, header)
+        finally:
+            workbook.close()
+    else:
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = None
+        try:
+            for start, end in _chunks(len(t), chunk_rows):
+                step(start)
+                block = np.column_stack([t[start:end], data[:, start:end].T]).tolist()
+                for i, row in enumerate(block, start):
+                    if i % rows_per_sheet == 0:
+                        sheet = workbook.create_sheet(f"Data{i // rows_per_sheet + 1}"); sheet.append(header)
+                    sheet.append([v if v == v else None for v in row])
+        except BaseException:
+            for ws in workbook.worksheets: ws.close()     # 关闭 write_only 工作表的临时文件
+            raise
+        if sheet is None: workbook.create_sheet("Data1").append(header)
+        workbook.save(path)
+    step(len(t))
@@ -0,0 +1,198 @@
+# file: device_registry.py (编译后的设备配置)
+'''
+把嵌套的系统集配置 (CURRENT_CONFIG) 编译为只读的设备注册表。
+
+配置只在加载时遍历一次，建立以下索引，之后界面和控制器的查找都是 O(1):
+    by_id      设备 id -> DeviceEntry
+    by_port    规范化的端口 -> (DeviceEntry, ...)
+    by_type    设备类型 -> (DeviceEntry, ...)
+    by_set     set_id -> (DeviceEntry, ...)
+
+编译时同时校验配置:
+    错误 (抛出 ConfigError): 设备 id 重复、set_id 重复、同一端口上 Modbus 地址冲突、同一系统集内电源与其它设备共用端口；
+    警告 (记录在 warnings 中): 同一个端口被不同系统集使用 (两个系统集同时启动时第二个会打不开串口)。
+
+注册表可以 pickle，传给控制器子进程后在子进程中重新编译，启动器和控制器使用同一套模型。
+'''
+
+import re
+import copy
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+import driver_registry
+
+_VISA_SERIAL = re.compile(r'^ASRL(\d+)(::INSTR)?$', re.IGNORECASE)
+_COM_PORT = re.compile(r'^COM(\d+)$', re.IGNORECASE)
+DEFAULT_BAUDRATE = 9600      # 设备配置中没有 baudrate 时驱动使用的波特率
+
+
+class ConfigError(ValueError):
+    """配置校验失败；problems 为全部问题的列表。"""
+    def __init__(self, problems):
+        self.problems = list(problems)
+        super().__init__("配置校验失败:\n" + "\n".join(f" - {p}" for p in self.problems))
+
+
+class DeviceEntry(NamedTuple):
+    id: str
+    type: str
+    description: str
+    port: str
+    address: Optional[int]
+    set_id: str
+    subsystem: Optional[str]         # 'A' / 'B'；电源为 None
+    node: Optional[str]              # 远程节点地址；本地设备为 None
+    config: MappingProxyType         # 原始设备配置的只读视图
+
+    @property
+    def is_power_supply(self):
+        return driver_registry.is_power_supply(self.type)
+
+    def config_dict(self):
+        """返回可修改、可 pickle 的配置副本 (传给 SystemController / 驱动使用)。"""
+        return dict(self.config)
+
+
+def normalize_port(port):
+    """
+    规范化端口名，使指向同一物理串口的不同写法得到相同的键:
+    'com9' -> 'COM9'，VISA 资源 'ASRL6::INSTR' -> 'COM6'；网关地址等其它写法只去掉首尾空白。
+    """
+    port = str(port or '').strip()
+    match = _VISA_SERIAL.match(port) or _COM_PORT.match(port)
+    return f"COM{match.group(1)}" if match else port
+
+
+def iter_set_devices(system_set):
+    """按 (subsystem, 设备配置) 依次给出一个系统集中的全部设备：电源在前，然后是子系统 A、B 的泵。"""
+    yield None, system_set['power_supply']
+    for subsystem in ('A', 'B'):
+        for pump in system_set[f'subsystem_{subsystem}']['pumps']: yield subsystem, pump
+
+
+class DeviceRegistry:
+    """
+    只读的设备注册表。
+
+    :param system_sets: 系统集配置列表；内部保存深拷贝，之后对原配置的修改不会影响注册表。
+    """
+    def __init__(self, system_sets):
+        self._system_sets = copy.deepcopy(list(system_sets))
+        self.warnings = []
+        self._compile()
+
+    @classmethod
+    def from_devices(cls, device_configs, set_id="devices"):
+        """由扁平的设备配置列表构建注册表 (控制器或单设备调试使用，没有子系统结构)。"""
+        registry = cls.__new__(cls)
+        registry._system_sets = None
+        registry._device_configs = copy.deepcopy(list(device_configs))
+        registry._set_id = set_id
+        registry.warnings = []
+        registry._compile()
+        return registry
+
+    def __getstate__(self):
+        if self._system_sets is None: return {'devices': self._device_configs, 'set_id': self._set_id}
+        return {'sets': self._system_sets}
+
+    def __setstate__(self, state):
+        self._system_sets = state.get('sets')
+        self._device_configs = state.get('devices')
+        self._set_id = state.get('set_id')
+        self.warnings = []
+        self._compile()
+
+    def _iter_raw(self):
+        if self._system_sets is None:
+            for config in self._device_configs: yield self._set_id, None, None, config
+            return
+        for system_set in self._system_sets:
+            node = system_set.get('node') or None
+            for subsystem, config in iter_set_devices(system_set): yield system_set['set_id'], subsystem, node, config
+
+    def _compile(self):
+        problems = []
+        by_id = {}; by_port = {}; by_type = {}; by_set = {}; bus_slots = {}; port_sets = {}; bus_bauds = {}
+        if self._system_sets is not None:
+            set_ids = [s['set_id'] for s in self._system_sets]
+            problems += [f"系统集 id 重复: {set_id}" for set_id in sorted({i for i in set_ids if set_ids.count(i) > 1})]
+            self._sets = {s['set_id']: s for s in self._system_sets}
+        else:
+            self._sets = {}
+        for set_id, subsystem, node, config in self._iter_raw():
+            device_type = str(config.get('type', '')).lower()
+            address = config.get('address')
+            entry = DeviceEntry(config['id'], device_type, config.get('description', config['id']), config.get('port', ''),
+                                address, set_id, subsystem, node, MappingProxyType(config))
+            if entry.id in by_id:
+                problems.append(f"设备 id 重复: {entry.id} (系统集 {by_id[entry.id].set_id} 与 {set_id})"); continue
+            by_id[entry.id] = entry
+            by_type.setdefault(device_type, []).append(entry)
+            by_set.setdefault(set_id, []).append(entry)
+            # 端口按所在机器区分：不同节点上的 COM9 是不同的物理串口
+            port_key = (node, normalize_port(entry.port))
+            by_port.setdefault(port_key, []).append(entry)
+            if not port_key[1]: continue
+            port_sets.setdefault(port_key, set()).add(set_id)
+            others = bus_slots.setdefault(port_key, {})
+            sharing_psu = next((e for e in others.values() if e.is_power_supply or entry.is_power_supply), None)
+            if sharing_psu is not None:
+                # 不同系统集之间只在同时启动时才会争用端口，记为警告 (见下面的跨系统集检查)
+                if sharing_psu.set_id == set_id: problems.append(f"端口冲突: 电源不能与其它设备共用端口 {entry.port} ({sharing_psu.id} 与 {entry.id})")
+            elif address in others:
+                problems.append(f"地址冲突: {others[address].id} 与 {entry.id} 在端口 {entry.port} 上使用同一 Modbus 地址 {address}")
+            # 同一条 RS-485 总线只能工作在一个波特率上 (网关端点的串口参数在网关上配置，不检查)
+            if not entry.is_power_supply and '://' not in entry.port:
+                baudrate = config.get('baudrate', DEFAULT_BAUDRATE)
+                first = bus_bauds.setdefault((port_key, set_id), (baudrate, entry))
+                if first[0] != baudrate:
+                    problems.append(f"波特率冲突: {first[1].id} ({first[0]}) 与 {entry.id} ({baudrate}) 在同一端口 {entry.port} 上")
+            others.setdefault(address, entry)
+        for (node, port), sets in port_sets.items():
+            if len(sets) > 1 and port:
+                self.warnings.append(f"串口 {port}{f' (节点 {node})' if node else ''} 被多个系统集使用: {', '.join(sorted(sets))}，这些系统集不能同时启动。")
+        if problems: raise ConfigError(problems)
+        self.by_id = MappingProxyType(by_id)
+        self.by_type = MappingProxyType({k: tuple(v) for k, v in by_type.items()})
+        self.by_set = MappingProxyType({k: tuple(v) for k, v in by_set.items()})
+        self.by_port = MappingProxyType({k: tuple(v) for k, v in by_port.items()})
+
+    # --- 查询 ---
+    def __len__(self):
+        return len(self.by_id)
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def __contains__(self, device_id):
+        return device_id in self.by_id
+
+    def get(self, device_id):
+        return self.by_id.get(device_id)
+
+    def description(self, device_id):
+        entry = self.by_id.get(device_id)
+        return entry.description if entry else device_id
+
+    def devices_of_type(self, device_type):
+        return self.by_type.get(device_type, ())
+
+    def devices_on_port(self, port, node=None):
+        return self.by_port.get((node, normalize_port(port)), ())
+
+    def devices_in_set(self, set_id):
+        return self.by_set.get(set_id, ())
+
+    def power_supply(self, set_id=None):
+        """返回系统集 (或整个注册表) 中的第一台电源。"""
+        entries = self.by_set.get(set_id, ()) if set_id is not None else self.by_id.values()
+        return next((e for e in entries if e.is_power_supply), None)
+
+    def system_set(self, set_id):
+        return self._sets.get(set_id)
+
+    def device_configs(self, set_id):
+        """系统集中全部设备配置的可修改副本，顺序与 ControlSystemWindow 一致。"""
+        return [entry.config_dict() for entry in self.by_set.get(set_id, ())]
@@ -0,0 +1,176 @@
+# file: driver_registry.py (设备驱动注册表)
+'''
+设备驱动注册表：每种设备类型在这里登记一次，
+
+    - 驱动类与模拟驱动类 ('模块名:类名'，按需导入，UI 进程查询类型信息时不会加载 pymodbus / pyvisa)；
+    - 构造参数与设备配置字段的对应关系；
+    - 支持的设备指令 (指令类型 -> 驱动方法及参数)，SystemController 在设备连接后一次性解析为查找表；
+    - 状态字段 (status_codec 用来生成二进制帧布局)。
+
+添加新型号的设备不需要修改 system_controller.py：在新的驱动模块 (或任意模块) 中调用 register_driver()，
+并在设备配置中写上 "driver_module": "<该模块名>"，首次遇到未登记的类型时会导入它。
+
+环境变量 MPS_SIMULATE=1 (或 controller_service.py --simulate) 时，控制器使用登记的模拟驱动代替真实硬件，
+dry-run 与 benchmark_controller.py 也通过这里创建模拟设备。
+'''
+
+import os
+import importlib
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+SIMULATE_ENV = "MPS_SIMULATE"
+KIND_PUMP = 'pump'
+KIND_POWER_SUPPLY = 'power_supply'
+# 指令参数中用于路由、不传给驱动方法的键
+ROUTING_KEYS = frozenset(('pump_id', 'device_id', 'auto_off_seconds', 'auto_stop_seconds'))
+
+
+class DeviceCommand(NamedTuple):
+    """
+    一条设备指令对应的驱动方法。
+
+    :param method: 驱动对象上的方法名。
+    :param args: None 表示把指令参数 (去掉 ROUTING_KEYS) 作为关键字参数传入；
+                 元组表示按名称从指令参数中取出，依次作为位置参数传入。
+    """
+    method: str
+    args: Optional[tuple] = None
+
+
+class DriverSpec(NamedTuple):
+    type_name: str
+    kind: str
+    driver: str                      # '模块名:类名'
+    simulator: Optional[str]         # '模块名:类名'，没有模拟驱动时为 None
+    config_args: tuple               # ((配置字段, 构造参数名), ...)
+    commands: MappingProxyType       # 指令类型 -> DeviceCommand
+    status_fields: tuple             # ((字段名, struct 格式码), ...)
+
+    @property
+    def module(self):
+        return self.driver.partition(':')[0]
+
+    def constructor_kwargs(self, config):
+        return {arg: config[key] for key, arg in self.config_args if key in config}
+
+
+_drivers = {}
+
+
+def register_driver(type_name, driver, *, kind, config_args, commands, status_fields, simulator=None):
+    """
+    登记一种设备类型。重复登记同一类型时后者覆盖前者 (便于替换驱动)。
+
+    :param type_name: 设备配置中的 type (不区分大小写)。
+    :param driver: 驱动类，写成 '模块名:类名'。
+    :param kind: KIND_PUMP 或 KIND_POWER_SUPPLY。
+    :param config_args: ((配置字段, 构造参数名), ...)，例如 (('port', 'port'), ('address', 'unit_address'))。
+    :param commands: {指令类型: DeviceCommand}。
+    :param status_fields: get_status() 返回的数值字段及其 struct 格式码 ('?' 布尔, 'd' 浮点)。
+    :param simulator: 模拟驱动类，写成 '模块名:类名'；构造参数与真实驱动相同，另接受 latency (秒)。
+    """
+    spec = DriverSpec(type_name.lower(), kind, driver, simulator, tuple(config_args),
+                      MappingProxyType(dict(commands)), tuple((name, code) for name, code in status_fields))
+    _drivers[spec.type_name] = spec
+    return spec
+
+
+def get_driver(config_or_type):
+    """
+    返回设备类型的 DriverSpec。
+
+    :param config_or_type: 设备配置字典或类型名；配置中带 "driver_module" 且类型尚未登记时先导入该模块。
+    :raises ValueError: 未知的设备类型。
+    """
+    config = {'type': config_or_type} if isinstance(config_or_type, str) else config_or_type
+    type_name = str(config.get('type', '')).lower()
+    spec = _drivers.get(type_name)
+    if spec is None and config.get('driver_module'):
+        importlib.import_module(config['driver_module'])
+        spec = _drivers.get(type_name)
+    if spec is None:
+        raise ValueError(f"未知的设备类型: {type_name}，已登记的类型: {', '.join(sorted(_drivers))}")
+    return spec
+
+
+def find_driver(config_or_type):
+    """与 get_driver 相同，但未知类型返回 None。"""
+    try:
+        return get_driver(config_or_type)
+    except (ValueError, ImportError):
+        return None
+
+
+def registered_types():
+    return sorted(_drivers)
+
+
+def is_power_supply(config_or_type):
+    spec = find_driver(config_or_type)
+    return spec is not None and spec.kind == KIND_POWER_SUPPLY
+
+
+def status_fields(config_or_type):
+    """设备类型的状态字段列表；未知类型返回 None (不进入二进制帧)。"""
+    spec = find_driver(config_or_type)
+    return list(spec.status_fields) if spec else None
+
+
+def simulation_requested():
+    return os.environ.get(SIMULATE_ENV, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _load_class(path):
+    module, _, name = path.partition(':')
+    return getattr(importlib.import_module(module), name)
+
+
+def create_device(config, simulate=False):
+    """
+    按设备配置创建驱动对象 (未连接)。驱动模块在这里才导入，控制器子进程只加载实际用到的驱动。
+
+    :param simulate: True 时创建模拟驱动；配置中的 sim_latency_ms 为每次通讯的模拟耗时。
+    """
+    spec = get_driver(config)
+    kwargs = spec.constructor_kwargs(config)
+    if simulate:
+        if not spec.simulator: raise ValueError(f"设备类型 {spec.type_name} 没有登记模拟驱动。")
+        return _load_class(spec.simulator)(latency=float(config.get('sim_latency_ms', 0.0)) / 1000.0, **kwargs)
+    return _load_class(spec.driver)(**kwargs)
+
+
+def resolve_commands(device, spec):
+    """
+    把 DriverSpec 中的指令解析为 {指令类型: (绑定方法, 参数名元组或 None)}，每台设备在连接后只解析一次。
+    驱动缺少某个方法时该指令不进入查找表 (收到时按"设备不支持该指令"处理)。
+    """
+    table = {}
+    for command_type, command in spec.commands.items():
+        method = getattr(device, command.method, None)
+        if callable(method): table[command_type] = (method, command.args)
+    return table
+
+
+# --- 内置设备类型 ---
+# 状态字段中的 dispensed_ml / chN_charge_c 为控制器内积分得到的累计量 (见 integrators.py)，
+# timeouts / crc_errors 为 Modbus 事务层统计的通讯错误次数 (见 modbus_transaction.py)。
+# 驱动模块只以字符串登记，打包 exe 时必须列在 build.spec 的 hiddenimports 中
+_PUMP_COMMANDS = {'start_pump': DeviceCommand('start'), 'stop_pump': DeviceCommand('stop', ()),
+                  'set_pump_params': DeviceCommand('set_parameters')}
+_PUMP_ARGS = (('port', 'port'), ('address', 'unit_address'), ('baudrate', 'baudrate'))
+
+register_driver('kamoer', 'kamoer_pump_controller:KamoerPeristalticPump', kind=KIND_PUMP, config_args=_PUMP_ARGS, commands=_PUMP_COMMANDS,
+                status_fields=[('is_running', '?'), ('speed_rpm', 'd'), ('flow_rate_ml_min', 'd'), ('dispensed_ml', 'd'), ('timeouts', 'I'), ('crc_errors', 'I')],
+                simulator='simulated_devices:SimulatedPeristalticPump')
+register_driver('oushisheng', 'plunger_pump_controller:OushishengPlungerPump', kind=KIND_PUMP, config_args=_PUMP_ARGS, commands=_PUMP_COMMANDS,
+                status_fields=[('is_running', '?'), ('pressure_mpa', 'd'), ('flow_rate_ml_min', 'd'), ('speed_rpm', 'd'), ('dispensed_ml', 'd'),
+                               ('timeouts', 'I'), ('crc_errors', 'I')],
+                simulator='simulated_devices:SimulatedPlungerPump')
+register_driver('gpd_4303s', 'power_supply_controller:GPD4303SPowerSupply', kind=KIND_POWER_SUPPLY, config_args=(('port', 'port'),),
+                commands={'set_power_voltage': DeviceCommand('set_voltage', ('channel', 'voltage')),
+                          'set_power_current': DeviceCommand('set_current', ('channel', 'current')),
+                          'set_power_output': DeviceCommand('set_output', ('enable',))},
+                status_fields=[('output_on', '?'), ('ch1_voltage', 'd'), ('ch1_current', 'd'), ('ch2_voltage', 'd'), ('ch2_current', 'd'),
+                               ('ch1_charge_c', 'd'), ('ch2_charge_c', 'd')],
+                simulator='simulated_devices:SimulatedPowerSupply')
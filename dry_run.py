@@ -0,0 +1,355 @@
+# file: dry_run.py (协议试运行：虚拟时钟上的模拟执行)
+'''
+在真实硬件上运行一个小时的协议之前，先在模拟设备上以虚拟时钟把它跑一遍 (通常不到一秒)，得到:
+
+    - 时间线: 每条指令、报警、错误发生的 (虚拟) 时间，协议执行完毕的时间以及所有定时动作结束的时间；
+    - 预计累计量: 每台泵输出的体积 (ml)、电源每个通道输出的电荷 (C)，与控制器使用同一套积分器；
+      除每秒轮询的样本外，每条指令执行前后各取一个样本，分段恒定的流量/电流因此被精确积分；
+    - 总线占用估计: 按波特率估算每次通讯在总线上占用的时间 (Modbus RTU 帧长 + 帧间隔 + 设备响应)，
+      给出每条总线的平均与峰值占用率 (峰值按轮询间隔分桶)，以及同时运行的泵的最大数量。
+
+执行逻辑就是 SystemController 本身 (指令路由、协议步骤、定时关闭/停止、报警联锁)，只是把定时器轮换成
+虚拟时钟上的定时器、把设备换成 driver_registry 登记的模拟驱动 (通讯耗时为 0)，不写状态文件和运行记录。
+
+多个候选协议可以用 dry_run_many() 在进程池中并行试运行；命令行:
+
+    python dry_run.py --set power_supply_1_system 协议A.json 协议B.json --workers 4
+'''
+
+import os
+import sys
+import time
+import heapq
+import random
+import argparse
+import itertools
+from collections import deque
+from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+
+from system_controller import SystemController, STATUS_UPDATE_INTERVAL
+from integrators import IntegratorBank
+from device_registry import normalize_port
+from modbus_transaction import char_time, inter_frame_gap
+import driver_registry
+
+DEFAULT_MAX_DURATION = 7 * 24 * 3600.0     # 虚拟时间上限 (秒)，防止没有终点的协议无限运行
+MODBUS_REQUEST_CHARS = 8                   # 读/写寄存器请求帧长度 (字节)
+MODBUS_RESPONSE_CHARS = 9                  # 读两个寄存器的响应帧长度 (字节)
+MODBUS_TURNAROUND = 0.005                  # 设备处理时间 (秒)
+SCPI_CHARS = 16                            # 电源一次 SCPI 查询/设置的往返字符数
+SCPI_TURNAROUND = 0.010
+
+
+class VirtualClock:
+    """虚拟时钟，从 0 开始，单位秒。"""
+    def __init__(self):
+        self.now = 0.0
+
+
+class _VirtualTimer:
+    __slots__ = ('key', 'due', 'callback', 'args', 'active', '_timers')
+
+    def __init__(self, timers, key, due, callback, args):
+        self._timers = timers; self.key = key; self.due = due; self.callback = callback; self.args = args; self.active = True
+
+    def cancel(self):
+        return self._timers.cancel(self)
+
+    @property
+    def remaining(self):
+        return max(0.0, self.due - self._timers.clock.now)
+
+
+class VirtualTimers:
+    """与 timer_wheel.TimerWheel 接口相同的定时器，按虚拟时钟触发 (由 DryRunController 驱动，没有线程)。"""
+    def __init__(self, clock):
+        self.clock = clock
+        self._heap = []
+        self._keys = {}
+        self._seq = itertools.count()
+        self._count = 0
+        self.fired = 0
+
+    def start(self):
+        return self
+
+    def stop(self, cancel_pending=True):
+        if cancel_pending: self.cancel_all()
+
+    def schedule(self, delay, callback, *args, key=None):
+        return self.schedule_at(self.clock.now + max(0.0, delay), callback, *args, key=key)
+
+    def schedule_at(self, due, callback, *args, key=None):
+        if key is not None and key in self._keys: self._remove(self._keys[key])
+        timer = _VirtualTimer(self, key, due, callback, args)
+        heapq.heappush(self._heap, (due, next(self._seq), timer))
+        if key is not None: self._keys[key] = timer
+        self._count += 1
+        return timer
+
+    def cancel(self, timer_or_key):
+        timer = timer_or_key if isinstance(timer_or_key, _VirtualTimer) else self._keys.get(timer_or_key)
+        if timer is None or not timer.active: return False
+        self._remove(timer)
+        return True
+
+    def cancel_all(self, predicate=None):
+        victims = [t for _, _, t in self._heap if t.active and (predicate is None or predicate(t.key))]
+        for timer in victims: self._remove(timer)
+        return len(victims)
+
+    def get(self, key):
+        return self._keys.get(key)
+
+    def pending(self):
+        return sorted((t for _, _, t in self._heap if t.active), key=lambda t: t.due)
+
+    def __len__(self):
+        return self._count
+
+    def _remove(self, timer):
+        timer.active = False
+        if timer.key is not None and self._keys.get(timer.key) is timer: del self._keys[timer.key]
+        self._count -= 1
+
+    def next_due(self):
+        while self._heap and not self._heap[0][2].active: heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def fire_next(self):
+        """触发最早的一个定时器 (调用前时钟已推进到它的到期时间)。"""
+        _, _, timer = heapq.heappop(self._heap)
+        self._remove(timer); self.fired += 1
+        timer.callback(*timer.args)
+
+
+class _CommandQueue:
+    """代替 multiprocessing.Queue：定时器和协议放入的指令在同一虚拟时刻内依次执行。"""
+    def __init__(self):
+        self.items = deque()
+
+    def put(self, item):
+        self.items.append(item)
+
+
+class _EventSink:
+    """代替状态队列：只收集事件 (info / error / 报警)，快照由 DryRunController 自己处理。"""
+    def __init__(self, clock):
+        self.clock = clock
+        self.events = []
+
+    def put(self, item):
+        if isinstance(item, dict) and 'devices' not in item: self.events.append((self.clock.now, item))
+
+
+def transaction_seconds(config):
+    """估计设备一次通讯在总线上占用的时间 (秒)。"""
+    if driver_registry.is_power_supply(config):
+        return SCPI_CHARS * char_time(config.get('baudrate', 9600)) + SCPI_TURNAROUND
+    baudrate = config.get('baudrate', 9600)
+    return (MODBUS_REQUEST_CHARS + MODBUS_RESPONSE_CHARS) * char_time(baudrate) + 2 * inter_frame_gap(baudrate) + MODBUS_TURNAROUND
+
+
+class DryRunReport(NamedTuple):
+    name: str
+    duration: float            # 协议执行完毕的虚拟时间 (秒)；协议被急停/出错中断时为 None
+    settle_time: float         # 最后一个定时动作结束的虚拟时间
+    timeline: list             # [(虚拟时间, 类别, 说明)]
+    totals: dict               # {设备: {累计量字段: 值}}
+    buses: dict                # {端口: {'devices', 'busy_s', 'mean_utilization', 'peak_utilization', 'poll_s'}}
+    peak_running_pumps: int
+    still_running: list        # 结束时仍在运行的泵 (协议没有停止它们)
+    alarms: list               # 触发的报警事件
+    truncated: bool            # 达到虚拟时间上限而被截断
+    wall_time: float           # 试运行本身的实际耗时 (秒)
+
+    def format(self, max_timeline=200):
+        lines = [f"=== 试运行: {self.name} ==="]
+        if self.duration is None: lines.append("协议未执行完毕 (被急停或出错中断)。")
+        else: lines.append(f"协议执行时长: {_format_seconds(self.duration)}")
+        lines.append(f"所有定时动作结束: {_format_seconds(self.settle_time)}{' (已达到虚拟时间上限，被截断)' if self.truncated else ''}")
+        lines.append(f"试运行耗时 {self.wall_time:.3f} s (加速约 {self.settle_time / max(self.wall_time, 1e-6):.0f} 倍)")
+        lines.append("预计累计量:")
+        for dev_id, fields in self.totals.items():
+            lines.append(f"  {dev_id}: " + ", ".join(f"{name} = {value:.3f}" for name, value in fields.items()))
+        lines.append(f"同时运行的泵最多 {self.peak_running_pumps} 台" + (f"；结束时仍在运行: {', '.join(self.still_running)}" if self.still_running else ""))
+        lines.append("总线占用估计:")
+        for port, bus in self.buses.items():
+            lines.append(f"  {port} ({', '.join(bus['devices'])}): 每次轮询 {bus['poll_s'] * 1000:.1f} ms，平均占用 {bus['mean_utilization']:.1%}，"
+                         f"峰值 {bus['peak_utilization']:.1%}{'  !! 超过轮询间隔' if bus['poll_s'] > STATUS_UPDATE_INTERVAL else ''}")
+        if self.alarms: lines.append(f"报警: {len(self.alarms)} 次")
+        lines.append("时间线:")
+        for t, kind, text in self.timeline[:max_timeline]: lines.append(f"  {_format_seconds(t):>12}  [{kind}] {text}")
+        if len(self.timeline) > max_timeline: lines.append(f"  ... 另有 {len(self.timeline) - max_timeline} 条")
+        return "\n".join(lines)
+
+
+def _format_seconds(seconds):
+    if seconds is None: return "-"
+    h, rest = divmod(seconds, 3600); m, s = divmod(rest, 60)
+    return f"{int(h)}:{int(m):02d}:{s:06.3f}"
+
+
+class DryRunController(SystemController):
+    """
+    在虚拟时钟上运行的 SystemController (模拟设备，不写状态文件和运行记录，不启动线程)。
+
+    :param device_configs: 系统集的设备配置 (真实配置即可，会自动换成模拟驱动且通讯耗时为 0)。
+    """
+    def __init__(self, device_configs, poll_interval=STATUS_UPDATE_INTERVAL):
+        self.vclock = VirtualClock()
+        configs = [dict(config, sim_latency_ms=0) for config in device_configs]
+        super().__init__(configs, _CommandQueue(), _EventSink(self.vclock), None, simulate=True)
+        self.integrators = IntegratorBank(configs, None)
+        self.poll_interval = poll_interval
+        self.timeline = []
+        self._costs = {config['id']: transaction_seconds(config) for config in configs}
+        self._bus_of = {config['id']: normalize_port(config.get('port', '')) or config['id'] for config in configs}
+        self._bus_buckets = {}            # (端口, 轮询桶) -> 占用秒数
+        self._last_transactions = {}
+        self._peak_running = 0
+
+    def _create_timers(self):
+        return VirtualTimers(self.vclock)
+
+    def _log(self, message, level=None):
+        pass
+
+    def _process_command(self, command):
+        params = command.get('params', {})
+        target = params.get('pump_id') or params.get('device_id')
+        detail = ", ".join(f"{k}={v}" for k, v in params.items() if k not in ('pump_id', 'device_id', 'protocol'))
+        self.timeline.append((self.vclock.now, 'command', f"{command.get('type')}{f' {target}' if target else ''}{f' ({detail})' if detail else ''}"))
+        # 指令前后各取一个样本：分段恒定的速率被精确积分 (这些样本不计入总线占用)
+        self._sample(count_bus=False)
+        super()._process_command(command)
+        self._account_bus()
+        self._sample(count_bus=False)
+
+    def _sample(self, count_bus=True):
+        t = self.vclock.now; running = 0
+        for dev_id, device in self.devices.items():
+            before = device.link.transactions
+            status = device.get_status(); status['t_ns'] = int(t * 1e9)
+            if not count_bus: device.link.transactions = before
+            self.integrators.update(dev_id, t, status)
+            running += bool(status.get('is_running'))
+            if count_bus and self.alarms:
+                fired = self.alarms.evaluate(dev_id, status, t)
+                if fired: self._trigger_alarms(fired, time.monotonic_ns())
+        self._peak_running = max(self._peak_running, running)
+        if count_bus: self._account_bus()
+
+    def _account_bus(self):
+        bucket = int(self.vclock.now // self.poll_interval)
+        for dev_id, device in self.devices.items():
+            count = device.link.transactions; delta = count - self._last_transactions.get(dev_id, 0)
+            self._last_transactions[dev_id] = count
+            if delta:
+                key = (self._bus_of[dev_id], bucket)
+                self._bus_buckets[key] = self._bus_buckets.get(key, 0.0) + delta * self._costs[dev_id]
+
+    def run_protocol(self, protocol, name="protocol", max_duration=DEFAULT_MAX_DURATION):
+        """试运行一个协议 (ProtocolWidget 的步骤列表)，返回 DryRunReport。"""
+        started = time.perf_counter()
+        if not self._setup_devices(): raise RuntimeError("模拟设备创建失败。")
+        self._last_transactions = {dev_id: device.link.transactions for dev_id, device in self.devices.items()}   # 连接时的通讯不计入
+        self.command_queue.put({'type': 'run_protocol', 'params': {'protocol': list(protocol)}})
+        clock = self.vclock; next_poll = 0.0; truncated = False
+        while True:
+            while self.command_queue.items: self._process_command(self.command_queue.items.popleft())
+            due = self.timers.next_due()
+            if due is None: break
+            if due > max_duration:
+                truncated = True; break
+            if next_poll <= due:
+                clock.now = next_poll; self._sample(); next_poll += self.poll_interval
+            else:
+                clock.now = due; self.timers.fire_next()
+        settle = clock.now
+        self._sample()
+        return self._report(name, settle, truncated, time.perf_counter() - started)
+
+    def _report(self, name, settle, truncated, wall_time):
+        duration = None; alarms = []
+        for t, event in self.status_queue.events:
+            if 'alarm' in event:
+                alarms.append(event['alarm']); self.timeline.append((t, 'alarm', event['error']))
+            elif 'error' in event: self.timeline.append((t, 'error', event['error']))
+            elif 'info' in event:
+                self.timeline.append((t, 'info', event['info']))
+                if event['info'] == '自动化协议执行完毕。': duration = t
+        self.timeline.sort(key=lambda entry: entry[0])
+        span = max(settle, self.poll_interval)
+        buses = {}
+        for dev_id, port in self._bus_of.items():
+            if dev_id not in self.devices: continue
+            bus = buses.setdefault(port, {'devices': [], 'busy_s': 0.0, 'peak_utilization': 0.0, 'poll_s': 0.0})
+            bus['devices'].append(dev_id)
+            bus['poll_s'] += self._poll_transactions(dev_id) * self._costs[dev_id]
+        for (port, _), busy in self._bus_buckets.items():
+            bus = buses[port]; bus['busy_s'] += busy; bus['peak_utilization'] = max(bus['peak_utilization'], busy / self.poll_interval)
+        for bus in buses.values(): bus['mean_utilization'] = bus['busy_s'] / span
+        still_running = [dev_id for dev_id, device in self.devices.items() if getattr(device, 'is_running', False)]
+        return DryRunReport(name, duration, settle, self.timeline, self.integrators.totals(), buses, self._peak_running,
+                            still_running, alarms, truncated, wall_time)
+
+    def _poll_transactions(self, dev_id):
+        """一次轮询中设备的通讯次数。"""
+        device = self.devices[dev_id]; before = device.link.transactions
+        device.get_status(); count = device.link.transactions - before
+        device.link.transactions = before
+        return count
+
+
+def dry_run(device_configs, protocol, name="protocol", seed=0, max_duration=DEFAULT_MAX_DURATION):
+    """在模拟设备上试运行一个协议。seed 固定模拟读数的噪声，结果可复现。"""
+    random.seed(seed)
+    return DryRunController(device_configs).run_protocol(protocol, name=name, max_duration=max_duration)
+
+
+def _dry_run_job(job):
+    device_configs, protocol, name, seed, max_duration = job
+    return dry_run(device_configs, protocol, name, seed, max_duration)
+
+
+def dry_run_many(device_configs, protocols, workers=None, seed=0, max_duration=DEFAULT_MAX_DURATION):
+    """
+    在进程池中并行试运行多个候选协议。
+
+    :param protocols: {名称: 步骤列表}。
+    :return: 与 protocols 顺序一致的 DryRunReport 列表。
+    """
+    jobs = [(device_configs, protocol, name, seed, max_duration) for name, protocol in protocols.items()]
+    if len(jobs) <= 1 or workers == 1: return [_dry_run_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers or min(len(jobs), os.cpu_count() or 1)) as pool:
+        return list(pool.map(_dry_run_job, jobs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在模拟设备上以虚拟时钟试运行协议文件，报告时长、累计量与总线占用")
+    parser.add_argument('protocols', nargs='+', help="协议文件 (界面\"保存到文件...\"得到的 JSON)")
+    parser.add_argument('--set', dest='set_id', help="系统集 set_id，默认第一个")
+    parser.add_argument('--workers', type=int, help="并行进程数，默认按 CPU 核数")
+    parser.add_argument('--timeline', type=int, default=50, help="每个报告最多打印的时间线条数")
+    args = parser.parse_args(argv)
+
+    from config import get_config, get_registry
+    from protocol_model import load_protocol
+    system_sets = get_config()
+    set_id = args.set_id or system_sets[0]['set_id']
+    device_configs = get_registry().device_configs(set_id)
+    if not device_configs:
+        print(f"没有找到系统集 {set_id}。"); return 1
+    protocols = {}
+    for path in args.protocols:
+        # 只读加载：试运行不在协议文件旁留下 .steps 缓存
+        protocols[os.path.basename(path)] = load_protocol(path, write_cache=False).steps()
+    for report in dry_run_many(device_configs, protocols, workers=args.workers):
+        print(report.format(max_timeline=args.timeline)); print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
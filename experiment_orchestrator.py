@@ -0,0 +1,299 @@
+# file: experiment_orchestrator.py (多系统集并行实验编排)
+'''
+在多个系统集上同时运行同一个协议 (或每个系统集一个参数变体)，对齐开始时间，并把各系统集的数据汇总为一份对比数据集。
+以前在两个平行平台上做同一个实验，要打开两个窗口分别点 "执行协议"，开始时间相差几秒，数据也分散在各自的导出文件中。
+
+    - 设备对应: 协议按某一个系统集 (源系统集) 的设备编写，其它系统集按位置找到对应设备 ("角色": 电源为 'power'，
+      子系统 A/B 的第 n 台泵为 'A1'、'B2' ...，类型必须相同)；
+    - 参数变体: 每个系统集可以给一组覆盖值，{"speed": 150} 替换所有带 speed 参数的步骤，
+      {"A1": {"speed": 150}} 只替换目标为角色 A1 的步骤；
+    - 对齐开始: 等所有系统集的控制器都开始发布状态后，向每个系统集发送带同一个 start_at 的 run_protocol，
+      由各控制器的定时器轮在同一墙上时间开始 (远程节点由 node_aggregator 换算时钟偏差)；协议带 run_tag，
+      控制器在协议结束 (完成、急停或出错) 时发回带该标签的事件；
+    - 数据: 运行期间从各系统集窗口转发的状态批中按设备采样时间收集数据，结束后插值到以开始时间为零点的公共时间网格，
+      列名为 "角色.字段 [系统集]"，同一角色同一字段的各系统集列相邻；另附每个系统集的汇总 (时长、各泵体积、各通道电荷)。
+
+本模块不依赖 Qt；界面部分 (ExperimentDialog / ExperimentWindow) 在 control_ui.py 中。
+'''
+
+import os
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+
+from device_registry import iter_set_devices
+from protocol_model import TARGET_KEYS
+from status_codec import SAMPLE_TIME_FIELD
+from time_align import sample_times, common_grid, align
+from data_export import export_table
+from log_pipeline import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_LEAD_TIME = 3.0         # 发出开始指令到统一开始时间的提前量 (秒)
+DEFAULT_GRID_STEP = 1.0         # 对比数据集的时间网格间隔 (秒)
+PRE_ROLL_SECONDS = 2.0          # 开始前保留的数据，使零点处可以插值
+POST_ROLL_SECONDS = 2.0         # 协议结束后继续收集的时间，使结束时刻可以插值 (状态约每秒发布一次)
+STEP_FIELDS = ('is_running', 'output_on')   # 开关量，对齐时保持前值而不是线性插值
+FINAL_STATES = ('done', 'aborted', 'failed')
+STATE_NAMES = {'waiting': '等待控制器就绪', 'ready': '已就绪', 'running': '运行中', 'done': '已完成', 'aborted': '已中断', 'failed': '失败'}
+
+
+class OrchestrationError(ValueError):
+    """实验无法编排 (系统集结构不一致、参数变体不合法等)。"""
+
+
+def set_roles(system_set):
+    """{角色: 设备配置}，角色为 'power' 或 子系统 + 序号 ('A1'、'B2' ...)。"""
+    roles = {}; counts = {}
+    for subsystem, config in iter_set_devices(system_set):
+        if subsystem is None: roles['power'] = config; continue
+        counts[subsystem] = counts.get(subsystem, 0) + 1
+        roles[f"{subsystem}{counts[subsystem]}"] = config
+    return roles
+
+
+def device_mapping(source_set, target_set):
+    """源系统集的设备 id -> 目标系统集中同一角色、同一类型的设备 id (没有对应设备的不出现在结果中)。"""
+    target = set_roles(target_set)
+    return {config['id']: target[role]['id'] for role, config in set_roles(source_set).items()
+            if role in target and target[role].get('type') == config.get('type')}
+
+
+def adapt_protocol(protocol, mapping, roles, overrides=None):
+    """
+    把按源系统集编写的协议换成目标系统集的设备，并应用参数变体。
+
+    :param mapping: device_mapping() 的结果。
+    :param roles: 源系统集的 设备 id -> 角色。
+    :param overrides: 参数变体 (见模块说明)；只替换步骤中已有的参数。
+    :raises OrchestrationError: 步骤的设备在目标系统集中没有对应设备，或变体中的角色不存在。
+    """
+    overrides = overrides or {}
+    general = {name: value for name, value in overrides.items() if not isinstance(value, dict)}
+    by_role = {role: values for role, values in overrides.items() if isinstance(values, dict)}
+    unknown = sorted(set(by_role) - set(roles.values()))
+    if unknown: raise OrchestrationError(f"参数变体中的角色不存在: {', '.join(unknown)} (可用: {', '.join(roles.values())})")
+    adapted = []
+    for n, step in enumerate(protocol, 1):
+        step = dict(step); role_overrides = {}
+        target_key = next((k for k in TARGET_KEYS if k in step), None)
+        if target_key:
+            source_id = step[target_key]
+            if source_id not in mapping: raise OrchestrationError(f"第 {n} 步的设备 {source_id} 在目标系统集中没有对应设备 (位置缺失或类型不同)。")
+            step[target_key] = mapping[source_id]; role_overrides = by_role.get(roles.get(source_id), {})
+        for name, value in {**general, **role_overrides}.items():
+            if name in step and name != 'command' and name not in TARGET_KEYS: step[name] = value
+        adapted.append(step)
+    return adapted
+
+
+class SetRun:
+    """
+    实验在一个系统集上的运行：换好设备的协议、状态与收集到的数据。
+
+    :param roles: 本系统集的 设备 id -> 角色。
+    """
+    def __init__(self, set_id, description, protocol, overrides, roles, tag):
+        self.set_id = set_id
+        self.description = description
+        self.protocol = protocol
+        self.overrides = overrides or {}
+        self.roles = roles
+        self.tag = tag
+        self.state = 'waiting'
+        self.message = ''
+        self.errors = []
+        self.finished_at = None
+        self.series = {}                      # (角色, 字段) -> ([采样时间数组], [数值数组])
+        self._pairs = (None, [], [])          # (布局, [(设备, 字段)], [(角色, 字段)])，布局不变时复用
+
+    def finish(self, state, message, finished_at=None):
+        if self.state in FINAL_STATES: return
+        self.state = state; self.message = message; self.finished_at = finished_at or time.time()
+
+    def collect(self, batch, anchor, since):
+        layout, pairs, keys = self._pairs
+        if layout is not batch.layout:
+            pairs = [(dev_id, name) for dev_id, names in batch.layout.devices if dev_id in self.roles for name in names if name != SAMPLE_TIME_FIELD]
+            keys = [(self.roles[dev_id], name) for dev_id, name in pairs]
+            self._pairs = (batch.layout, pairs, keys)
+        if not pairs: return
+        values = batch.select(pairs, default=np.nan)
+        times = {dev_id: sample_times(batch, dev_id, anchor) for dev_id in dict.fromkeys(d for d, _ in pairs)}
+        until = self.finished_at + POST_ROLL_SECONDS if self.finished_at is not None else np.inf
+        for i, ((dev_id, _), key) in enumerate(zip(pairs, keys)):
+            t = times[dev_id]; keep = (t >= since) & (t <= until)
+            if not keep.any(): continue
+            ts, vs = self.series.setdefault(key, ([], []))
+            ts.append(t[keep]); vs.append(values[i][keep])
+
+    def values(self, key):
+        """某个 (角色, 字段) 收集到的 (采样时间, 数值)，按时间排序。"""
+        ts, vs = self.series.get(key, ([], []))
+        if not ts: return np.empty(0), np.empty(0)
+        t = np.concatenate(ts); v = np.concatenate(vs); order = np.argsort(t, kind='stable')
+        return t[order], v[order]
+
+
+class ExperimentRun:
+    """
+    一次跨系统集的并行实验。
+
+    :param system_sets: 全部系统集配置。
+    :param protocol: 按源系统集的设备编写的协议步骤列表。
+    :param source_set_id: 协议所针对的系统集。
+    :param set_ids: 参与实验的系统集 (可以不包含源系统集)。
+    :param variants: 可选，{set_id: 参数变体}。
+    :param lead_time: 发出开始指令到统一开始时间的提前量 (秒)。
+    :raises OrchestrationError: 协议无法在某个系统集上运行。
+    """
+    def __init__(self, system_sets, protocol, source_set_id, set_ids, variants=None, lead_time=DEFAULT_LEAD_TIME, name=None):
+        sets = {s['set_id']: s for s in system_sets}
+        if not set_ids: raise OrchestrationError("至少需要选择一个系统集。")
+        source = sets[source_set_id]
+        self.name = name or f"experiment_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.source_set_id = source_set_id
+        self.role_order = list(set_roles(source))
+        self.lead_time = lead_time
+        self.start_at = None
+        source_roles = {config['id']: role for role, config in set_roles(source).items()}
+        self.runs = {}
+        for set_id in set_ids:
+            target = sets[set_id]; description = target.get('set_description', set_id); overrides = (variants or {}).get(set_id)
+            try:
+                protocol_i = adapt_protocol(protocol, device_mapping(source, target), source_roles, overrides)
+            except OrchestrationError as e:
+                raise OrchestrationError(f"{description}: {e}") from e
+            self.runs[set_id] = SetRun(set_id, description, protocol_i, overrides, {config['id']: role for role, config in set_roles(target).items()},
+                                       f"{self.name}/{set_id}")
+
+    # --- 运行 ---
+    @property
+    def ready(self):
+        """所有系统集的控制器都已开始发布状态。"""
+        return all(run.state != 'waiting' for run in self.runs.values())
+
+    @property
+    def finished(self):
+        """所有系统集的协议都已结束。"""
+        return self.start_at is not None and all(run.state in FINAL_STATES for run in self.runs.values())
+
+    @property
+    def complete(self):
+        """协议都已结束，且结束后的数据已收集完 (可以导出)。"""
+        return self.finished and time.time() >= self.start_at + self.duration + POST_ROLL_SECONDS
+
+    def start(self, send):
+        """
+        向每个系统集发送带同一开始时间的协议。
+
+        :param send: send(set_id, command)，把指令放入该系统集的指令队列。
+        """
+        self.start_at = time.time() + self.lead_time
+        for run in self.runs.values():
+            if run.state in FINAL_STATES: continue
+            send(run.set_id, {'type': 'run_protocol', 'params': {'protocol': run.protocol, 'start_at': self.start_at, 'run_tag': run.tag}})
+            run.state = 'running'
+        logger.info("实验 %s: %d 个系统集将在 %s 同时开始", self.name, len(self.runs), datetime.fromtimestamp(self.start_at).strftime('%H:%M:%S.%f')[:-3])
+
+    def abort(self, send):
+        """急停所有仍在运行的系统集 (stop_all 同时取消尚未开始的协议)。"""
+        for run in self.runs.values():
+            if run.state in FINAL_STATES: continue
+            if run.state == 'running': send(run.set_id, {'type': 'stop_all'})
+            run.finish('aborted', "实验被手动中止")
+
+    def fail(self, set_id, message):
+        run = self.runs.get(set_id)
+        if run is not None: run.finish('failed', message)
+
+    # --- 来自系统集窗口的数据 ---
+    def on_events(self, set_id, events):
+        run = self.runs.get(set_id)
+        if run is None: return
+        for event in events:
+            if event.get('protocol_done') == run.tag:
+                run.finish('aborted' if event.get('aborted') else 'done', event.get('error') or event.get('info', ''), event.get('finished_at'))
+            elif 'error' in event and run.state == 'running':
+                run.errors.append(event['error'])
+
+    def on_batch(self, set_id, batch, anchor=None):
+        """
+        :param anchor: 该系统集会话的 ClockAnchor (设备采样时间换算为墙上时间)；None 时使用快照时间戳。
+        """
+        run = self.runs.get(set_id)
+        if run is None: return
+        if run.state == 'waiting': run.state = 'ready'
+        if self.start_at is not None and run.state != 'failed': run.collect(batch, anchor, self.start_at - PRE_ROLL_SECONDS)
+
+    # --- 结果 ---
+    @property
+    def duration(self):
+        ends = [run.finished_at for run in self.runs.values() if run.finished_at is not None]
+        return max(0.0, max(ends) - self.start_at) if ends and self.start_at is not None else 0.0
+
+    def columns(self):
+        """[(角色, 字段, set_id)]：按角色 (源系统集顺序)、字段、系统集排列。"""
+        keys = list(dict.fromkeys(key for run in self.runs.values() for key in run.series))
+        keys.sort(key=lambda key: self.role_order.index(key[0]) if key[0] in self.role_order else len(self.role_order))
+        return [(role, name, set_id) for role, name in keys for set_id in self.runs]
+
+    def dataset(self, step=DEFAULT_GRID_STEP):
+        """
+        对比数据集。
+
+        :return: (列名列表, 相对开始时间的网格 (秒), (列数, 网格点数) 数组)；某个系统集没有该列或已结束的部分为 NaN。
+        """
+        columns = self.columns(); grid = common_grid(0.0, self.duration, step)
+        data = np.full((len(columns), len(grid)), np.nan)
+        for i, (role, name, set_id) in enumerate(columns):
+            t, v = self.runs[set_id].values((role, name))
+            if len(t): data[i] = align([(t - self.start_at, v)], grid, 'previous' if name in STEP_FIELDS else 'linear')[0]
+        return [f"{role}.{name} [{set_id}]" for role, name, set_id in columns], grid, data
+
+    def summary(self):
+        """每个系统集一条: 状态、时长、参数变体、各泵体积 (ml)、各通道电荷 (C)。"""
+        result = []
+        for run in self.runs.values():
+            totals = {}
+            for (role, name) in run.series:
+                if name != 'dispensed_ml' and not name.endswith('_charge_c'): continue
+                _, v = run.values((role, name)); v = v[np.isfinite(v)]
+                if len(v): totals[f"{role}.{name}"] = float(v[-1] - v[0])
+            duration = max(0.0, run.finished_at - self.start_at) if run.finished_at is not None and self.start_at is not None else None
+            result.append({'set_id': run.set_id, 'description': run.description, 'state': run.state, 'message': run.message,
+                           'duration_s': duration, 'overrides': run.overrides, 'totals': totals, 'errors': run.errors})
+        return result
+
+    def format(self):
+        lines = [f"=== 并行实验: {self.name} ==="]
+        if self.start_at is None: lines.append("等待所有系统集的控制器就绪后同时开始。")
+        else:
+            elapsed = time.time() - self.start_at
+            lines.append(f"开始时间: {datetime.fromtimestamp(self.start_at).strftime('%Y-%m-%d %H:%M:%S')}" +
+                         (f" (还有 {-elapsed:.1f} 秒)" if elapsed < 0 else "" if self.finished else f" (已运行 {elapsed:.0f} 秒)"))
+        for item in self.summary():
+            lines.append(f"{item['description']} ({item['set_id']}): {STATE_NAMES[item['state']]}" +
+                         (f"，用时 {item['duration_s']:.1f} 秒" if item['duration_s'] is not None else "") + (f" - {item['message']}" if item['message'] else ""))
+            if item['overrides']: lines.append(f"  参数变体: {json.dumps(item['overrides'], ensure_ascii=False)}")
+            if item['totals']: lines.append("  " + ", ".join(f"{key} = {value:.3f}" for key, value in item['totals'].items()))
+            for error in item['errors']: lines.append(f"  错误: {error}")
+        return "\n".join(lines)
+
+    def export(self, path, step=DEFAULT_GRID_STEP):
+        """
+        导出对比数据集 (格式由扩展名决定，见 data_export)，并在旁边写入汇总 <文件名>_summary.json。
+
+        :return: (写入的行数, 汇总文件路径)。
+        :raises ExportError: 导出失败。
+        """
+        columns, grid, data = self.dataset(step)
+        rows = export_table(path, columns, grid, data)
+        summary_path = os.path.splitext(path)[0] + "_summary.json"
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump({'name': self.name, 'source_set': self.source_set_id, 'start_at': self.start_at, 'grid_step_s': step,
+                       'sets': self.summary()}, f, ensure_ascii=False, indent=4)
+        return rows, summary_path
@@ -0,0 +1,130 @@
+# file: integrators.py (累计体积与电荷积分器)
+'''
+控制器内的增量积分器：每个轮询样本更新一次，计算
+    - 每台泵累计输出的体积 (ml)：柱塞泵用 flow_rate_ml_min；蠕动泵用 speed_rpm × 管路标定系数
+      (设备配置中的 'tubing_ml_per_rev'，单位 ml/转)；
+    - 电源每个通道累计输出的电荷 (库仑)：对 chN_current 积分。
+
+时间差使用 time.monotonic()，不受系统时钟调整影响；采用梯形积分，
+间隔超过 MAX_GAP_SECONDS 的样本视为数据中断，不跨越中断积分。
+累计值定期写入 JSON 状态文件，控制器重启后从上次的值继续累加。
+'''
+
+import os
+import json
+import time
+
+DEFAULT_STATE_DIR = "state"
+MAX_GAP_SECONDS = 30.0
+MAX_CHANNELS = 4
+
+
+class Integrator:
+    """单个量的梯形积分器。rate 的单位为 "每秒"。"""
+    __slots__ = ('total', '_last_t', '_last_rate')
+
+    def __init__(self, total=0.0):
+        self.total = total
+        self._last_t = None
+        self._last_rate = 0.0
+
+    def update(self, t, rate):
+        last_t = self._last_t
+        if last_t is not None:
+            dt = t - last_t
+            if 0.0 < dt <= MAX_GAP_SECONDS: self.total += (rate + self._last_rate) * 0.5 * dt
+        self._last_t = t
+        self._last_rate = rate
+        return self.total
+
+    def reset(self):
+        self.total = 0.0
+
+
+class IntegratorBank:
+    """
+    一个控制器内所有设备的积分器集合。
+
+    :param device_configs: 设备配置列表，蠕动泵可带 'tubing_ml_per_rev'。
+    :param state_path: 持久化文件路径；为 None 时不持久化。
+    """
+    def __init__(self, device_configs, state_path=None):
+        self.state_path = state_path
+        self.tubing = {c['id']: float(c['tubing_ml_per_rev']) for c in device_configs if c.get('tubing_ml_per_rev')}
+        self.integrators = {}       # (device_id, 输出字段名) -> Integrator
+        self._plans = {}            # device_id -> [(输出字段名, 速率函数), ...]
+        self.load()
+
+    def _plan_for(self, dev_id, status):
+        """根据设备状态中出现的字段确定需要哪些积分量 (每台设备只计算一次)。"""
+        plan = []
+        if 'flow_rate_ml_min' in status or 'speed_rpm' in status:
+            ml_per_rev = self.tubing.get(dev_id, 0.0)
+            def pump_rate(s, k=ml_per_rev):
+                flow = s.get('flow_rate_ml_min') or 0.0
+                if not flow and k: flow = (s.get('speed_rpm') or 0.0) * k
+                return flow / 60.0
+            plan.append(('dispensed_ml', pump_rate))
+        for ch in range(1, MAX_CHANNELS + 1):
+            key = f'ch{ch}_current'
+            if key in status: plan.append((f'ch{ch}_charge_c', lambda s, k=key: s.get(k) or 0.0))
+        self._plans[dev_id] = plan
+        return plan
+
+    def update(self, dev_id, t, status):
+        """
+        用一个新样本更新设备的积分量，并把累计值写回 status 字典。
+
+        :param t: time.monotonic() 时间戳。
+        """
+        plan = self._plans.get(dev_id)
+        if plan is None: plan = self._plan_for(dev_id, status)
+        for field, rate in plan:
+            integrator = self.integrators.get((dev_id, field))
+            if integrator is None: integrator = self.integrators[(dev_id, field)] = Integrator()
+            status[field] = integrator.update(t, rate(status))
+
+    def reset(self, dev_id=None):
+        for (integrator_dev, _), integrator in self.integrators.items():
+            if dev_id is None or integrator_dev == dev_id: integrator.reset()
+
+    def totals(self):
+        result = {}
+        for (dev_id, field), integrator in self.integrators.items(): result.setdefault(dev_id, {})[field] = integrator.total
+        return result
+
+    def snapshot(self):
+        """全部积分器的 [累计值, 最后样本时间, 最后样本速率] (控制器检查点使用)。"""
+        result = {}
+        for (dev_id, field), integrator in self.integrators.items():
+            result.setdefault(dev_id, {})[field] = [integrator.total, integrator._last_t, integrator._last_rate]
+        return result
+
+    def restore(self, snapshot):
+        """从 snapshot() 的结果恢复；最后样本一并恢复，下一个样本与它之间的间隔照常积分。"""
+        for dev_id, fields in snapshot.items():
+            for field, (total, last_t, last_rate) in fields.items():
+                integrator = self.integrators[(dev_id, field)] = Integrator(float(total))
+                integrator._last_t = last_t; integrator._last_rate = float(last_rate)
+
+    def load(self):
+        if not self.state_path or not os.path.exists(self.state_path): return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f: saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for dev_id, fields in saved.get('totals', {}).items():
+            for field, total in fields.items(): self.integrators[(dev_id, field)] = Integrator(float(total))
+
+    def save(self):
+        """原子地写入状态文件 (先写临时文件再替换)，异常断电也不会留下半个文件。"""
+        if not self.state_path: return False
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'saved_at': time.time(), 'totals': self.totals()}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.state_path)
+            return True
+        except OSError:
+            return False
@@ -11,9 +11,12 @@ Kamoer Peristaltic Pump Controller. Inherits from BasePump and implements the re
 
 import time
 import struct
-from pymodbus.client import ModbusSerialClient
 from pymodbus.exceptions import ModbusException
 from base_pump import BasePump
+from modbus_transport import open_client
+from log_pipeline import get_logger
+
+logger = get_logger(__name__)
 
 class KamoerPeristalticPump(BasePump):
     """
@@ -24,30 +27,24 @@ class KamoerPeristalticPump(BasePump):
         # 首先调用父类的 __init__ 方法
         super().__init__(port, unit_address, baudrate)
         # 然后进行自己的初始化
-        self.client = ModbusSerialClient(
-            port=self.port,
-            baudrate=self.baudrate,
-            timeout=timeout,
-            parity='N',
-            stopbits=1,
-            bytesize=8
-        )
+        # port 可以是串口名，也可以是 tcp:// 或 rtu+tcp:// 网关地址；同一端点上的设备共用一个连接
+        self.client = open_client(self.port, baudrate=self.baudrate, timeout=timeout)
 
     # --- 实现 BasePump 的标准接口 ---
     def connect(self):
-        print(f"[{self.__class__.__name__}] 正在连接设备...")
+        logger.info("[%s] 正在连接设备...", self.__class__.__name__)
         if self.client.connect():
             self.is_connected = True
-            print(f"[{self.__class__.__name__}] 连接成功。")
+            logger.info("[%s] 连接成功。", self.__class__.__name__)
             # 启用485控制是该泵的特定初始化步骤
             return self._enable_485_control(True)
         else:
             self.is_connected = False
-            print(f"[{self.__class__.__name__}] 连接失败。")
+            logger.error("[%s] 连接失败。", self.__class__.__name__)
             return False
 
     def disconnect(self):
-        print(f"[{self.__class__.__name__}] 正在关闭连接。")
+        logger.info("[%s] 正在关闭连接。", self.__class__.__name__)
         self.client.close()
         self.is_connected = False
 
@@ -58,9 +55,9 @@ class KamoerPeristalticPump(BasePump):
         :param speed: 目标转速 (RPM)。
         :param direction: 旋转方向 ('forward' 或 'reverse')。
         """
-        print(f"[{self.__class__.__name__}] 正在启动泵，转速: {speed} RPM, 方向: {direction}...")
+        logger.info("[%s] 正在启动泵，转速: %s RPM, 方向: %s...", self.__class__.__name__, speed, direction)
         if not self.is_connected:
-            print("错误: 设备未连接。")
+            logger.warning("错误: 设备未连接。")
             return False
         
         # 蠕动泵需要先设方向和速度，再启动
@@ -71,7 +68,7 @@ class KamoerPeristalticPump(BasePump):
         return self._set_pump_state(start=True)
 
     def stop(self):
-        print(f"[{self.__class__.__name__}] 正在停止泵...")
+        logger.info("[%s] 正在停止泵...", self.__class__.__name__)
         return self._set_pump_state(start=False)
 
     def set_parameters(self, speed=None, direction=None, **kwargs):
@@ -79,20 +76,20 @@ class KamoerPeristalticPump(BasePump):
         在线设置泵的运行参数。
         """
         if not self.is_connected:
-            print("错误: 设备未连接。")
+            logger.warning("错误: 设备未连接。")
             return False
         
         success = True
         # 如果提供了 direction 参数，则设置方向
         if direction is not None:
-            print(f"[{self.__class__.__name__}] 动态设置方向为: {direction}...")
+            logger.info("[%s] 动态设置方向为: %s...", self.__class__.__name__, direction)
             if not self._set_direction(direction):
                 success = False
             time.sleep(0.05) # 增加延时确保指令执行
 
         # 如果提供了 speed 参数，则设置速度
         if speed is not None:
-            print(f"[{self.__class__.__name__}] 动态设置转速为: {speed} RPM...")
+            logger.info("[%s] 动态设置转速为: %s RPM...", self.__class__.__name__, speed)
             if not self._set_speed(speed):
                 success = False
         
@@ -108,7 +105,8 @@ class KamoerPeristalticPump(BasePump):
         return {
             "is_running": is_running,
             "speed_rpm": actual_speed if actual_speed is not None else 0.0,
-            "flow_rate_ml_min": 0.0 # 蠕动泵主要通过转速控制
+            "flow_rate_ml_min": 0.0, # 蠕动泵主要通过转速控制
+            **self.client.stats.as_status() # 通讯超时 / CRC 错误累计次数
         }
 
     # --- 内部辅助函数 (加上下划线表示内部使用) ---
@@ -133,7 +131,7 @@ class KamoerPeristalticPump(BasePump):
             reg2 = struct.unpack('>H', float_bytes[2:])[0]
             return self._write_multiple_registers(address, [reg1, reg2])
         except Exception as e:
-            print(f"[{self.__class__.__name__}] 转换浮点数时发生错误: {e}")
+            logger.error("[%s] 转换浮点数时发生错误: %s", self.__class__.__name__, e)
             return False
 
     def _read_real_time_speed(self):
@@ -161,7 +159,7 @@ class KamoerPeristalticPump(BasePump):
             r = self.client.write_coil(address, value, device_id=self.unit_address)
             return not r.isError()
         except ModbusException as e:
-            print(f"[{self.__class__.__name__}] 错误: {e}")
+            logger.error("[%s] 错误: %s", self.__class__.__name__, e)
             return False
 
     def _write_multiple_registers(self, address, values):
@@ -169,7 +167,7 @@ class KamoerPeristalticPump(BasePump):
             r = self.client.write_registers(address, values, device_id=self.unit_address)
             return not r.isError()
         except ModbusException as e:
-            print(f"[{self.__class__.__name__}] 错误: {e}")
+            logger.error("[%s] 错误: %s", self.__class__.__name__, e)
             return False
             
     def _read_holding_registers(self, address, count):
@@ -177,5 +175,5 @@ class KamoerPeristalticPump(BasePump):
             r = self.client.read_holding_registers(address, device_id=self.unit_address) #这个地方一直有bug，如出错，尝试增在address后增加count参数
             return None if r.isError() else r.registers
         except ModbusException as e:
-            print(f"[{self.__class__.__name__}] 错误: {e}")
+            logger.error("[%s] 错误: %s", self.__class__.__name__, e)
             return None
\ No newline at end of file
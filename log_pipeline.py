@@ -0,0 +1,143 @@
+# file: log_pipeline.py (异步日志管道)
+'''
+结构化、分级的异步日志管道，取代热路径中的 print 和无人消费的 log_queue。
+
+- 业务代码通过 get_logger(__name__) 获取 logger，调用 info/warning/error 只会把记录放入内存队列，立即返回；
+- 后台 QueueListener 线程负责格式化并写入滚动日志文件 (以及可选的控制台)；
+- 队列有上限，写满时丢弃最旧的记录并计数，绝不阻塞调用方；
+- 对短时间内重复出现的同一条消息 (如轮询时的读寄存器错误) 进行限流，被抑制的条数会附在下一条放行的记录上。
+
+每个进程在入口处调用一次 setup_logging()，控制器子进程使用各自独立的日志文件。
+'''
+
+import os
+import sys
+import time
+import queue
+import logging
+import threading
+import logging.handlers
+
+ROOT_LOGGER_NAME = "mps"
+DEFAULT_LOG_DIR = "logs"
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+LOG_FORMAT = "%(asctime)s.%(msecs)03d %(levelname)-7s %(processName)s %(name)s: %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_listener = None
+
+
+class DropOldestQueue(queue.Queue):
+    """
+    有界队列：put 永不阻塞，队列已满时丢弃最旧的一条记录。
+
+    :param maxsize: 最大缓存的日志记录数。
+    """
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE):
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def put(self, item, block=True, timeout=None):
+        with self.mutex:
+            if self.maxsize > 0 and self._qsize() >= self.maxsize:
+                self._get()
+                self.dropped += 1
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    对重复消息限流：同一 logger、同一级别、同一消息模板在 period 秒内最多放行 burst 条。
+    限流以消息模板 (record.msg) 为键，因此请使用 logger.info("... %s", value) 形式的参数化消息。
+    """
+    def __init__(self, burst=5, period=10.0):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self._state = {}        # key -> [窗口起点, 窗口内计数, 被抑制数]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.CRITICAL: return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.period:
+                suppressed = state[2] if state else 0
+                self._state[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (此前 {self.period:.0f} 秒内有 {suppressed} 条相同消息被抑制)"
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+
+def get_logger(name):
+    """获取管道下的 logger；name 通常传入 __name__。"""
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def setup_logging(name, log_dir=DEFAULT_LOG_DIR, level=logging.INFO, console=True,
+                  queue_size=DEFAULT_QUEUE_SIZE, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT,
+                  rate_limit=(5, 10.0)):
+    """
+    初始化当前进程的日志管道。重复调用 (例如 fork 出的子进程) 会先清理继承来的处理器。
+
+    :param name: 日志文件名 (不含扩展名)，每个进程应使用不同的名称。
+    :param console: 是否同时输出到控制台；控制台写入发生在后台线程，不影响调用方时序。
+    :param rate_limit: (burst, period)，为 None 时不限流。
+    :return: 使用的 DropOldestQueue，可读取其 dropped 计数。
+    """
+    global _listener
+    shutdown_logging()
+    handlers = []
+    try:
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(log_dir, f"{name}.log"), maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        handlers.append(file_handler)
+    except OSError as e:
+        print(f"无法创建日志文件 ({log_dir}/{name}.log): {e}，仅输出到控制台。")
+        console = True
+    if console and sys.stderr is not None:
+        handlers.append(logging.StreamHandler(sys.stderr))
+    formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+    for handler in handlers: handler.setFormatter(formatter)
+
+    log_queue = DropOldestQueue(queue_size)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    if rate_limit: queue_handler.addFilter(RateLimitFilter(*rate_limit))
+
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    for handler in list(root.handlers): root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return log_queue
+
+
+def shutdown_logging():
+    """停止后台写线程并刷新剩余记录。"""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
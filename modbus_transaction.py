@@ -0,0 +1,126 @@
+# file: modbus_transaction.py (Modbus 事务层: 自适应超时、快速重试、帧间隔与错误计数)
+'''
+SharedModbusClient 的每一次请求都经过这里的事务层:
+
+    - 自适应超时: 每台设备按实际响应时间估计超时 (与 TCP 的 RTO 估计相同: 平滑均值 + 4 倍平均偏差)，
+      下限由波特率下的报文传输时间决定，上限为驱动配置的 timeout；尚无样本时使用上限；
+    - 快速重试: 超时或收到损坏的帧后立即重试，最多 max_retries 次，每次重试的超时加倍 (不超过上限)；
+      重试的往返时间不参与估计 (Karn 算法)。设备返回的异常响应 (非法地址等) 不重试；
+    - 帧间隔: 串口 RTU 上相邻两帧之间至少保持 3.5 个字符的静默时间 (19200 bps 以上固定 1.75 ms)，
+      按总线记录上一帧的结束时间，只在需要时等待剩余的间隔；
+    - 统计: 每台设备的超时次数、CRC/帧错误次数 (收到了数据但没有组成有效帧)、重试次数和失败次数，
+      驱动把 timeouts / crc_errors 放进状态快照。
+
+以前每个请求使用固定 1 s 超时且由 pymodbus 内部重试 3 次，线路不好时一次读取最坏要等 4 s；
+现在典型的最坏情况为 (估计超时) × (1 + 2 + 4)，9600 bps 下约为几百毫秒。
+'''
+
+import time
+
+from pymodbus.exceptions import ModbusIOException
+
+DEFAULT_MAX_RETRIES = 2
+MIN_TIMEOUT = 0.05              # 超时下限中与波特率无关的部分 (设备处理时间)，秒
+FLOOR_CHARS = 32                # 超时下限按这么多个字符的传输时间加宽
+RTT_ALPHA = 0.125
+RTT_BETA = 0.25
+RTT_K = 4
+BITS_PER_CHAR = 11              # 1 起始位 + 8 数据位 + 1 校验/停止位 + 1 停止位
+
+
+def char_time(baudrate):
+    """一个字符在串口上的传输时间 (秒)。"""
+    return BITS_PER_CHAR / baudrate if baudrate else 0.0
+
+
+def inter_frame_gap(baudrate):
+    """Modbus RTU 帧间静默时间 t3.5；19200 bps 以上按规范固定为 1.75 ms。"""
+    if not baudrate: return 0.0
+    return 0.00175 if baudrate > 19200 else 3.5 * char_time(baudrate)
+
+
+class AdaptiveTimeout:
+    """
+    由观测到的响应时间估计超时。
+
+    :param floor: 超时下限 (秒)。
+    :param ceiling: 超时上限 (秒)，也是尚无样本时的初始值。
+    """
+    def __init__(self, floor, ceiling):
+        self.floor = min(floor, ceiling)
+        self.ceiling = ceiling
+        self.srtt = None
+        self.rttvar = None
+
+    def observe(self, rtt):
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar += RTT_BETA * (abs(self.srtt - rtt) - self.rttvar)
+            self.srtt += RTT_ALPHA * (rtt - self.srtt)
+
+    @property
+    def value(self):
+        if self.srtt is None: return self.ceiling
+        return min(self.ceiling, max(self.floor, self.srtt + RTT_K * self.rttvar))
+
+    def for_attempt(self, attempt):
+        """第 attempt 次尝试 (0 为首次) 使用的超时：每次重试加倍。"""
+        return min(self.ceiling, self.value * (2 ** attempt))
+
+
+class TransactionStats:
+    """一台设备的通讯统计。"""
+    __slots__ = ('transactions', 'timeouts', 'crc_errors', 'retries', 'failures', 'last_rtt')
+
+    def __init__(self):
+        self.transactions = self.timeouts = self.crc_errors = self.retries = self.failures = 0
+        self.last_rtt = 0.0
+
+    def as_status(self):
+        return {'timeouts': self.timeouts, 'crc_errors': self.crc_errors}
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ModbusTransaction:
+    """
+    一台设备的事务策略与统计，由 SharedModbusClient 持有；execute 在总线锁内调用。
+
+    :param baudrate: 串口波特率，决定超时下限；TCP 端点传 None。
+    :param timeout: 驱动配置的超时，作为超时上限。
+    """
+    def __init__(self, baudrate, timeout, max_retries=DEFAULT_MAX_RETRIES):
+        self.max_retries = max_retries
+        self.timeout = AdaptiveTimeout(MIN_TIMEOUT + FLOOR_CHARS * char_time(baudrate), timeout)
+        self.stats = TransactionStats()
+
+    def execute(self, conn, method, *args, **kwargs):
+        """
+        在连接 conn (_PooledConnection，调用方已持有 conn.lock) 上执行一次请求。
+
+        :raises ModbusIOException: 所有尝试都超时或收到损坏的帧。
+        """
+        client = conn.client; stats = self.stats
+        stats.transactions += 1
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt: stats.retries += 1
+            conn.wait_gap()
+            client.comm_params.timeout_connect = self.timeout.for_attempt(attempt)
+            conn.rx_bytes = 0
+            start = time.monotonic()
+            try:
+                response = getattr(client, method)(*args, **kwargs)
+            except ModbusIOException as e:
+                conn.last_frame_end = time.monotonic()
+                if conn.rx_bytes: stats.crc_errors += 1
+                else: stats.timeouts += 1
+                error = e; continue
+            conn.last_frame_end = time.monotonic()
+            stats.last_rtt = conn.last_frame_end - start
+            if attempt == 0: self.timeout.observe(stats.last_rtt)
+            return response
+        stats.failures += 1
+        raise error
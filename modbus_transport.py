@@ -0,0 +1,197 @@
+# file: modbus_transport.py (可插拔的 Modbus 传输层与连接池)
+'''
+泵驱动使用的 Modbus 传输层。设备配置中的 port 决定传输方式:
+
+    "COM9" / "/dev/ttyUSB0"          串口 Modbus RTU (默认，与以前相同)
+    "tcp://192.168.1.50:502"          Modbus TCP (MBAP 报文头，网关把请求转发到 RS-485)
+    "rtu+tcp://192.168.1.50:4196"     RTU over TCP (透传型串口服务器，TCP 中直接传 RTU 帧和 CRC)
+
+同一进程内，指向同一端点 (同一个串口或同一个网关 host:port) 的所有设备共用一个底层连接，
+由连接池按引用计数管理；对同一端点的请求用锁串行化，保证一问一答的报文不会交错。
+以前同一串口上的每台泵各自打开一次串口，现在只打开一次。
+
+驱动通过 open_client() 获得 SharedModbusClient，它与 pymodbus 客户端的
+connect / close / read_holding_registers / write_register(s) / write_coil 接口一致，驱动代码无需改动。
+每个请求经过 modbus_transaction 的事务层 (自适应超时、快速重试、串口帧间隔、超时/CRC 错误计数)，
+pymodbus 自身的重试因此关闭。
+'''
+
+import time
+import threading
+
+from pymodbus import FramerType
+from pymodbus.client import ModbusSerialClient, ModbusTcpClient
+from pymodbus.exceptions import ConnectionException
+from log_pipeline import get_logger
+from modbus_transaction import ModbusTransaction, inter_frame_gap, DEFAULT_MAX_RETRIES
+
+logger = get_logger(__name__)
+
+DEFAULT_TCP_PORT = 502
+TRANSPORT_SCHEMES = {'tcp': FramerType.SOCKET, 'rtu+tcp': FramerType.RTU, 'rtutcp': FramerType.RTU}
+
+
+def parse_endpoint(port):
+    """
+    解析设备配置中的 port 字段。
+
+    :return: ('serial', 端口名) 或 ('tcp', (host, tcp_port, FramerType))。
+    """
+    scheme, sep, rest = str(port).partition("://")
+    if not sep:
+        return 'serial', port
+    framer = TRANSPORT_SCHEMES.get(scheme.lower())
+    if framer is None:
+        raise ValueError(f"未知的 Modbus 传输方式: {scheme}://，可用: {', '.join(s + '://' for s in TRANSPORT_SCHEMES)}")
+    host, _, tcp_port = rest.rstrip('/').rpartition(":")
+    if not host: host, tcp_port = tcp_port, DEFAULT_TCP_PORT
+    return 'tcp', (host, int(tcp_port), framer)
+
+
+def describe_endpoint(port):
+    return _describe_key(parse_endpoint(port))
+
+
+def _describe_key(key):
+    kind, target = key
+    if kind == 'serial': return f"串口 {target}"
+    host, tcp_port, framer = target
+    return f"{'Modbus TCP' if framer == FramerType.SOCKET else 'RTU over TCP'} {host}:{tcp_port}"
+
+
+class _PooledConnection:
+    """连接池中的一个底层 pymodbus 客户端。"""
+    def __init__(self, key, client=None, gap=0.0):
+        self.key = key
+        self.client = client
+        self.lock = threading.RLock()
+        self.refs = 0
+        self.connected = False
+        self.gap = gap                  # 帧间静默时间 (秒)，TCP 端点为 0
+        self.last_frame_end = 0.0
+        self.rx_bytes = 0               # 当前请求已收到的字节数 (区分超时与损坏的帧)
+
+    def trace_packet(self, sending, data):
+        if not sending: self.rx_bytes = len(data)
+        return data
+
+    def wait_gap(self):
+        remaining = self.last_frame_end + self.gap - time.monotonic()
+        if remaining > 0: time.sleep(remaining)
+
+
+class ModbusConnectionPool:
+    """按端点复用 pymodbus 客户端的连接池 (每个进程一个，见 get_pool)。"""
+    def __init__(self):
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, port, baudrate=9600, timeout=1):
+        kind, target = parse_endpoint(port)
+        key = (kind, target)
+        with self._lock:
+            conn = self._connections.get(key)
+            if conn is None:
+                conn = self._connections[key] = _PooledConnection(key, gap=inter_frame_gap(baudrate) if kind == 'serial' else 0.0)
+                conn.client = self._create_client(kind, target, baudrate, timeout, conn.trace_packet)
+            elif kind == 'serial' and conn.client.comm_params.baudrate != baudrate:
+                logger.warning("串口 %s 已按 %s 波特率打开，忽略设备配置的 %s。", target, conn.client.comm_params.baudrate, baudrate)
+            conn.refs += 1
+        return conn
+
+    def release(self, conn):
+        with self._lock:
+            conn.refs -= 1
+            if conn.refs > 0: return
+            self._connections.pop(conn.key, None)
+        with conn.lock:
+            conn.client.close(); conn.connected = False
+
+    @staticmethod
+    def _create_client(kind, target, baudrate, timeout, trace_packet=None):
+        # 重试由事务层负责 (超时逐次加倍)，pymodbus 内部不再以固定超时重试
+        if kind == 'serial':
+            return ModbusSerialClient(port=target, baudrate=baudrate, timeout=timeout, parity='N', stopbits=1, bytesize=8,
+                                      retries=0, trace_packet=trace_packet)
+        host, tcp_port, framer = target
+        return ModbusTcpClient(host, port=tcp_port, framer=framer, timeout=timeout, retries=0, trace_packet=trace_packet)
+
+    def stats(self):
+        """{端点描述: 使用该端点的设备数}。"""
+        with self._lock:
+            return {_describe_key(conn.key): conn.refs for conn in self._connections.values()}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None: _pool = ModbusConnectionPool()
+        return _pool
+
+
+class SharedModbusClient:
+    """
+    单台设备持有的连接句柄，接口与 pymodbus 同步客户端一致。
+
+    :param port: 端点字符串，见模块说明。
+    :param timeout: 单次请求的超时上限 (秒)，实际超时由事务层按响应时间自适应。
+    :param max_retries: 超时或收到损坏的帧后的最大重试次数。
+    """
+    def __init__(self, port, baudrate=9600, timeout=1, pool=None, max_retries=DEFAULT_MAX_RETRIES):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.pool = pool or get_pool()
+        self._conn = None
+        self.transaction = ModbusTransaction(baudrate if parse_endpoint(port)[0] == 'serial' else None, timeout, max_retries)
+
+    @property
+    def stats(self):
+        """本设备的通讯统计 (modbus_transaction.TransactionStats)。"""
+        return self.transaction.stats
+
+    def connect(self):
+        if self._conn is None:
+            self._conn = self.pool.acquire(self.port, self.baudrate, self.timeout)
+        conn = self._conn
+        with conn.lock:
+            # 连接已由同一端点上的其它设备建立时直接复用
+            if not conn.connected or not conn.client.connected:
+                conn.connected = bool(conn.client.connect())
+            return conn.connected
+
+    def close(self):
+        if self._conn is not None:
+            self.pool.release(self._conn); self._conn = None
+
+    @property
+    def connected(self):
+        return self._conn is not None and self._conn.connected
+
+    def _call(self, method, *args, **kwargs):
+        conn = self._conn
+        if conn is None:
+            raise ConnectionException(f"{describe_endpoint(self.port)} 未连接。")
+        with conn.lock:
+            return self.transaction.execute(conn, method, *args, **kwargs)
+
+    def read_holding_registers(self, address, count=1, device_id=1):
+        return self._call('read_holding_registers', address, count=count, device_id=device_id)
+
+    def write_register(self, address, value, device_id=1):
+        return self._call('write_register', address, value, device_id=device_id)
+
+    def write_registers(self, address, values, device_id=1):
+        return self._call('write_registers', address, values, device_id=device_id)
+
+    def write_coil(self, address, value, device_id=1):
+        return self._call('write_coil', address, value, device_id=device_id)
+
+
+def open_client(port, baudrate=9600, timeout=1, max_retries=DEFAULT_MAX_RETRIES):
+    """驱动使用的入口：返回指向 port 所描述端点的共享客户端 (尚未连接)。"""
+    return SharedModbusClient(port, baudrate=baudrate, timeout=timeout, max_retries=max_retries)
@@ -0,0 +1,328 @@
+# file: node_aggregator.py (多节点汇聚)
+'''
+把运行在其它计算机上的控制服务 (controller_service.py) 汇聚到本机启动器。
+
+每台节点机只打开自己本地的串口，监听面向启动器的网卡地址，并用共享口令和/或来源地址限制访问:
+    python controller_service.py --sets <set_id ...> --address <节点IP>:8765 --token <口令> --allow <启动器IP>
+启动器一侧在 system_config.json 中为对应系统集加上 "node": "节点地址:端口" 和 "node_token": "<口令>"
+(或在启动器的环境变量 MPS_SERVICE_TOKEN 中设置口令)，
+启动该系统集时不再创建本地 SystemController，而是通过 RemoteSetLink 连接节点。
+
+- 每个节点只建立一条连接，同一节点上的多个系统集共用；
+- 订阅时请求批量推送 (batch_interval)，节点把一段时间内的状态合并为一条消息发送，减少小包和系统调用；
+- 定期用 ping 估计两台机器的时钟偏差 (取往返时间最短的一次采样，NTP 方式)，
+  把远程快照的 timestamp 换算到本机时钟，保证多节点数据在同一时间轴上对齐；
+  发往节点的指令中的 start_at (定时开始) 反向换算到节点时钟，本地与远程系统集可以对齐开始；
+- 连接断开后自动重连并重新订阅。
+
+RemoteSetLink 提供与本地后台相同的 command_queue / status_queue / process 接口，
+ControlSystemWindow 无需区分本地和远程系统集。
+
+在一台 Linux 机器上测试多节点:
+    python controller_service.py --sets power_supply_1_system --address 127.0.0.1:9001 &
+    python controller_service.py --sets power_supply_2_system --address 127.0.0.1:9002 &
+    python node_aggregator.py 127.0.0.1:9001 127.0.0.1:9002
+'''
+
+import sys
+import time
+import argparse
+import threading
+from collections import deque
+
+from controller_client import ControllerClient, ControllerServiceError
+from log_pipeline import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_BATCH_INTERVAL = 0.2        # 节点合并推送状态的时间窗 (秒)
+CLOCK_SYNC_INTERVAL = 30.0          # 重新估计时钟偏差的间隔 (秒)
+CLOCK_SYNC_SAMPLES = 8              # 每次估计使用的 ping 次数
+RECONNECT_INTERVAL = 3.0
+
+
+def estimate_clock_offset(client, samples=CLOCK_SYNC_SAMPLES):
+    """
+    用若干次 ping 估计节点时钟相对本机的偏差。
+
+    :return: (offset, rtt)，offset = 节点时间 - 本机时间 (秒)，取往返时间最短的一次采样。
+    """
+    best = None
+    for _ in range(samples):
+        t0 = time.time(); m0 = time.monotonic()
+        remote = client.ping()
+        rtt = time.monotonic() - m0
+        offset = remote - (t0 + rtt / 2)
+        if best is None or rtt < best[1]: best = (offset, rtt)
+    return best
+
+
+class LinkStatusChannel:
+    """
+    进程内的最新值状态通道，接口与 status_channel.StatusChannel 一致 (put / drain / stats_text)。
+    远程状态由网络线程放入，由 UI 定时器取出。
+    """
+    def __init__(self, history=64):
+        self.history = history
+        self._events = deque()
+        self._snapshots = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+        self.info = ""
+
+    def put(self, message):
+        with self._lock:
+            if isinstance(message, dict) and 'devices' in message:
+                self.published += 1
+                if len(self._snapshots) == self.history: self.dropped += 1
+                self._snapshots.append(message)
+            else:
+                self._events.append(message)
+
+    def drain(self):
+        with self._lock:
+            events = list(self._events); self._events.clear()
+            snapshots = list(self._snapshots); self._snapshots.clear()
+        return events, snapshots
+
+    def stats_text(self):
+        return f"状态快照: 已接收 {self.published} / 因界面繁忙丢弃 {self.dropped} | {self.info}"
+
+
+class RemoteCommandQueue:
+    """把 command_queue.put(...) 转发为对节点的 command 请求。"""
+    def __init__(self, link):
+        self.link = link
+
+    def put(self, command):
+        self.link.send_command(command)
+
+
+class RemoteSetLink:
+    """
+    一个远程系统集在本机的代理，替代 (command_queue, status_queue, process) 三元组。
+
+    关闭窗口时 ('shutdown' 指令 / join) 只断开本机的订阅，节点上的控制器继续运行。
+    """
+    def __init__(self, node, set_id):
+        self.node = node
+        self.set_id = set_id
+        self.command_queue = RemoteCommandQueue(self)
+        self.status_queue = LinkStatusChannel()
+        self._closed = False
+
+    def send_command(self, command):
+        if command.get('type') == 'shutdown':
+            self.close(); return
+        try:
+            self.node.send_command(self.set_id, command)
+        except ControllerServiceError as e:
+            self.status_queue.put({'error': f"远程指令发送失败 ({self.node.address}): {e}"})
+
+    # --- 与 multiprocessing.Process 相同的最小接口 ---
+    def is_alive(self):
+        # 节点断线重连期间代理仍然有效
+        return not self._closed
+
+    def join(self, timeout=None):
+        self.close()
+
+    def terminate(self):
+        self.close()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.node.detach(self)
+
+
+class RemoteNode:
+    """
+    与一个节点服务的连接：共享连接、批量订阅、时钟偏差估计与自动重连。
+
+    :param address: 节点服务地址 'host:port'。
+    :param token: 节点服务的共享口令；None 时由 ControllerClient 取环境变量 MPS_SERVICE_TOKEN。
+    """
+    def __init__(self, address, batch_interval=DEFAULT_BATCH_INTERVAL, client_factory=ControllerClient, token=None):
+        self.address = address
+        self.token = token
+        self.batch_interval = batch_interval
+        self.client_factory = client_factory
+        self.client = None
+        self.links = {}                  # set_id -> RemoteSetLink
+        self.offset = 0.0                # 节点时间 - 本机时间
+        self.rtt = None
+        self.connected = False
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    # --- 连接管理 ---
+    def start(self):
+        if self._running: return
+        if self._thread and self._thread.is_alive(): self._thread.join(RECONNECT_INTERVAL + 1.0)
+        self._running = True
+        self._connect()
+        self._thread = threading.Thread(target=self._run, daemon=True); self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._disconnect()
+
+    def _connect(self):
+        try:
+            client = self.client_factory(self.address, token=self.token).connect()
+            self.offset, self.rtt = estimate_clock_offset(client)
+            self.client = client
+            self.connected = True
+            for set_id in list(self.links): self._subscribe(set_id)
+            logger.info("已连接节点 %s，时钟偏差 %+.1f ms，往返 %.1f ms", self.address, self.offset * 1000, self.rtt * 1000)
+        except (OSError, ControllerServiceError) as e:
+            self._disconnect()
+            logger.warning("无法连接节点 %s: %s", self.address, e)
+        self._update_info()
+
+    def _disconnect(self):
+        self.connected = False
+        if self.client:
+            self.client.close(); self.client = None
+
+    def attach(self, set_id):
+        """
+        为一个系统集建立代理。节点暂时不可达时代理照常返回，连接错误以事件形式出现在其状态通道中，
+        后台线程会持续重连并在连上后自动订阅。
+        """
+        with self._lock:
+            link = self.links[set_id] = RemoteSetLink(self, set_id)
+        if self._running and self.connected: self._subscribe(set_id)
+        else: self.start()
+        if not self.connected:
+            link.status_queue.put({'error': f"无法连接远程节点 {self.address}，将每 {RECONNECT_INTERVAL:.0f} 秒自动重试。"})
+        self._update_info()
+        return link
+
+    def _subscribe(self, set_id):
+        link = self.links.get(set_id)
+        try:
+            if set_id not in {s['set_id'] for s in self.client.list_sets()}:
+                if link: link.status_queue.put({'error': f"节点 {self.address} 上没有运行系统集 {set_id}。"})
+                return
+            self.client.subscribe(set_id, batch_interval=self.batch_interval)
+        except ControllerServiceError as e:
+            logger.warning("订阅节点 %s 上的系统集 %s 失败: %s", self.address, set_id, e)
+
+    def detach(self, link):
+        with self._lock:
+            if self.links.get(link.set_id) is link: del self.links[link.set_id]
+            remaining = bool(self.links)
+        if not remaining: self.stop()
+
+    def send_command(self, set_id, command):
+        client = self.client
+        if client is None: raise ControllerServiceError("节点连接已断开。")
+        params = command.get('params', {})
+        # start_at 是本机墙上时间 (多个系统集对齐开始)，换算到节点时钟
+        if 'start_at' in params: params = dict(params, start_at=params['start_at'] + self.offset)
+        client.send_command(set_id, command['type'], **params)
+
+    # --- 后台线程: 分发状态、定期校时、断线重连 ---
+    def _run(self):
+        next_sync = time.monotonic() + CLOCK_SYNC_INTERVAL
+        while self._running:
+            client = self.client
+            if client is None or not client.is_connected():
+                if self.connected: self._on_connection_lost()
+                time.sleep(RECONNECT_INTERVAL)
+                if self._running: self._connect()
+                continue
+            try:
+                set_id, data = client.get_status(timeout=0.2)
+                self._dispatch(set_id, data)
+            except Exception:
+                pass
+            if time.monotonic() >= next_sync:
+                try:
+                    self.offset, self.rtt = estimate_clock_offset(client); self._update_info()
+                except ControllerServiceError:
+                    pass
+                next_sync = time.monotonic() + CLOCK_SYNC_INTERVAL
+
+    def _dispatch(self, set_id, data):
+        link = self.links.get(set_id)
+        if link is None or not isinstance(data, dict): return
+        if 'timestamp' in data:
+            # 节点时钟 -> 本机时钟
+            data = dict(data, timestamp=data['timestamp'] - self.offset)
+            # 设备采样时间 t_ns 是节点的单调时钟，换算用的锚点随快照一起平移到本机时钟
+            if data.get('clock'): data['clock'] = [data['clock'][0] - self.offset, data['clock'][1]]
+        elif 'finished_at' in data:
+            data = dict(data, finished_at=data['finished_at'] - self.offset)
+        link.status_queue.put(data)
+
+    def _on_connection_lost(self):
+        self._disconnect(); self._update_info()
+        logger.error("与节点 %s 的连接已断开，%s 秒后重连。", self.address, RECONNECT_INTERVAL)
+        for link in list(self.links.values()):
+            link.status_queue.put({'error': f"与远程节点 {self.address} 的连接已断开，正在尝试重连。"})
+
+    def _update_info(self):
+        if self.connected:
+            info = f"节点 {self.address} | 时钟偏差 {self.offset * 1000:+.1f} ms | 往返 {self.rtt * 1000:.1f} ms"
+        else:
+            info = f"节点 {self.address} | 未连接"
+        for link in list(self.links.values()): link.status_queue.info = info
+
+
+class NodeAggregator:
+    """按地址管理所有远程节点；启动器通过 open_set 获取远程系统集的代理。"""
+    def __init__(self, batch_interval=DEFAULT_BATCH_INTERVAL):
+        self.batch_interval = batch_interval
+        self.nodes = {}
+
+    def open_set(self, system_set):
+        address = system_set['node']
+        node = self.nodes.get(address)
+        if node is None: node = self.nodes[address] = RemoteNode(address, self.batch_interval, token=system_set.get('node_token'))
+        return node.attach(system_set['set_id'])
+
+    def close(self):
+        for node in self.nodes.values(): node.stop()
+        self.nodes.clear()
+
+
+def is_remote_set(system_set):
+    return bool(system_set.get('node'))
+
+
+def main(argv=None):
+    """命令行汇聚测试：连接若干节点，订阅全部系统集，周期性打印时钟偏差和接收速率。"""
+    parser = argparse.ArgumentParser(description="连接多个控制服务节点并汇聚状态")
+    parser.add_argument('addresses', nargs='+', help="节点地址 host:port")
+    parser.add_argument('--batch-interval', type=float, default=DEFAULT_BATCH_INTERVAL)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--token', default=None, help="节点服务的共享口令 (默认取环境变量 MPS_SERVICE_TOKEN)")
+    args = parser.parse_args(argv)
+    aggregator = NodeAggregator(args.batch_interval)
+    links = []
+    for address in args.addresses:
+        node = aggregator.nodes[address] = RemoteNode(address, args.batch_interval, token=args.token)
+        node.start()
+        if not node.connected:
+            print(f"无法连接节点 {address}"); continue
+        for system_set in node.client.list_sets():
+            links.append(node.attach(system_set['set_id']))
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        time.sleep(1.0)
+        for link in links:
+            events, snapshots = link.status_queue.drain()
+            latest = snapshots[-1] if snapshots else None
+            age = f"{(time.time() - latest['timestamp']) * 1000:.0f} ms" if latest else "-"
+            print(f"{link.set_id}: {len(snapshots)} 条快照, {len(events)} 条事件, 最新快照延迟 {age} | {link.status_queue.info}")
+    aggregator.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
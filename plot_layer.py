@@ -0,0 +1,185 @@
+# file: plot_layer.py (实时曲线的集中刷新层)
+'''
+所有窗口的实时曲线由一个刷新器统一重绘，不再由每个窗口的 500 ms 定时器各自 setData。
+以前每打开一个系统集/调试窗口就多一组每 500 ms 全量重绘的曲线 (不论窗口是否可见)，开到十几个窗口时 UI 线程被占满。
+
+    - 只重绘可见的窗口: 隐藏、最小化或绘图区本身不可见 (例如所在的页签未显示) 的窗口跳过，重新显示时立即补画一次；
+    - 数据没有变化 (SampleStore.revision 未变) 的窗口跳过；
+    - 同一个绘图区的全部曲线只做一次查询 (一次 minmax 降采样取出所有列)，在关闭界面更新的情况下依次 setData，
+      之后只触发一次重绘；
+    - 自适应刷新率: 测量每一帧的实际开销 (查询 + setData + 绘图区的 paintEvent)，按平滑后的帧开销调整刷新间隔，
+      使绘图占用 UI 线程的比例不超过 budget，介于 min_interval 与 max_interval 之间；
+    - 快速绘制路径: 曲线开启 clipToView (只处理可见范围内的点) 与自动 peak 降采样；安装了 PyOpenGL 时绘图区使用 OpenGL 视口
+      (环境变量 MPS_PLOT_OPENGL=0 可关闭，=1 强制开启)。
+
+窗口创建绘图区时使用 FastPlotWidget，并用 register() 把 (曲线, 数据列) 交给刷新器；关闭时 unregister()。
+'''
+
+import os
+import time
+import importlib.util
+
+import pyqtgraph as pg
+from PyQt6.QtCore import QObject, QTimer
+from PyQt6.QtWidgets import QApplication
+
+from log_pipeline import get_logger
+
+logger = get_logger(__name__)
+
+OPENGL_ENV = "MPS_PLOT_OPENGL"
+DEFAULT_MAX_POINTS = 2000
+MIN_INTERVAL = 0.25          # 秒
+MAX_INTERVAL = 2.0
+FRAME_BUDGET = 0.25          # 绘图最多占用 UI 线程时间的比例
+COST_ALPHA = 0.3             # 帧开销的指数平滑系数
+
+
+def opengl_available():
+    """是否为绘图区启用 OpenGL 视口：环境变量优先，否则看 PyOpenGL 是否已安装。"""
+    flag = os.environ.get(OPENGL_ENV)
+    if flag is not None: return flag.strip() not in ('', '0', 'false', 'no')
+    return importlib.util.find_spec('OpenGL') is not None
+
+
+def configure_curve(curve):
+    """为一条 PlotDataItem 打开 pyqtgraph 的快速绘制选项。"""
+    curve.setClipToView(True)
+    curve.setDownsampling(auto=True, method='peak')
+
+
+class FastPlotWidget(pg.PlotWidget):
+    """PlotWidget，可用时使用 OpenGL 视口，并把每次 paintEvent 的耗时计入刷新器的帧开销。"""
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('useOpenGL', opengl_available())
+        super().__init__(*args, **kwargs)
+        self.refresher = None
+
+    def paintEvent(self, ev):
+        start = time.perf_counter()
+        try:
+            return super().paintEvent(ev)
+        finally:
+            if self.refresher is not None: self.refresher.paint_cost += time.perf_counter() - start
+
+    def showEvent(self, ev):
+        super().showEvent(ev)
+        if self.refresher is not None: self.refresher.refresh_soon()
+
+
+class PlotBinding:
+    """一个绘图区及其曲线与数据来源。"""
+    __slots__ = ('window', 'widget', 'store', 'curves', 'columns', 'max_points', 'revision')
+
+    def __init__(self, window, widget, store, curves, max_points):
+        self.window = window
+        self.widget = widget
+        self.store = store
+        self.curves = list(curves)                            # [(PlotDataItem, 列名)]
+        self.columns = list(dict.fromkeys(column for _, column in self.curves))
+        self.max_points = max_points
+        self.revision = None                                  # 上次绘制时 store 的 revision
+
+    def visible(self):
+        window = self.window
+        return window.isVisible() and not window.isMinimized() and self.widget.isVisible()
+
+
+class PlotRefresher(QObject):
+    """
+    全部实时曲线的集中刷新器，运行在 UI 线程的一个 QTimer 上。
+
+    :param min_interval, max_interval: 刷新间隔范围 (秒)。
+    :param budget: 绘图开销占 UI 线程时间的目标比例。
+    """
+    def __init__(self, parent=None, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, budget=FRAME_BUDGET):
+        super().__init__(parent)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget = budget
+        self._bindings = []
+        self.paint_cost = 0.0                 # 上一帧以来绘图区 paintEvent 的累计耗时
+        self.frame_cost = 0.0                 # 平滑后的帧开销 (秒)
+        self.frames = self.drawn = self.skipped = 0
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.setInterval(int(min_interval * 1000))
+
+    @property
+    def interval(self):
+        return self._timer.interval() / 1000
+
+    def register(self, window, widget, store, curves, max_points=DEFAULT_MAX_POINTS):
+        """
+        登记一个绘图区。
+
+        :param window: 绘图区所在的顶层窗口 (用于判断是否隐藏/最小化)。
+        :param widget: 绘图区 (FastPlotWidget 时会上报绘制耗时)。
+        :param store: 数据来源 SampleStore。
+        :param curves: [(PlotDataItem, 列名), ...]。
+        """
+        for curve, _ in curves: configure_curve(curve)
+        if isinstance(widget, FastPlotWidget): widget.refresher = self
+        binding = PlotBinding(window, widget, store, curves, max_points)
+        self._bindings.append(binding)
+        if not self._timer.isActive(): self._timer.start()
+        self.refresh_soon()
+        return binding
+
+    def unregister(self, window):
+        """移除窗口的全部绘图区；没有绘图区时停止定时器。"""
+        for binding in [b for b in self._bindings if b.window is window]:
+            if isinstance(binding.widget, FastPlotWidget): binding.widget.refresher = None
+            self._bindings.remove(binding)
+        if not self._bindings: self._timer.stop()
+
+    def refresh_soon(self):
+        """窗口重新显示等情况下尽快补画一次 (不等到下一个刷新周期)。"""
+        QTimer.singleShot(0, self.refresh)
+
+    def refresh(self):
+        start = time.perf_counter()
+        drawn = 0
+        for binding in list(self._bindings):
+            try:
+                if binding.revision == binding.store.revision or not binding.visible():
+                    self.skipped += 1; continue
+                self._draw(binding); drawn += 1
+            except RuntimeError:
+                # 底层 Qt 对象已被销毁 (窗口关闭时未 unregister)
+                self._bindings.remove(binding)
+        if not drawn: return
+        self.drawn += drawn; self.frames += 1
+        self._adapt(time.perf_counter() - start + self.paint_cost)
+        self.paint_cost = 0.0
+
+    def _draw(self, binding):
+        t, values = binding.store.query(method='minmax', max_points=binding.max_points, columns=binding.columns)
+        widget = binding.widget
+        widget.setUpdatesEnabled(False)
+        try:
+            for curve, column in binding.curves: curve.setData(t, values[column])
+        finally:
+            widget.setUpdatesEnabled(True)
+        binding.revision = binding.store.revision
+
+    def _adapt(self, cost):
+        # 帧开销包含上一帧触发的绘制 (paintEvent 在本次刷新之后才执行，计入下一次测量)
+        self.frame_cost = cost if self.frames == 1 else self.frame_cost + COST_ALPHA * (cost - self.frame_cost)
+        interval = min(self.max_interval, max(self.min_interval, self.frame_cost / self.budget))
+        if abs(interval - self.interval) > 0.05:
+            self._timer.setInterval(int(interval * 1000))
+            logger.debug("绘图刷新间隔调整为 %.2f s (帧开销 %.1f ms，%d 个绘图区)", interval, self.frame_cost * 1000, len(self._bindings))
+
+    def stats_text(self):
+        return f"绘图: {1 / self.interval:.1f} fps, 帧开销 {self.frame_cost * 1000:.1f} ms"
+
+
+_refresher = None
+
+
+def plot_refresher():
+    """进程内共享的刷新器 (第一次调用时创建，父对象为 QApplication)。"""
+    global _refresher
+    if _refresher is None: _refresher = PlotRefresher(QApplication.instance())
+    return _refresher
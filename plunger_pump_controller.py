@@ -1,9 +1,12 @@
 # file: plunger_pump_controller.py (已添加对多余参数的兼容处理)
 
 import time
-from pymodbus.client import ModbusSerialClient
 from pymodbus.exceptions import ModbusException
 from base_pump import BasePump
+from modbus_transport import open_client
+from log_pipeline import get_logger
+
+logger = get_logger(__name__)
 
 class OushishengPlungerPump(BasePump):
     """
@@ -12,30 +15,24 @@ class OushishengPlungerPump(BasePump):
     """
     def __init__(self, port, unit_address=55, baudrate=9600, timeout=1):
         super().__init__(port, unit_address, baudrate)
-        self.client = ModbusSerialClient(
-            port=self.port,
-            baudrate=self.baudrate,
-            timeout=timeout,
-            parity='N',
-            stopbits=1,
-            bytesize=8
-        )
+        # port 可以是串口名，也可以是 tcp:// 或 rtu+tcp:// 网关地址；同一端点上的设备共用一个连接
+        self.client = open_client(self.port, baudrate=self.baudrate, timeout=timeout)
 
     # --- 实现 BasePump 的标准接口 ---
     def connect(self):
-        print(f"[{self.__class__.__name__}] 正在连接柱塞泵...")
+        logger.info("[%s] 正在连接柱塞泵...", self.__class__.__name__)
         if self.client.connect():
             self.is_connected = True
-            print(f"[{self.__class__.__name__}] 连接成功。")
+            logger.info("[%s] 连接成功。", self.__class__.__name__)
             # 启用485控制
             return True
         else:
             self.is_connected = False
-            print(f"[{self.__class__.__name__}] 连接失败。")
+            logger.error("[%s] 连接失败。", self.__class__.__name__)
             return False
 
     def disconnect(self):
-        print(f"[{self.__class__.__name__}] 正在关闭连接。")
+        logger.info("[%s] 正在关闭连接。", self.__class__.__name__)
         self.client.close()
         self.is_connected = False
     
@@ -46,9 +43,9 @@ class OushishengPlungerPump(BasePump):
         使用 **kwargs 来接收并忽略所有非预期的参数（如 direction）。
         :param flow_rate: 目标流量 (ml/min)。
         """
-        print(f"[{self.__class__.__name__}] 正在启动泵，流量: {flow_rate} ml/min...")
+        logger.info("[%s] 正在启动泵，流量: %s ml/min...", self.__class__.__name__, flow_rate)
         if not self.is_connected:
-            print("错误: 设备未连接。")
+            logger.warning("错误: 设备未连接。")
             return False
         
         # 柱塞泵需要先设流量，再启动
@@ -57,7 +54,7 @@ class OushishengPlungerPump(BasePump):
         return self._write_register(0x05, 1) # 启动泵的地址是 5，值为 1
 
     def stop(self):
-        print(f"[{self.__class__.__name__}] 正在停止泵...")
+        logger.info("[%s] 正在停止泵...", self.__class__.__name__)
         return self._write_register(0x07, 1) # 停止泵的地址是 7，值为 1
 
     # ★★★ 修改点 2：实现 set_parameters 方法 ★★★
@@ -67,11 +64,11 @@ class OushishengPlungerPump(BasePump):
         使用 **kwargs 来接收并忽略所有非预期的参数（如 direction）。
         """
         if not self.is_connected:
-            print("错误: 设备未连接。")
+            logger.warning("错误: 设备未连接。")
             return False
 
         if flow_rate is not None:
-            print(f"[{self.__class__.__name__}] 动态设置流量为: {flow_rate} ml/min...")
+            logger.info("[%s] 动态设置流量为: %s ml/min...", self.__class__.__name__, flow_rate)
             return self._set_flow_rate(flow_rate)
         return False
         
@@ -87,7 +84,8 @@ class OushishengPlungerPump(BasePump):
             "is_running": is_running,
             "pressure_mpa": pressure if pressure is not None else 0.0,
             "flow_rate_ml_min": actual_flow_rate if actual_flow_rate is not None else 0.0,
-            "speed_rpm": 0.0 # 柱塞泵没有转速概念
+            "speed_rpm": 0.0, # 柱塞泵没有转速概念
+            **self.client.stats.as_status() # 通讯超时 / CRC 错误累计次数
         }
 
     # --- 内部辅助函数 ---
@@ -112,7 +110,7 @@ class OushishengPlungerPump(BasePump):
             r = self.client.write_register(address, value, device_id=self.unit_address)
             return not r.isError()
         except ModbusException as e:
-            print(f"[{self.__class__.__name__}] 写寄存器错误: {e}")
+            logger.error("[%s] 写寄存器错误: %s", self.__class__.__name__, e)
             return False
 
     def _read_register(self, address):
@@ -120,5 +118,5 @@ class OushishengPlungerPump(BasePump):
             r = self.client.read_holding_registers(address, device_id=self.unit_address) # 这个地方一直有bug，如出错，尝试增在address后增加count参数
             return None if r.isError() else r.registers[0]
         except ModbusException as e:
-            print(f"[{self.__class__.__name__}] 读寄存器错误: {e}")
+            logger.error("[%s] 读寄存器错误: %s", self.__class__.__name__, e)
             return None
\ No newline at end of file
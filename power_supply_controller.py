@@ -2,6 +2,9 @@
 
 import pyvisa
 import time
+from log_pipeline import get_logger
+
+logger = get_logger(__name__)
 
 class GPD4303SPowerSupply:
     """
@@ -16,10 +19,10 @@ class GPD4303SPowerSupply:
         self.instrument = None
         # ★★★ 核心修正 1：将通道数修正为 2 ★★★
         self.num_channels = 2
-        print(f"初始化设备: GPD4303SPowerSupply on {port}")
+        logger.info("初始化设备: GPD4303SPowerSupply on %s", port)
 
     def connect(self):
-        print(f"[{self.__class__.__name__}] 正在连接电源...")
+        logger.info("[%s] 正在连接电源...", self.__class__.__name__)
         try:
             rm = pyvisa.ResourceManager()
             self.instrument = rm.open_resource(self.port)
@@ -31,17 +34,17 @@ class GPD4303SPowerSupply:
             self.instrument.baud_rate = self.baudrate
             
             idn = self.instrument.query("*IDN?")
-            print(f"[{self.__class__.__name__}] 连接成功. 设备信息: {idn.strip()}")
+            logger.info("[%s] 连接成功. 设备信息: %s", self.__class__.__name__, idn.strip())
             self.is_connected = True
             return True
         except pyvisa.errors.VisaIOError as e:
             self.is_connected = False
-            print(f"[{self.__class__.__name__}] 连接失败: {e}")
+            logger.error("[%s] 连接失败: %s", self.__class__.__name__, e)
             return False
 
     def disconnect(self):
         if self.instrument and self.is_connected:
-            print(f"[{self.__class__.__name__}] 正在关闭连接。")
+            logger.info("[%s] 正在关闭连接。", self.__class__.__name__)
             self.set_output(enable=False)
             self.instrument.close()
         self.is_connected = False
@@ -52,7 +55,7 @@ class GPD4303SPowerSupply:
             self.instrument.write(command)
             time.sleep(0.05)
         except pyvisa.errors.VisaIOError as e:
-            print(f"发送指令 '{command}' 失败: {e}")
+            logger.error("发送指令 '%s' 失败: %s", command, e)
 
     def _query(self, query):
         if not self.is_connected: return None
@@ -61,20 +64,20 @@ class GPD4303SPowerSupply:
             time.sleep(0.05)
             return response
         except pyvisa.errors.VisaIOError as e:
-            print(f"查询 '{query}' 失败: {e}")
+            logger.error("查询 '%s' 失败: %s", query, e)
             return None
 
     def set_voltage(self, channel, voltage):
         # ★★★ 核心修正 2：确保设置的通道号不超出范围 ★★★
         if not 1 <= channel <= self.num_channels:
-            print(f"错误: 通道 {channel} 无效。有效通道为 1-{self.num_channels}。")
+            logger.warning("错误: 通道 %s 无效。有效通道为 1-%s。", channel, self.num_channels)
             return
         self._send_command(f"VSET{channel}:{voltage:.3f}")
 
     def set_current(self, channel, current):
         # ★★★ 核心修正 2：确保设置的通道号不超出范围 ★★★
         if not 1 <= channel <= self.num_channels:
-            print(f"错误: 通道 {channel} 无效。有效通道为 1-{self.num_channels}。")
+            logger.warning("错误: 通道 %s 无效。有效通道为 1-%s。", channel, self.num_channels)
             return
         self._send_command(f"ISET{channel}:{current:.3f}")
 
@@ -0,0 +1,106 @@
+# file: profile_startup.py (启动耗时分析)
+'''
+测量程序冷启动相关的耗时，用于确认启动优化的效果:
+
+    1. 导入耗时报告: 用 python -X importtime 分别测量 main、control_ui、system_controller 的导入时间，
+       列出自身耗时最多的模块；
+    2. time-to-launcher-window: 从启动 python main.py 到启动器窗口显示并完成首次事件处理；
+    3. time-to-backend-ready: 以 spawn 方式 (与 Windows / 打包后的 exe 相同) 启动控制器子进程，
+       到子进程导入完 system_controller 及配置中用到的驱动、可以开始连接设备为止。
+
+用法:
+    python profile_startup.py              # 全部测量，每项重复 3 次取中位数
+    python profile_startup.py --top 30 --runs 5
+'''
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+import multiprocessing
+
+STARTUP_PROBE_ENV = "MPS_STARTUP_PROBE"      # 与 control_ui.STARTUP_PROBE_ENV 一致
+
+
+def import_profile(module):
+    """
+    在全新的解释器中导入 module，解析 -X importtime 的输出。
+
+    :return: (总耗时秒, [(自身耗时秒, 累计耗时秒, 模块名), ...])
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=dict(os.environ, QT_QPA_PLATFORM="offscreen"))
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line: continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us) / 1e6, int(cumulative_us) / 1e6, name.strip()))
+    total = next((cumulative for _, cumulative, name in reversed(rows) if name == module), 0.0)
+    return total, rows
+
+
+def measure_launcher_window(runs):
+    samples = []
+    for _ in range(runs):
+        env = dict(os.environ, **{STARTUP_PROBE_ENV: repr(time.time())})
+        result = subprocess.run([sys.executable, "main.py"], capture_output=True, text=True, env=env, timeout=120)
+        for line in result.stdout.splitlines():
+            if line.startswith(STARTUP_PROBE_ENV): samples.append(float(line.rsplit("=", 1)[1]))
+    return samples
+
+
+def _backend_probe(device_types, ready_queue):
+    # 子进程中执行: 只导入控制器及本系统集需要的驱动，然后报告就绪时间
+    import system_controller  # noqa: F401
+    import driver_registry
+    for device_type in device_types:
+        spec = driver_registry.find_driver(device_type)
+        if spec: __import__(spec.module)
+    ready_queue.put((time.time(), len(sys.modules), [m for m in ('PyQt6', 'pandas', 'pyqtgraph') if m in sys.modules]))
+
+
+def measure_backend_ready(runs, device_types):
+    ctx = multiprocessing.get_context('spawn')
+    samples = []; info = None
+    for _ in range(runs):
+        ready_queue = ctx.Queue()
+        process = ctx.Process(target=_backend_probe, args=(device_types, ready_queue))
+        t0 = time.time(); process.start()
+        ready_at, module_count, ui_modules = ready_queue.get(timeout=120)
+        process.join()
+        samples.append(ready_at - t0); info = (module_count, ui_modules)
+    return samples, info
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量启动与导入耗时")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15, help="导入报告中列出的模块数")
+    args = parser.parse_args(argv)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    print("== 导入耗时 (python -X importtime) ==")
+    for module in ('main', 'control_ui', 'system_controller'):
+        total, rows = import_profile(module)
+        print(f"\nimport {module}: {total * 1000:.0f} ms，共 {len(rows)} 个模块；自身耗时最多的模块:")
+        for self_s, cumulative_s, name in sorted(rows, reverse=True)[:args.top]:
+            print(f"    {self_s * 1000:8.1f} ms  (累计 {cumulative_s * 1000:8.1f} ms)  {name}")
+
+    from config import get_registry
+    device_types = sorted(get_registry().by_type)
+    samples, (module_count, ui_modules) = measure_backend_ready(args.runs, device_types)
+    print(f"\n== time-to-backend-ready (spawn) ==\n    中位数 {statistics.median(samples) * 1000:.0f} ms，"
+          f"子进程加载 {module_count} 个模块，界面/数据处理库: {ui_modules or '无'}")
+
+    samples = measure_launcher_window(args.runs)
+    if samples:
+        print(f"\n== time-to-launcher-window ==\n    中位数 {statistics.median(samples) * 1000:.0f} ms ({', '.join(f'{s * 1000:.0f}' for s in samples)})")
+    else:
+        print("\n== time-to-launcher-window ==\n    未能测量 (main.py 没有输出测量结果，请检查图形环境)。")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
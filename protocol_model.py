@@ -0,0 +1,191 @@
+# file: protocol_model.py (协议步骤表与协议文件的二进制缓存)
+'''
+协议编辑器的数据层。以前每个步骤是一个 QListWidgetItem (步骤字典 + 预先生成的描述文字)，
+保存/加载都经过整份 JSON；生成的大协议 (几万步) 使列表卡顿、加载缓慢。
+
+    - StepTable: 紧凑的步骤表。每个步骤拆成四列定长数组: 指令 (下标)、目标设备 (下标)、一个数值参数
+      (duration / speed / flow_rate / voltage / current 中的第一个) 与 "形状" (下标)；
+      指令名、设备 id 与形状 (目标键、数值键、其余参数的 JSON) 各自去重保存，生成的协议通常只有几十种形状。
+      相邻两步交换 (上移/下移) 只交换四列中的两个元素，O(1)；步骤字典在需要时 (显示可见行、执行、保存) 才还原；
+    - 协议文件仍然是原来的 JSON 列表 (可手工编辑，旧版本也能读取)。保存时在旁边写一个二进制缓存文件
+      (<协议文件>.steps)，记录 JSON 文件的大小和修改时间；再次加载时若 JSON 未被改动，直接把数组读入内存，
+      不再解析 JSON；缓存缺失、过期或损坏时解析 JSON 并重新生成缓存。
+
+界面部分 (ProtocolListModel / ProtocolWidget) 在 control_ui.py 中，本模块不依赖 Qt，dry_run 命令行也用它读取协议文件。
+'''
+
+import os
+import sys
+import json
+import struct
+from array import array
+
+from log_pipeline import get_logger
+
+logger = get_logger(__name__)
+
+TARGET_KEYS = ('pump_id', 'device_id')
+VALUE_KEYS = ('duration', 'speed', 'flow_rate', 'voltage', 'current')
+SIDECAR_SUFFIX = ".steps"
+SIDECAR_MAGIC = b"MPSP"
+SIDECAR_VERSION = 1
+# magic, 版本, 字节序 (0 小端 / 1 大端), 步骤数, JSON 文件大小, JSON 文件修改时间 (ns), 字符串表长度
+_SIDECAR_HEADER = struct.Struct('<4sHBxIqqI')
+_COLUMN_TYPES = (('command', 'H'), ('target', 'H'), ('shape', 'I'), ('value', 'd'))
+
+
+class ProtocolError(ValueError):
+    """协议文件内容不合法。"""
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class StepTable:
+    """
+    紧凑的协议步骤表 (见模块说明)。
+
+    :param steps: 可选的初始步骤字典列表。
+    """
+    def __init__(self, steps=()):
+        self.commands, self.targets, self.shapes = [], [], []
+        self._command_index, self._target_index, self._shape_index = {}, {}, {}
+        self._shape_rest = []                 # 与 shapes 对应的其余参数字典 (解析后缓存)
+        for name, code in _COLUMN_TYPES: setattr(self, name, array(code))
+        self.extend(steps)
+
+    def __len__(self):
+        return len(self.command)
+
+    def _columns(self):
+        return self.command, self.target, self.shape, self.value
+
+    @staticmethod
+    def _intern(values, index, item):
+        i = index.get(item)
+        if i is None: i = index[item] = len(values); values.append(item)
+        return i
+
+    def _intern_shape(self, shape):
+        i = self._shape_index.get(shape)
+        if i is None:
+            i = self._shape_index[shape] = len(self.shapes); self.shapes.append(shape)
+            self._shape_rest.append(json.loads(shape[3]) if shape[3] else {})
+        return i
+
+    def _encode(self, step):
+        if not isinstance(step, dict): raise ProtocolError(f"协议步骤必须是字典，而不是 {type(step).__name__}: {step!r}")
+        rest = dict(step); command = rest.pop('command', None)
+        target_key = next((k for k in TARGET_KEYS if k in rest), None)
+        target = rest.pop(target_key) if target_key else None
+        value_key = next((k for k in VALUE_KEYS if _is_number(rest.get(k))), None)
+        value = rest.pop(value_key) if value_key else 0.0
+        try:
+            shape = (target_key, value_key, isinstance(value, int), json.dumps(rest, ensure_ascii=False) if rest else '')
+            return (self._intern(self.commands, self._command_index, command), self._intern(self.targets, self._target_index, target),
+                    self._intern_shape(shape), float(value))
+        except (TypeError, ValueError) as e:
+            raise ProtocolError(f"无法解析协议步骤 {step!r}: {e}") from e
+
+    # --- 编辑 ---
+    def append(self, step):
+        for column, item in zip(self._columns(), self._encode(step)): column.append(item)
+
+    def extend(self, steps):
+        for step in steps: self.append(step)
+
+    def insert(self, row, step):
+        for column, item in zip(self._columns(), self._encode(step)): column.insert(row, item)
+
+    def delete(self, start, end):
+        """删除 [start, end) 行。"""
+        for column in self._columns(): del column[start:end]
+
+    def swap(self, a, b):
+        for column in self._columns(): column[a], column[b] = column[b], column[a]
+
+    # --- 读取 ---
+    def step(self, row):
+        """还原第 row 步的步骤字典 (每次返回新字典)。"""
+        shape_index = self.shape[row]
+        target_key, value_key, is_int, _ = self.shapes[shape_index]
+        step = {'command': self.commands[self.command[row]]}
+        if target_key: step[target_key] = self.targets[self.target[row]]
+        if value_key:
+            value = self.value[row]; step[value_key] = int(value) if is_int else value
+        step.update(self._shape_rest[shape_index])
+        return step
+
+    def steps(self):
+        return [self.step(row) for row in range(len(self))]
+
+    # --- 二进制缓存 ---
+    def to_bytes(self, json_stat):
+        tables = json.dumps({'commands': self.commands, 'targets': self.targets, 'shapes': self.shapes}, ensure_ascii=False).encode('utf-8')
+        header = _SIDECAR_HEADER.pack(SIDECAR_MAGIC, SIDECAR_VERSION, sys.byteorder == 'big', len(self),
+                                      json_stat.st_size, json_stat.st_mtime_ns, len(tables))
+        return b''.join([header, tables] + [column.tobytes() for column in self._columns()])
+
+    @classmethod
+    def from_bytes(cls, data, json_stat):
+        """从缓存文件内容还原；缓存与 JSON 文件不匹配或格式不对时返回 None。"""
+        if len(data) < _SIDECAR_HEADER.size: return None
+        magic, version, big_endian, n, size, mtime_ns, tables_len = _SIDECAR_HEADER.unpack_from(data)
+        if (magic, version, big_endian) != (SIDECAR_MAGIC, SIDECAR_VERSION, sys.byteorder == 'big'): return None
+        if (size, mtime_ns) != (json_stat.st_size, json_stat.st_mtime_ns): return None
+        offset = _SIDECAR_HEADER.size
+        tables = json.loads(data[offset:offset + tables_len].decode('utf-8')); offset += tables_len
+        table = cls()
+        for command in tables['commands']: cls._intern(table.commands, table._command_index, command)
+        for target in tables['targets']: cls._intern(table.targets, table._target_index, target)
+        for shape in tables['shapes']: table._intern_shape(tuple(shape))
+        for name, code in _COLUMN_TYPES:
+            column = getattr(table, name); end = offset + n * column.itemsize
+            if end > len(data): return None
+            column.frombytes(data[offset:end]); offset = end
+        return table
+
+
+def sidecar_path(path):
+    return path + SIDECAR_SUFFIX
+
+
+def save_protocol(path, table):
+    """把步骤表写为 JSON 协议文件，并生成对应的二进制缓存 (缓存写入失败不影响保存)。"""
+    with open(path, 'w', encoding='utf-8') as f: json.dump(table.steps(), f, ensure_ascii=False, indent=4)
+    _write_sidecar(path, table)
+
+
+def _write_sidecar(path, table):
+    try:
+        tmp_path = sidecar_path(path) + ".tmp"
+        with open(tmp_path, 'wb') as f: f.write(table.to_bytes(os.stat(path)))
+        os.replace(tmp_path, sidecar_path(path))
+    except OSError as e:
+        logger.warning("无法写入协议缓存 %s: %s", sidecar_path(path), e)
+
+
+def load_protocol(path, write_cache=True):
+    """
+    读取协议文件为 StepTable：JSON 未改动时直接读取二进制缓存，否则解析 JSON 并重新生成缓存。
+
+    :param write_cache: False 时只读 (仍会使用已有的有效缓存)，不在协议文件旁写入 .steps 缓存。
+    :raises OSError: 文件无法读取。
+    :raises ProtocolError: 内容不是步骤字典的列表。
+    """
+    json_stat = os.stat(path)
+    try:
+        with open(sidecar_path(path), 'rb') as f: table = StepTable.from_bytes(f.read(), json_stat)
+        if table is not None:
+            logger.debug("协议 %s 从缓存加载 (%d 步)", path, len(table)); return table
+    except (OSError, ValueError, KeyError, TypeError, struct.error):
+        pass
+    try:
+        with open(path, 'r', encoding='utf-8') as f: steps = json.load(f)
+    except ValueError as e:
+        raise ProtocolError(f"协议文件不是有效的 JSON: {e}") from e
+    if not isinstance(steps, list): raise ProtocolError("协议文件应当是步骤列表。")
+    table = StepTable(steps)
+    if write_cache: _write_sidecar(path, table)
+    return table
@@ -0,0 +1,163 @@
+# file: run_browser.py (历史运行记录的内存映射访问)
+'''
+以内存映射方式打开控制器写下的历史运行记录 (status_codec 的记录文件)。
+
+记录文件由定长帧组成，因此可以直接映射为 NumPy 结构化数组：
+打开文件只读取文件头，与文件大小无关；按时间范围查询时用二分查找定位，
+只有真正被访问的页才会从磁盘读入。每次运行的统计量 (平均流量、累计体积、输出能量)
+都用向量化的 NumPy 运算计算。
+新记录中每台设备带有自己的采样时间 (t_ns，见 time_align.py)，曲线按设备的实际读取时间绘制，
+aligned() 可把不同设备的字段插值到同一时间网格上 (用于对比和导出)。
+
+界面部分 (RunBrowserWindow) 在 control_ui.py 中。
+'''
+
+import os
+import glob
+from datetime import datetime
+
+import numpy as np
+
+from status_codec import read_recording_header, SAMPLE_TIME_FIELD
+from status_batch import frame_dtype
+from time_align import align, common_grid
+
+DEFAULT_RECORD_DIR = "recordings"
+RECORDING_SUFFIX = ".mpsrec"
+
+
+def list_recordings(record_dir=DEFAULT_RECORD_DIR):
+    """按修改时间倒序列出记录文件。"""
+    paths = glob.glob(os.path.join(record_dir, f"*{RECORDING_SUFFIX}"))
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+class RunRecording:
+    """
+    一个以内存映射方式打开的运行记录。
+
+    :param path: 记录文件路径。
+    """
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, 'rb') as f:
+            self.schema, offset = read_recording_header(f)
+        self.dtype = frame_dtype(self.schema)
+        n_frames = (os.path.getsize(path) - offset) // self.dtype.itemsize
+        # 控制器仍在写入时文件末尾可能有半帧，这里只映射完整的帧
+        self.frames = np.memmap(path, dtype=self.dtype, mode='r', offset=offset, shape=(n_frames,)) if n_frames else np.empty(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def fields(self):
+        """可绘制的字段列表 [(device_id, field_name), ...]。"""
+        return [(dev_id, name) for dev_id, dev_fields in self.schema.devices for name, _ in dev_fields if name != SAMPLE_TIME_FIELD]
+
+    def sample_times(self, device_id, rows=None):
+        """
+        设备在各帧中的采样时间 (墙上时间，秒)；旧记录没有 t_ns 或设备离线时使用帧时间戳。
+
+        :param rows: 帧切片，默认全部帧。
+        """
+        rows = self.frames if rows is None else rows
+        column = f"{device_id}.{SAMPLE_TIME_FIELD}"
+        if self.schema.clock is None or column not in rows.dtype.names: return rows['timestamp']
+        return np.where(rows[f"{device_id}.online"], self.schema.clock.to_wall(rows[column].astype(np.float64)), rows['timestamp'])
+
+    @property
+    def start_time(self):
+        return float(self.frames['timestamp'][0]) if len(self) else 0.0
+
+    @property
+    def duration(self):
+        return float(self.frames['timestamp'][-1] - self.frames['timestamp'][0]) if len(self) > 1 else 0.0
+
+    def describe(self):
+        started = datetime.fromtimestamp(self.start_time).strftime('%Y-%m-%d %H:%M:%S') if len(self) else '-'
+        return f"{self.name} ({started}, {self.duration / 60:.1f} 分钟, {len(self)} 帧)"
+
+    def index_range(self, t0=None, t1=None):
+        """把相对运行开始的时间范围 (秒) 换算成帧下标范围；二分查找只访问少量页面。"""
+        timestamps = self.frames['timestamp']
+        lo = 0 if t0 is None else int(np.searchsorted(timestamps, self.start_time + t0, side='left'))
+        hi = len(self) if t1 is None else int(np.searchsorted(timestamps, self.start_time + t1, side='right'))
+        return lo, hi
+
+    def series(self, device_id, field, t0=None, t1=None, max_points=None):
+        """
+        读取一个字段在时间范围内的数据。
+
+        :param t0, t1: 相对运行开始的秒数，None 表示不限。
+        :param max_points: 点数上限；超出时按区间输出最小/最大值对，只读取可见范围的数据。
+        :return: (相对时间数组, 数值数组)
+        """
+        lo, hi = self.index_range(t0, t1)
+        rows = self.frames[lo:hi]
+        t = self.sample_times(device_id, rows) - self.start_time
+        values = np.asarray(rows[f"{device_id}.{field}"], dtype=np.float64)
+        if max_points and len(t) > max_points:
+            step = int(np.ceil(2 * len(t) / max_points))
+            n = len(t) // step * step
+            blocks = values[:n].reshape(-1, step)
+            t = np.repeat(t[:n:step], 2)
+            values = np.column_stack((blocks.min(axis=1), blocks.max(axis=1))).ravel()
+        return t, values
+
+    def aligned(self, pairs, step, t0=None, t1=None, method='linear', max_gap=None):
+        """
+        把若干 (设备, 字段) 按各自的采样时间插值到同一个等间隔网格上。
+
+        :param step: 网格间隔 (秒)。
+        :return: (相对运行开始的网格时间数组, (len(pairs), len(grid)) 数组)，设备离线处为 NaN。
+        """
+        lo, hi = self.index_range(t0, t1)
+        rows = self.frames[lo:hi]
+        if not len(rows): return np.empty(0), np.empty((len(pairs), 0))
+        series = []
+        for dev_id, field in pairs:
+            online = rows[f"{dev_id}.online"]
+            series.append((self.sample_times(dev_id, rows), np.where(online, rows[f"{dev_id}.{field}"], np.nan)))
+        start = max(t[0] for t, _ in series); stop = min(t[-1] for t, _ in series)
+        grid = common_grid(start, stop, step) if stop >= start else np.empty(0)
+        return grid - self.start_time, align(series, grid, method, max_gap)
+
+    def summary(self, tubing_ml_per_rev=None):
+        """
+        计算整次运行的统计量。
+
+        :param tubing_ml_per_rev: 可选，{device_id: 每转体积(ml)}，用于由转速估算蠕动泵的体积。
+        :return: {'duration_s', 'frames', 'pumps': {id: {'mean_flow_ml_min', 'volume_ml'}},
+                  'channels': {'ch1': {'energy_j', 'charge_c'}, ...}}
+        """
+        tubing_ml_per_rev = tubing_ml_per_rev or {}
+        result = {'duration_s': self.duration, 'frames': len(self), 'pumps': {}, 'channels': {}}
+        if len(self) < 2: return result
+        t = self.frames['timestamp']
+        dt = np.diff(t)
+        for dev_id, dev_fields in self.schema.devices:
+            names = {name for name, _ in dev_fields}
+            online = self.frames[f"{dev_id}.online"]
+            if 'flow_rate_ml_min' in names:
+                flow = np.where(online, self.frames[f"{dev_id}.flow_rate_ml_min"], 0.0)
+                if 'speed_rpm' in names and dev_id in tubing_ml_per_rev:
+                    flow = np.maximum(flow, np.where(online, self.frames[f"{dev_id}.speed_rpm"], 0.0) * tubing_ml_per_rev[dev_id])
+                volume = float(np.sum((flow[1:] + flow[:-1]) * 0.5 * dt) / 60.0)
+                mean_flow = float(np.sum(flow[1:] * dt) / np.sum(dt)) if np.sum(dt) > 0 else float(flow.mean())
+                result['pumps'][dev_id] = {'mean_flow_ml_min': mean_flow, 'volume_ml': volume}
+            for ch in (1, 2, 3, 4):
+                if f"ch{ch}_voltage" not in names or f"ch{ch}_current" not in names: continue
+                v = np.where(online, self.frames[f"{dev_id}.ch{ch}_voltage"], 0.0)
+                i = np.where(online, self.frames[f"{dev_id}.ch{ch}_current"], 0.0)
+                power = v * i
+                result['channels'][f"{dev_id}.ch{ch}"] = {
+                    'energy_j': float(np.sum((power[1:] + power[:-1]) * 0.5 * dt)),
+                    'charge_c': float(np.sum((i[1:] + i[:-1]) * 0.5 * dt)),
+                }
+        return result
+
+    def close(self):
+        # 释放对映射的引用即可；仍被曲线持有的切片会在其释放后自动解除映射
+        self.frames = np.empty(0, dtype=self.dtype)
@@ -0,0 +1,147 @@
+# file: sample_store.py (全速率采样存储)
+'''
+UI 侧的列式采样存储。
+
+控制器每个轮询周期发布的快照都会完整写入这里 (不再每 30 秒才记录一次)，
+显示和导出在查询时各自选择重采样方式:
+    'raw'     原始数据
+    'mean'    每个时间桶取平均
+    'min'     每个时间桶取最小值
+    'max'     每个时间桶取最大值
+    'minmax'  每个时间桶输出最小值和最大值两个点 (绘图时不会抹掉压力尖峰、电流突变)
+    'last'    每个时间桶取最后一个值
+
+数据保存在预分配的 NumPy 数组中 (时间 float64，数值 float32)，容量有上限；
+写满后一次性丢弃最旧的 10%，均摊到每次追加仍是 O(1)，内存占用恒定。
+'''
+
+import numpy as np
+
+DEFAULT_CAPACITY = 3 * 24 * 3600       # 1 Hz 轮询下约保存 3 天
+RESAMPLE_METHODS = ('raw', 'mean', 'min', 'max', 'minmax', 'last')
+
+
+class SampleStore:
+    """
+    定宽列式采样存储。
+
+    :param columns: 数值列名列表 (不含时间列)。
+    :param capacity: 最多保存的样本数。
+    """
+    def __init__(self, columns, capacity=DEFAULT_CAPACITY):
+        self.columns = list(columns)
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        self.capacity = capacity
+        self._time = np.empty(capacity, dtype=np.float64)
+        self._data = np.empty((len(self.columns), capacity), dtype=np.float32)
+        self._count = 0
+        self.discarded = 0
+        self.revision = 0              # 每次写入/清空加一，绘图层据此跳过没有新数据的曲线
+
+    def __len__(self):
+        return self._count
+
+    def append(self, t, values):
+        """
+        追加一个样本。
+
+        :param t: 样本时间 (秒)，需单调不减。
+        :param values: 与 columns 顺序一致的数值序列。
+        """
+        if self._count == self.capacity: self._discard_oldest(max(1, self.capacity // 10))
+        self._time[self._count] = t
+        self._data[:, self._count] = values
+        self._count += 1
+        self.revision += 1
+
+    def extend(self, t, values):
+        """
+        批量追加样本。
+
+        :param t: (n,) 样本时间，需单调不减。
+        :param values: (len(columns), n) 数值数组，行顺序与 columns 一致。
+        """
+        n = len(t)
+        if n == 0: return
+        if n > self.capacity:
+            self.discarded += n - self.capacity; t = t[-self.capacity:]; values = values[:, -self.capacity:]; n = self.capacity
+        if self._count + n > self.capacity: self._discard_oldest(min(self._count, max(self._count + n - self.capacity, self.capacity // 10)))
+        self._time[self._count:self._count + n] = t
+        self._data[:, self._count:self._count + n] = values
+        self._count += n
+        self.revision += 1
+
+    def _discard_oldest(self, n):
+        keep = self._count - n
+        self._time[:keep] = self._time[n:self._count]
+        self._data[:, :keep] = self._data[:, n:self._count]
+        self._count = keep
+        self.discarded += n
+
+    def clear(self):
+        self._count = 0
+        self.revision += 1
+
+    @property
+    def time(self):
+        return self._time[:self._count]
+
+    def column(self, name):
+        return self._data[self._index[name], :self._count]
+
+    def time_range(self):
+        if not self._count: return None
+        return float(self._time[0]), float(self._time[self._count - 1])
+
+    def query(self, t0=None, t1=None, bucket=None, method='raw', columns=None, max_points=None):
+        """
+        按时间范围查询并重采样。
+
+        :param t0, t1: 时间范围 (含端点)，None 表示不限。
+        :param bucket: 重采样时间桶宽度 (秒)；None 或 <=0 时返回原始数据。
+        :param method: 重采样方式，见 RESAMPLE_METHODS。
+        :param columns: 要返回的列，默认全部。
+        :param max_points: 若给出且未指定 bucket，则自动选择桶宽使输出点数不超过该值。
+        :return: (times, {column: values})，均为 NumPy 数组。
+        """
+        if method not in RESAMPLE_METHODS:
+            raise ValueError(f"未知的重采样方式: {method}")
+        columns = self.columns if columns is None else list(columns)
+        rows = [self._index[name] for name in columns]
+        times = self.time
+        lo = 0 if t0 is None else int(np.searchsorted(times, t0, side='left'))
+        hi = self._count if t1 is None else int(np.searchsorted(times, t1, side='right'))
+        t = times[lo:hi]
+        data = self._data[rows, lo:hi]
+        if bucket is None and max_points and len(t) > max_points and len(t) > 1:
+            per_bucket = 2 if method == 'minmax' else 1
+            bucket = (t[-1] - t[0]) * per_bucket / max_points
+        if method == 'raw' or not bucket or bucket <= 0 or len(t) == 0:
+            return t.copy(), {name: data[i].copy() for i, name in enumerate(columns)}
+        return self._resample(t, data, columns, bucket, method)
+
+    @staticmethod
+    def _resample(t, data, columns, bucket, method):
+        bucket_ids = np.floor((t - t[0]) / bucket).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, bucket_ids[1:] != bucket_ids[:-1]])
+        ends = np.r_[starts[1:], len(t)]
+        bucket_t = t[0] + bucket_ids[starts] * bucket
+        if method == 'mean':
+            values = np.add.reduceat(data.astype(np.float64), starts, axis=1) / (ends - starts)
+        elif method == 'min':
+            values = np.minimum.reduceat(data, starts, axis=1)
+        elif method == 'max':
+            values = np.maximum.reduceat(data, starts, axis=1)
+        elif method == 'last':
+            values = data[:, ends - 1]; bucket_t = t[ends - 1]
+        else:   # minmax: 每个桶交替输出最小值和最大值
+            lows = np.minimum.reduceat(data, starts, axis=1); highs = np.maximum.reduceat(data, starts, axis=1)
+            values = np.empty((data.shape[0], 2 * len(starts)), dtype=data.dtype)
+            values[:, 0::2] = lows; values[:, 1::2] = highs
+            bucket_t = np.repeat(bucket_t, 2)
+        return bucket_t, {name: values[i] for i, name in enumerate(columns)}
+
+    def to_dict(self, bucket=None, method='raw'):
+        """导出为 {'time': [...], column: [...]} 形式，供 DataFrame 使用。"""
+        t, values = self.query(bucket=bucket, method=method)
+        return {'time': t, **values}
@@ -0,0 +1,151 @@
+# file: simulated_devices.py (模拟设备驱动)
+'''
+不需要硬件的模拟驱动，接口与真实驱动一致，由 driver_registry 在模拟模式下创建。
+
+    - latency: 每次通讯的模拟耗时 (秒)，用于估算总线占用和控制循环时序；默认 0。
+    - 读数带少量噪声，电源电流按固定负载电阻 (load_ohm) 计算并受限流值约束。
+    - 泵的状态与真实驱动一样带 timeouts / crc_errors 通讯错误计数 (模拟链路上始终为 0)。
+'''
+
+import time
+import random
+import threading
+
+from base_pump import BasePump
+from log_pipeline import get_logger
+
+logger = get_logger(__name__)
+
+
+class _SimulatedLink:
+    """模拟一条通讯链路：每次收发占用 latency 秒，并统计通讯次数。"""
+    def __init__(self, latency):
+        self.latency = latency
+        self.transactions = 0
+        self.timeouts = 0
+        self.crc_errors = 0
+        self._lock = threading.Lock()
+
+    def as_status(self):
+        return {'timeouts': self.timeouts, 'crc_errors': self.crc_errors}
+
+    def transact(self, count=1):
+        with self._lock:
+            self.transactions += count
+        if self.latency > 0: time.sleep(self.latency * count)
+
+
+class SimulatedPeristalticPump(BasePump):
+    """模拟的蠕动泵：speed 为转速 (RPM)。"""
+    def __init__(self, port, unit_address=192, baudrate=9600, latency=0.0):
+        super().__init__(port, unit_address, baudrate)
+        self.link = _SimulatedLink(latency)
+        self.is_running = False
+        self.speed = 0.0
+        self.direction = 'forward'
+
+    def connect(self):
+        self.link.transact(); self.is_connected = True
+        return True
+
+    def disconnect(self):
+        self.is_connected = False
+
+    def start(self, speed=100.0, direction='forward'):
+        if not self.is_connected: return False
+        self.link.transact(3)
+        self.speed = float(speed); self.direction = direction; self.is_running = True
+        return True
+
+    def stop(self):
+        self.link.transact(); self.is_running = False
+        return True
+
+    def set_parameters(self, speed=None, direction=None, **kwargs):
+        if not self.is_connected: return False
+        if direction is not None: self.link.transact(); self.direction = direction
+        if speed is not None: self.link.transact(); self.speed = float(speed)
+        return True
+
+    def get_status(self):
+        self.link.transact()
+        speed = self.speed * (1 + random.gauss(0, 0.002)) if self.is_running else 0.0
+        return {"is_running": self.is_running, "speed_rpm": speed, "flow_rate_ml_min": 0.0, **self.link.as_status()}
+
+
+class SimulatedPlungerPump(BasePump):
+    """模拟的柱塞泵：压力随流量线性上升。"""
+    PRESSURE_PER_ML_MIN = 0.08      # MPa / (ml/min)
+
+    def __init__(self, port, unit_address=55, baudrate=9600, latency=0.0):
+        super().__init__(port, unit_address, baudrate)
+        self.link = _SimulatedLink(latency)
+        self.is_running = False
+        self.flow_rate = 0.0
+
+    def connect(self):
+        self.link.transact(); self.is_connected = True
+        return True
+
+    def disconnect(self):
+        self.is_connected = False
+
+    def start(self, flow_rate=1.0, **kwargs):
+        if not self.is_connected: return False
+        self.set_parameters(flow_rate=flow_rate)
+        self.link.transact(); self.is_running = True
+        return True
+
+    def stop(self):
+        self.link.transact(); self.is_running = False
+        return True
+
+    def set_parameters(self, flow_rate=None, **kwargs):
+        if not self.is_connected or flow_rate is None: return False
+        self.link.transact(); self.flow_rate = float(flow_rate)
+        return True
+
+    def get_status(self):
+        self.link.transact(3)
+        flow = self.flow_rate if self.is_running else 0.0
+        return {"is_running": self.is_running, "pressure_mpa": max(0.0, flow * self.PRESSURE_PER_ML_MIN + random.gauss(0, 0.002)),
+                "flow_rate_ml_min": flow, "speed_rpm": 0.0, **self.link.as_status()}
+
+
+class SimulatedPowerSupply:
+    """模拟的两通道直流电源，负载为固定电阻。"""
+    def __init__(self, port, baudrate=9600, latency=0.0, load_ohm=10.0):
+        self.port = port
+        self.link = _SimulatedLink(latency)
+        self.is_connected = False
+        self.num_channels = 2
+        self.load_ohm = load_ohm
+        self.output_on = False
+        self.voltage = {1: 0.0, 2: 0.0}
+        self.current_limit = {1: 3.0, 2: 3.0}
+        logger.info("初始化模拟设备: SimulatedPowerSupply on %s", port)
+
+    def connect(self):
+        self.link.transact(); self.is_connected = True
+        return True
+
+    def disconnect(self):
+        self.output_on = False; self.is_connected = False
+
+    def set_voltage(self, channel, voltage):
+        if 1 <= channel <= self.num_channels: self.link.transact(); self.voltage[channel] = float(voltage)
+
+    def set_current(self, channel, current):
+        if 1 <= channel <= self.num_channels: self.link.transact(); self.current_limit[channel] = float(current)
+
+    def set_output(self, enable):
+        self.link.transact(); self.output_on = bool(enable)
+
+    def get_status(self):
+        self.link.transact(2 * self.num_channels)
+        status = {'output_on': self.output_on}
+        for ch in range(1, self.num_channels + 1):
+            voltage = self.voltage[ch] if self.output_on else 0.0
+            status[f'ch{ch}_voltage'] = voltage
+            status[f'ch{ch}_current'] = min(voltage / self.load_ohm, self.current_limit[ch])
+        return status
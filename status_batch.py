@@ -0,0 +1,195 @@
+# file: status_batch.py (状态快照的批量向量化解码)
+'''
+UI 每个刷新周期从状态通道一次取走一批快照，这里把整批快照解码为 设备 × 字段 × 时间 的 NumPy 数组，
+之后的记录 (SampleStore.extend) 和派生量 (通道是否输出、泵的显示值、运行状态) 都是整批的向量运算，
+不再对每条快照、每台设备、每个字段做字典查找。
+
+二进制帧 (status_codec) 定长，整批拼接后用 np.frombuffer 按结构化 dtype 一次解析，
+开销只与 设备数 × 字段数 的列数有关，与快照条数基本无关；远程节点转发的字典快照走逐条填充的兼容路径。
+'''
+
+import numpy as np
+
+from status_codec import StatusDecoder, KIND_SNAPSHOT
+
+_NUMPY_CODES = {'?': '?', 'd': '<f8', 'f': '<f4', 'i': '<i4', 'I': '<u4', 'q': '<i8', 'Q': '<u8', 'h': '<i2', 'H': '<u2', 'B': 'u1'}
+
+
+def frame_dtype(schema):
+    """由 schema 构造与二进制帧逐字节对应的 NumPy 结构化 dtype (无对齐填充)。"""
+    fields = [('magic', 'S2'), ('version', 'u1'), ('kind', 'u1'), ('schema_id', '<u4'),
+              ('timestamp', '<f8'), ('loggable', '?')]
+    for dev_id, dev_fields in schema.devices:
+        fields.append((f"{dev_id}.online", '?'))
+        fields.extend((f"{dev_id}.{name}", _NUMPY_CODES[code]) for name, code in dev_fields)
+    dtype = np.dtype(fields)
+    if dtype.itemsize != schema.frame_size:
+        raise ValueError("schema 中包含无法映射的字段格式。")
+    return dtype
+
+
+class BatchLayout:
+    """
+    一批快照的数组布局：设备轴与字段轴 (所有设备字段名的并集，按首次出现的顺序)。
+
+    :param devices: [(device_id, [field_name, ...]), ...]
+    """
+    def __init__(self, devices):
+        self.devices = [(dev_id, tuple(names)) for dev_id, names in devices]
+        self.device_ids = tuple(dev_id for dev_id, _ in self.devices)
+        self.field_names = tuple(dict.fromkeys(name for _, names in self.devices for name in names))
+        self._device_index = {dev_id: i for i, dev_id in enumerate(self.device_ids)}
+        self._field_index = {name: i for i, name in enumerate(self.field_names)}
+        self._gather_cache = {}
+
+    def gather_index(self, pairs):
+        """
+        把 [(device_id, field), ...] 转换为花式索引数组，结果按 pairs 缓存 (布局不变时每组只计算一次)。
+
+        :return: (设备下标, 字段下标, 有效标志)，不存在的设备/字段有效标志为 False。
+        """
+        key = tuple(pairs)
+        cached = self._gather_cache.get(key)
+        if cached is None:
+            dev = np.array([self._device_index.get(d, -1) for d, _ in key], dtype=np.intp)
+            fld = np.array([self._field_index.get(f, -1) for _, f in key], dtype=np.intp)
+            valid = (dev >= 0) & (fld >= 0)
+            cached = self._gather_cache[key] = (np.where(valid, dev, 0), np.where(valid, fld, 0), valid)
+        return cached
+
+    def device_index(self, device_ids):
+        idx = np.array([self._device_index.get(d, -1) for d in device_ids], dtype=np.intp)
+        return np.where(idx >= 0, idx, 0), idx >= 0
+
+
+class StatusBatch:
+    """
+    一批状态快照。
+
+    :param timestamps: (n,) 快照时间戳。
+    :param loggable: (n,) 是否为需要记录的快照。
+    :param online: (设备数, n) 设备在该快照中是否在线。
+    :param values: (设备数, 字段数, n) float64；设备离线或没有该字段时为 NaN。
+    """
+    def __init__(self, layout, timestamps, loggable, online, values):
+        self.layout = layout
+        self.timestamps = timestamps
+        self.loggable = loggable
+        self.online = online
+        self.values = values
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def select(self, pairs, default=0.0, mask=None):
+        """
+        取出若干 (设备, 字段) 的时间序列。
+
+        :param mask: 可选的 (n,) 布尔数组，只取其中为 True 的快照 (例如 self.loggable)。
+        :return: (len(pairs), n) 数组，缺失值替换为 default。
+        """
+        dev, fld, valid = self.layout.gather_index(pairs)
+        out = self.values[dev, fld, :] if mask is None else self.values[dev, fld, :][:, mask]
+        return np.where(valid[:, None] & ~np.isnan(out), out, default)
+
+    def latest(self, pairs, default=0.0):
+        """每个 (设备, 字段) 在最新一条快照中的值，形状 (len(pairs),)。"""
+        dev, fld, valid = self.layout.gather_index(pairs)
+        out = self.values[dev, fld, -1]
+        return np.where(valid & ~np.isnan(out), out, default)
+
+    def online_mask(self, device_id):
+        """(n,) 布尔数组：设备在每条快照中是否在线；批次中没有该设备时全为 False。"""
+        dev, valid = self.layout.device_index([device_id])
+        return self.online[dev[0]] if valid[0] else np.zeros(len(self), dtype=bool)
+
+    def latest_online(self, device_ids):
+        """每台设备在最新一条快照中是否在线。"""
+        dev, valid = self.layout.device_index(device_ids)
+        return valid & self.online[dev, -1]
+
+
+class StatusBatchDecoder:
+    """
+    解码 StatusChannel.drain() 的结果：事件 (schema 帧、error/info 字典) 由 decode_events 逐条交给 StatusDecoder，
+    快照由 decode_batch 整批解码为 StatusBatch (没有可用快照时返回 None)。
+    """
+    def __init__(self):
+        self.decoder = StatusDecoder()
+        self.discarded = 0            # 因 schema 不匹配而丢弃的快照数
+        self._schema_id = None
+        self._dtype = None
+        self._layout = None
+
+    def decode_events(self, events):
+        """返回解码后的事件字典列表 (schema 帧只更新布局，不出现在结果中)。"""
+        decoded = []
+        for event in events:
+            event = self.decoder.decode(event)
+            if event is not None: decoded.append(event)
+        return decoded
+
+    def decode_batch(self, snapshots):
+        if not snapshots: return None
+        frames = [s for s in snapshots if isinstance(s, (bytes, bytearray, memoryview))]
+        if len(frames) == len(snapshots): return self._decode_frames(frames)
+        if not frames: return self._decode_dicts(snapshots)
+        # 混合消息 (实际不会出现)：统一退回到逐条解码
+        return self._decode_dicts([self.decoder.decode(s) for s in snapshots])
+
+    def _refresh_layout(self):
+        schema = self.decoder.schema
+        if schema is not None and schema.schema_id != self._schema_id:
+            self._schema_id = schema.schema_id
+            self._dtype = frame_dtype(schema)
+            self._layout = BatchLayout([(dev_id, [name for name, _ in fields]) for dev_id, fields in schema.devices])
+
+    def _decode_frames(self, frames):
+        # schema 帧走事件队列，可能与本批快照同时到达：先处理事件再解码快照即可拿到最新布局
+        self._refresh_layout()
+        if self._dtype is None:
+            self.discarded += len(frames); return None
+        size = self._dtype.itemsize
+        good = [f for f in frames if len(f) == size and f[3] == KIND_SNAPSHOT]
+        if not good:
+            self.discarded += len(frames); return None
+        records = np.frombuffer(b''.join(good), dtype=self._dtype)
+        keep = records['schema_id'] == self._schema_id
+        if not keep.all(): records = records[keep]
+        self.discarded += len(frames) - len(records)
+        if not len(records): return None
+        layout = self._layout; n = len(records)
+        online = np.empty((len(layout.device_ids), n), dtype=bool)
+        values = np.full((len(layout.device_ids), len(layout.field_names), n), np.nan)
+        field_index = layout._field_index
+        for d, (dev_id, names) in enumerate(layout.devices):
+            online[d] = records[f"{dev_id}.online"]
+            for name in names:
+                values[d, field_index[name]] = records[f"{dev_id}.{name}"]
+            values[d][:, ~online[d]] = np.nan
+        return StatusBatch(layout, records['timestamp'].astype(np.float64), records['loggable'].copy(), online, values)
+
+    @staticmethod
+    def _decode_dicts(snapshots):
+        snapshots = [s for s in snapshots if s]
+        if not snapshots: return None
+        devices = {}
+        for snapshot in snapshots:
+            for dev_id, status in snapshot.get('devices', {}).items():
+                names = devices.setdefault(dev_id, {})
+                for name, value in status.items():
+                    if isinstance(value, (bool, int, float)): names[name] = None
+        layout = BatchLayout([(dev_id, list(names)) for dev_id, names in devices.items()])
+        n = len(snapshots)
+        online = np.zeros((len(layout.device_ids), n), dtype=bool)
+        values = np.full((len(layout.device_ids), len(layout.field_names), n), np.nan)
+        dev_index = layout._device_index; field_index = layout._field_index
+        for i, snapshot in enumerate(snapshots):
+            for dev_id, status in snapshot.get('devices', {}).items():
+                d = dev_index[dev_id]; online[d, i] = True
+                for name, value in status.items():
+                    f = field_index.get(name)
+                    if f is not None: values[d, f, i] = value
+        timestamps = np.array([s.get('timestamp', 0.0) for s in snapshots], dtype=np.float64)
+        loggable = np.array([bool(s.get('loggable', False)) for s in snapshots], dtype=bool)
+        return StatusBatch(layout, timestamps, loggable, online, values)
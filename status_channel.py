@@ -0,0 +1,83 @@
+# file: status_channel.py (最新值状态通道)
+'''
+控制器 -> UI 的有界状态通道，用来替代无界的 multiprocessing.Queue。
+
+- 状态快照 (字典或 status_codec 的快照帧) 进入容量固定的历史队列。UI 卡住时 (模态对话框、
+  长时间导出) 控制器不会无限堆积，而是丢弃最旧的快照并计数，内存占用恒定；
+- 事件消息 (error/info 字典、schema 帧) 走单独的队列，永不丢弃；
+- UI 每次调用 drain() 一次性取走全部事件和至多 history 条快照，卡顿恢复后立即追上最新状态。
+
+put() 与 multiprocessing.Queue.put 同名，控制器代码无需区分两种通道。
+'''
+
+import multiprocessing
+from queue import Empty, Full
+
+from status_codec import HEADER, KIND_SNAPSHOT
+
+DEFAULT_HISTORY = 64
+
+
+def is_snapshot(message):
+    """判断消息是否为可丢弃的状态快照。"""
+    if isinstance(message, (bytes, bytearray)):
+        return len(message) >= HEADER.size and message[3] == KIND_SNAPSHOT
+    return isinstance(message, dict) and 'devices' in message
+
+
+class StatusChannel:
+    """
+    跨进程的最新值状态通道。
+
+    :param history: 最多保留的快照条数 (最新值 + 用于日志记录的有限历史)。
+    """
+    def __init__(self, history=DEFAULT_HISTORY):
+        self.history = history
+        self._snapshots = multiprocessing.Queue(maxsize=history)
+        self._events = multiprocessing.Queue()
+        self._published = multiprocessing.Value('Q', 0)
+        self._dropped = multiprocessing.Value('Q', 0)
+
+    # --- 生产者 (控制器进程) ---
+    def put(self, message):
+        if not is_snapshot(message):
+            self._events.put(message); return
+        with self._published.get_lock(): self._published.value += 1
+        while True:
+            try:
+                self._snapshots.put_nowait(message); return
+            except Full:
+                try:
+                    self._snapshots.get_nowait()
+                    with self._dropped.get_lock(): self._dropped.value += 1
+                except Empty:
+                    pass
+
+    # --- 消费者 (UI 进程) ---
+    def drain(self):
+        """
+        取走当前所有待处理消息。
+
+        :return: (events, snapshots)，均按发布顺序排列；snapshots[-1] 为最新快照。
+        """
+        events = []; snapshots = []
+        try:
+            while True: events.append(self._events.get_nowait())
+        except Empty:
+            pass
+        try:
+            for _ in range(self.history): snapshots.append(self._snapshots.get_nowait())
+        except Empty:
+            pass
+        return events, snapshots
+
+    @property
+    def published(self):
+        return self._published.value
+
+    @property
+    def dropped(self):
+        return self._dropped.value
+
+    def stats_text(self):
+        return f"状态快照: 已发布 {self.published} / 因界面繁忙丢弃 {self.dropped}"
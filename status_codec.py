@@ -0,0 +1,263 @@
+# file: status_codec.py (紧凑二进制状态格式)
+'''
+控制器 -> UI / 记录文件 的紧凑二进制状态格式。
+
+旧格式每条状态都是嵌套字典，'ch1_voltage'、'flow_rate_ml_min' 等字符串键在每条消息中重复出现。
+新格式把字段布局 (schema) 在每个会话开始时只发送一次，之后每条快照都是一个定长的二进制帧：
+
+    帧头:   magic(2s) | 格式版本(B) | 帧类型(B) | schema_id(I)
+    快照体: timestamp(d) | loggable(?) | [设备1: 在线标志(?) + 字段...] | [设备2: ...] | ...
+
+整帧由一个预编译的 struct.Struct 一次打包/解包，速度远快于 pickle 一个嵌套字典。
+记录文件使用完全相同的帧：文件头 + schema + 连续的定长帧，便于顺序回放或内存映射。
+
+每台设备的字段末尾都有 t_ns：该设备本次读取的 time.monotonic_ns() (见 time_align.py)；
+schema 中的 clock 是会话开始时配对的 [墙上时间, 单调时间]，用来把 t_ns 换算为墙上时间。
+'''
+
+import json
+import time
+import zlib
+import struct
+from typing import NamedTuple
+from operator import itemgetter
+
+import driver_registry
+
+FORMAT_VERSION = 1
+MAGIC = b'MS'
+KIND_SCHEMA = 1
+KIND_SNAPSHOT = 2
+
+HEADER = struct.Struct('<2sBBI')
+RECORDING_MAGIC = b'MPSREC'
+RECORDING_HEADER = struct.Struct('<6sBI')   # magic | 格式版本 | schema JSON 长度
+_INT_CODES = frozenset('bBhHiIlLqQ')
+SAMPLE_TIME_FIELD = 't_ns'
+
+
+class ClockAnchor(NamedTuple):
+    """一对同时读取的 墙上时间 (秒) 与 单调时间 (纳秒)。"""
+    wall: float
+    mono_ns: int
+
+    @classmethod
+    def now(cls):
+        # 两次单调时钟读取夹住墙上时钟，取中点，配对误差不超过这两次读取的间隔
+        m0 = time.monotonic_ns(); wall = time.time(); m1 = time.monotonic_ns()
+        return cls(wall, (m0 + m1) // 2)
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(float(data[0]), int(data[1])) if data else None
+
+    def to_json(self):
+        return [self.wall, self.mono_ns]
+
+    def to_wall(self, t_ns):
+        """单调时间 (纳秒，标量或数组) 换算为墙上时间 (秒)。"""
+        # 数组按元素运算 (控制器进程不导入 NumPy，这里也不需要)
+        return self.wall + (t_ns - self.mono_ns) / 1e9
+
+    def wall_now(self):
+        """按单调时钟推算的当前墙上时间 (不受系统时间调整影响)。"""
+        return self.to_wall(time.monotonic_ns())
+
+    def shifted(self, offset):
+        """墙上时间整体平移 offset 秒 (例如远程节点的时钟偏差校正)。"""
+        return ClockAnchor(self.wall + offset, self.mono_ns)
+
+
+class StatusSchema:
+    """
+    一个会话内固定不变的状态帧布局。
+
+    :param devices: [(device_id, [(field_name, struct_code), ...]), ...]，顺序即帧内顺序。
+    :param clock: 会话的 ClockAnchor (可选)。
+    """
+    def __init__(self, devices, clock=None):
+        self.devices = [(dev_id, [(name, code) for name, code in fields]) for dev_id, fields in devices if fields]
+        self.clock = clock
+        payload = {'version': FORMAT_VERSION, 'devices': self.devices}
+        if clock is not None: payload['clock'] = clock.to_json()
+        self.json = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.schema_id = zlib.crc32(self.json)
+        body_format = 'd?' + ''.join('?' + ''.join(code for _, code in fields) for _, fields in self.devices)
+        self.frame = struct.Struct('<2sBBI' + body_format)
+
+    @classmethod
+    def from_device_configs(cls, device_configs, clock=None):
+        """根据设备配置中的 type 构建 schema，字段来自 driver_registry 中登记的状态字段 (另加采样时间 t_ns)；未知类型的设备不进入二进制帧。"""
+        devices = []
+        for config in device_configs:
+            fields = driver_registry.status_fields(config)
+            if fields: devices.append((config['id'], fields + [(SAMPLE_TIME_FIELD, 'q')]))
+        return cls(devices, clock)
+
+    @classmethod
+    def infer(cls, status):
+        """根据一条字典格式的状态推断 schema (布尔值编码为 '?'，数值编码为 'd')。"""
+        devices = []
+        for dev_id, dev_status in status.get('devices', {}).items():
+            fields = [(name, '?' if isinstance(value, bool) else 'q' if name == SAMPLE_TIME_FIELD else 'd')
+                      for name, value in dev_status.items() if isinstance(value, (bool, int, float))]
+            devices.append((dev_id, fields))
+        return cls(devices, ClockAnchor.from_json(status.get('clock')))
+
+    @classmethod
+    def from_json(cls, data):
+        payload = json.loads(data.decode('utf-8'))
+        if payload.get('version') != FORMAT_VERSION:
+            raise ValueError(f"不支持的状态格式版本: {payload.get('version')} (当前版本 {FORMAT_VERSION})")
+        return cls(payload['devices'], ClockAnchor.from_json(payload.get('clock')))
+
+    @property
+    def frame_size(self):
+        return self.frame.size
+
+
+class StatusEncoder:
+    """把字典格式的状态快照编码为二进制帧。"""
+    def __init__(self, schema):
+        self.schema = schema
+        self._pack = schema.frame.pack
+        self._prefix = (MAGIC, FORMAT_VERSION, KIND_SNAPSHOT, schema.schema_id)
+        # 每个设备预先生成一个 itemgetter，字段齐全时由 C 实现一次取出全部值
+        self._plan = [(dev_id, itemgetter(*[name for name, _ in fields]) if len(fields) > 1 else (lambda d, n=fields[0][0]: (d[n],)),
+                       tuple(name for name, _ in fields), tuple(False if code == '?' else 0 if code in _INT_CODES else 0.0 for _, code in fields))
+                      for dev_id, fields in schema.devices]
+
+    def encode_schema(self):
+        """会话开始时发送一次的 schema 帧。"""
+        return HEADER.pack(MAGIC, FORMAT_VERSION, KIND_SCHEMA, self.schema.schema_id) + self.schema.json
+
+    def encode(self, status):
+        values = [status.get('timestamp', 0.0), status.get('loggable', False)]
+        devices = status.get('devices', {})
+        for dev_id, getter, names, defaults in self._plan:
+            dev_status = devices.get(dev_id)
+            if dev_status is None:
+                values.append(False); values.extend(defaults); continue
+            values.append(True)
+            try:
+                values.extend(getter(dev_status))
+            except KeyError:
+                values.extend([dev_status.get(name, default) for name, default in zip(names, defaults)])
+        try:
+            return self._pack(*self._prefix, *values)
+        except struct.error:
+            # 驱动偶尔返回 None 等非数值，退回逐项替换为默认值
+            return self._pack(*self._prefix, *self._sanitize(values))
+
+    def _sanitize(self, values):
+        clean = values[:2]; pos = 2
+        for _, _, _, defaults in self._plan:
+            clean.append(values[pos]); pos += 1
+            for default in defaults:
+                value = values[pos]; pos += 1
+                clean.append(value if isinstance(value, (bool, int, float)) else default)
+        return clean
+
+
+class StatusDecoder:
+    """
+    解码二进制帧。收到 schema 帧后更新布局，之后的快照帧按该布局还原为字典。
+    字典消息 (error/info 等) 原样返回，因此 UI 可以用同一个入口处理两种消息。
+    """
+    def __init__(self, schema=None):
+        self.schema = None
+        if schema is not None: self.set_schema(schema)
+
+    def set_schema(self, schema):
+        self.schema = schema
+        self._unpack = schema.frame.unpack
+        # 预先计算每个设备字段在解包结果中的切片位置
+        self._plan = []; pos = 6
+        for dev_id, fields in schema.devices:
+            names = tuple(name for name, _ in fields)
+            self._plan.append((dev_id, pos, slice(pos + 1, pos + 1 + len(names)), names))
+            pos += 1 + len(names)
+
+    def decode(self, data):
+        """
+        :return: 状态字典；schema 帧返回 None。
+        :raises ValueError: 帧头无效、版本不匹配或 schema 尚未协商。
+        """
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            return data
+        magic, version, kind, schema_id = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"无效的状态帧 (magic={magic!r}, version={version})")
+        if kind == KIND_SCHEMA:
+            self.set_schema(StatusSchema.from_json(bytes(data[HEADER.size:])))
+            return None
+        if self.schema is None or schema_id != self.schema.schema_id:
+            raise ValueError("收到的状态帧与当前 schema 不匹配，可能丢失了 schema 帧。")
+        return self._to_dict(self._unpack(data))
+
+    def decode_values(self, data):
+        """只解包不构建字典，返回扁平的值元组 (供批量/向量化处理使用)。"""
+        return self._unpack(data)
+
+    def _to_dict(self, values):
+        devices = {dev_id: dict(zip(names, values[fields])) for dev_id, online, fields, names in self._plan if values[online]}
+        return {'timestamp': values[4], 'loggable': values[5], 'devices': devices}
+
+
+# --- 记录文件 ---
+class StatusRecorder:
+    """
+    把状态快照以二进制帧追加写入记录文件。
+
+    文件布局: RECORDING_HEADER | schema JSON | 填充到 8 字节对齐 | 帧 | 帧 | ...
+    """
+    def __init__(self, path, schema):
+        self.path = path
+        self.encoder = StatusEncoder(schema)
+        self._file = open(path, 'wb')
+        header = RECORDING_HEADER.pack(RECORDING_MAGIC, FORMAT_VERSION, len(schema.json)) + schema.json
+        header += b'\0' * (-len(header) % 8)
+        self._file.write(header)
+        self.data_offset = len(header)
+        self.frames_written = 0
+
+    def write(self, status):
+        self.write_frame(self.encoder.encode(status))
+
+    def write_frame(self, frame):
+        self._file.write(frame)
+        self.frames_written += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed: self._file.close()
+
+
+def read_recording_header(f):
+    """
+    读取记录文件头。
+
+    :return: (schema, data_offset)，data_offset 为第一帧在文件中的字节偏移。
+    """
+    raw = f.read(RECORDING_HEADER.size)
+    magic, version, schema_len = RECORDING_HEADER.unpack(raw)
+    if magic != RECORDING_MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"不是有效的状态记录文件 (magic={magic!r}, version={version})")
+    schema = StatusSchema.from_json(f.read(schema_len))
+    offset = RECORDING_HEADER.size + schema_len
+    return schema, offset + (-offset % 8)
+
+
+def iter_recording(path):
+    """按顺序解码一个记录文件中的全部快照；末尾不完整的帧会被忽略。"""
+    with open(path, 'rb') as f:
+        schema, offset = read_recording_header(f)
+        decoder = StatusDecoder(schema)
+        f.seek(offset)
+        size = schema.frame_size
+        while True:
+            frame = f.read(size)
+            if len(frame) < size: return
+            yield decoder.decode(frame)
@@ -1,40 +1,96 @@
 # file: system_controller.py (V2.4 - 添加全局电源控制)
 
+import os
 import time
-import threading
+import logging
 from queue import Empty
 
-from kamoer_pump_controller import KamoerPeristalticPump
-from plunger_pump_controller import OushishengPlungerPump
-from power_supply_controller import GPD4303SPowerSupply
-
-def device_factory(config):
-    """一个通用的设备工厂，可以创建泵或电源。"""
-    device_type = config['type'].lower()
-    if device_type == 'kamoer':
-        return KamoerPeristalticPump(port=config['port'], unit_address=config['address'])
-    elif device_type == 'oushisheng':
-        return OushishengPlungerPump(port=config['port'], unit_address=config['address'])
-    elif device_type == 'gpd_4303s':
-        return GPD4303SPowerSupply(port=config['port'])
-    else:
-        raise ValueError(f"未知的设备类型: {device_type}")
+from status_codec import StatusSchema, StatusEncoder, StatusRecorder, ClockAnchor, SAMPLE_TIME_FIELD
+from log_pipeline import get_logger, setup_logging, shutdown_logging
+from integrators import IntegratorBank, DEFAULT_STATE_DIR
+from device_registry import DeviceRegistry
+import driver_registry
+from driver_registry import ROUTING_KEYS
+from timer_wheel import TimerWheel
+from alarm_engine import AlarmEngine
+from controller_checkpoint import ControllerCheckpoint, SetpointTracker
+
+logger = get_logger(__name__)
+INTEGRATOR_SAVE_INTERVAL = 10.0     # 累计量写入状态文件的间隔 (秒)
+PROTOCOL_STEP_INTERVAL = 0.5       # 协议中相邻两条指令之间的间隔 (秒)
+STATUS_UPDATE_INTERVAL = 1.0       # 状态轮询/发布的间隔 (秒)
+CHECKPOINT_INTERVAL = 1.0          # 检查点的写入间隔 (秒)；执行过指令后最快每 CHECKPOINT_MIN_INTERVAL 写入一次
+CHECKPOINT_MIN_INTERVAL = 0.2
+SCHEDULE_KEYS = ('delay_seconds', 'start_at', 'timer_id')
+# 启动/设定类指令：执行后解除作用于该设备的报警锁存；报警联锁触发时取消它们 (及 run_protocol) 尚未执行的定时任务
+START_COMMANDS = frozenset({'start_pump', 'set_pump_params', 'set_power_voltage', 'set_power_current', 'set_power_output',
+                            'set_channel_output', 'open_main_power'})
+
+def _is_start(cmd_type, params):
+    """启动/设定类指令 (关闭输出的 set_channel_output / set_power_output 除外)。"""
+    return cmd_type in START_COMMANDS and params.get('enable', True) is not False
+
+def device_factory(config, simulate=False):
+    """
+    一个通用的设备工厂，可以创建泵或电源；设备类型、驱动类和构造参数都登记在 driver_registry 中。
+    驱动模块在这里按需导入：控制器子进程只加载本系统集实际用到的驱动 (例如没有电源时不导入 pyvisa)，
+    UI 进程构造 SystemController 时也不会加载任何驱动。
+    """
+    return driver_registry.create_device(config, simulate=simulate)
 
 class SystemController:
-    def __init__(self, device_configs, command_queue, status_queue, log_queue):
+    def __init__(self, device_configs, command_queue, status_queue, log_queue, binary_status=False, record_dir=None, simulate=None,
+                 heartbeat=None, checkpoint=False, resume=None):
         self.device_configs = device_configs
+        # simulate=None 时由环境变量 MPS_SIMULATE 决定 (在创建控制器的进程中读取)
+        self.simulate = driver_registry.simulation_requested() if simulate is None else simulate
+        # 设备配置编译为注册表 (同时校验重复 id / 地址冲突)，之后按 id、类型的查找都不再遍历配置
+        self.registry = DeviceRegistry.from_devices(device_configs)
+        self.power_device = None
+        self.power_id = None
+        # 指令查找表：控制器级指令在这里固定，设备指令在设备连接后按 driver_registry 的登记解析为 (设备, 指令) -> 绑定方法
+        self._controller_commands = {'open_main_power': self._cmd_open_main_power, 'close_main_power': self._cmd_close_main_power,
+                                     'reset_integrators': self._cmd_reset_integrators, 'set_channel_output': self._cmd_set_channel_output,
+                                     'run_protocol': self._cmd_run_protocol, 'stop_all': self._cmd_stop_all, 'shutdown': self._cmd_shutdown,
+                                     'cancel_timer': self._cmd_cancel_timer}
+        self._device_commands = {}
+        self._device_command_types = frozenset()
         self.command_queue = command_queue
         self.status_queue = status_queue
         self.log_queue = log_queue
         self.devices = {}
         self._running = True
-        self.channel_timers = {}
-        self.log_interval = 30.0
-        self.last_log_time = 0
+        # 所有定时动作 (通道定时关闭、泵定时停止、延时指令、协议步骤) 共用一个定时器轮，在控制器进程中设备连接后创建
+        self.timers = None
+        self._protocol_runs = 0
+        self._protocol_tags = {}          # 协议运行编号 -> run_tag (实验编排器据此识别自己的协议何时结束)
+        # binary_status=True 时状态快照以 status_codec 的二进制帧发布，schema 在会话开始时发送一次
+        self.binary_status = binary_status
+        self.status_encoder = None
+        # 会话时钟锚点：快照与每台设备读取的时间都由单调时钟推算，系统时间调整不会让时间轴跳变
+        self.clock = None
+        # record_dir 不为空时，每个快照都以同样的二进制帧追加写入该目录下的运行记录文件
+        self.record_dir = record_dir
+        self.recorder = None
+        # 每个控制器进程写入自己的滚动日志文件; log_queue 仅保留用于发送结束标记 "STOP"
+        self.log_name = f"controller_{device_configs[0]['id']}" if device_configs else "controller"
+        if self.simulate: self.log_name += "_sim"   # 模拟运行的日志、记录和累计量与真实运行分开存放
+        # 累计体积/电荷在每个样本上增量积分，并持久化到 state 目录，重启后继续累加
+        self.integrators = IntegratorBank(device_configs, os.path.join(DEFAULT_STATE_DIR, f"{self.log_name}_integrators.json"))
+        # 设备配置中的报警/联锁规则 (写法有误时在这里就抛出 ConfigError)；每个样本读取后立即求值，触发时直接执行联锁动作
+        self.alarms = AlarmEngine.from_device_configs(device_configs)
+        self._interlocking = False         # 正在执行联锁动作 (这些指令不解除报警锁存)
+        # 由 ControllerSupervisor 监护时: heartbeat 为共享的 multiprocessing.Value，主循环每次迭代写入 time.monotonic()；
+        # checkpoint=True 时定期写入检查点 (controller_checkpoint.py)；resume 为重启原因，不为 None 时从检查点恢复
+        self.heartbeat = heartbeat
+        self.checkpoint = ControllerCheckpoint(DEFAULT_STATE_DIR, self.log_name) if checkpoint else None
+        self.resume = resume
+        self.setpoints = SetpointTracker(self.registry)
+        self._checkpoint_dirty = False
 
-    def _log(self, message):
-        print(message)
-        if self.log_queue: self.log_queue.put(message)
+    def _log(self, message, level=logging.INFO):
+        # 只把记录交给后台写线程，控制循环的时序不再受控制台/磁盘速度影响
+        logger.log(level, message)
 
     def _setup_devices(self):
         self._log(f"后台进程：正在设置动态分配的设备...")
@@ -44,156 +100,389 @@ class SystemController:
             dev_id = config['id']
             try:
                 self._log(f" -> 正在创建设备: {dev_id} ({config['type']})")
-                device = device_factory(config)
+                device = device_factory(config, simulate=self.simulate)
                 self._log(f" -> 正在连接 {dev_id}...")
                 if device.connect():
                     successful_devices[dev_id] = device
                     self._log(f" -> 设备 {dev_id} 连接成功。")
                 else:
                     failed_devices.append(dev_id)
-                    self._log(f" -> !!! 设备 {dev_id} 连接失败 !!!")
+                    self._log(f" -> !!! 设备 {dev_id} 连接失败 !!!", logging.ERROR)
             except Exception as e:
                 failed_devices.append(dev_id)
-                self._log(f" -> !!! 设备 {dev_id} 初始化或连接时发生严重错误: {e} !!!")
+                self._log(f" -> !!! 设备 {dev_id} 初始化或连接时发生严重错误: {e} !!!", logging.ERROR)
         self.devices = successful_devices
+        self.timers = self._create_timers()
+        power_entry = next((e for e in self.registry if e.is_power_supply and e.id in self.devices), None)
+        self.power_device = self.devices[power_entry.id] if power_entry else None
+        self.power_id = power_entry.id if power_entry else None
+        for dev_id, device in self.devices.items():
+            for command_type, handler in driver_registry.resolve_commands(device, driver_registry.get_driver(self.registry.get(dev_id).config)).items():
+                self._device_commands[(dev_id, command_type)] = handler
+        self._device_command_types = frozenset(command_type for _, command_type in self._device_commands)
         if not self.devices:
-            self._log("后台进程：错误！没有任何设备连接成功，进程将退出。")
+            self._log("后台进程：错误！没有任何设备连接成功，进程将退出。", logging.ERROR)
             if self.status_queue: self.status_queue.put({'error': '没有任何设备连接成功！请检查硬件连接和配置。'})
             return False
         if failed_devices:
-            self._log(f"后台进程：警告！以下设备未能连接成功: {', '.join(failed_devices)}")
+            self._log(f"后台进程：警告！以下设备未能连接成功: {', '.join(failed_devices)}", logging.WARNING)
             if self.status_queue: self.status_queue.put({'info': f"警告：以下设备未能连接成功，相关功能将不可用：\n{', '.join(failed_devices)}"})
+        self.clock = ClockAnchor.now()
+        schema = StatusSchema.from_device_configs([c for c in self.device_configs if c['id'] in self.devices], clock=self.clock)
+        if self.binary_status:
+            self.status_encoder = StatusEncoder(schema)
+            self.status_queue.put(self.status_encoder.encode_schema())
+        if self.record_dir:
+            self._open_recorder(schema)
         self._log("后台进程：设备连接阶段完成，系统将继续运行。")
         return True
 
+    def _create_timers(self):
+        """创建定时器 (dry_run 用虚拟时钟上的定时器替换)。"""
+        return TimerWheel(name=f"{self.log_name}-timers").start()
+
+    def _open_recorder(self, schema):
+        try:
+            os.makedirs(self.record_dir, exist_ok=True)
+            path = os.path.join(self.record_dir, f"{self.log_name}_{time.strftime('%Y%m%d_%H%M%S')}.mpsrec")
+            self.recorder = StatusRecorder(path, schema)
+            self._log(f"后台进程：运行数据将记录到 {path}")
+        except OSError as e:
+            self._log(f"后台进程：无法创建运行记录文件: {e}", logging.ERROR)
+
     def run(self):
+        setup_logging(self.log_name)
+        try:
+            self._run()
+        except Exception:
+            # 未处理的异常 (例如轮询状态时驱动抛出的异常；单条指令的异常在 _process_command 中处理) 使进程以非零退出码结束，由 ControllerSupervisor 重启
+            logger.exception("后台进程：控制器异常退出")
+            raise
+        finally:
+            shutdown_logging()
+
+    def _run(self):
         if not self._setup_devices():
             if self.log_queue: self.log_queue.put("STOP")
             return
-        status_update_interval = 1.0; last_status_time = time.time(); self.last_log_time = time.time()
+        if self.checkpoint:
+            if self.resume is not None: self._resume_from_checkpoint()
+            else: self.checkpoint.discard()
+        # 每个轮询周期的快照都标记为 loggable，由 UI 端全速率记录；显示/导出的重采样在查询时进行
+        status_update_interval = STATUS_UPDATE_INTERVAL; last_status_time = time.time(); last_save_time = last_checkpoint_time = time.monotonic()
         while self._running:
+            if self.heartbeat is not None: self.heartbeat.value = time.monotonic()
+            # 阻塞等待指令直到下一次状态发布，定时器轮放入的指令到达后立即执行 (不再有 50 ms 的轮询间隔)
             try:
-                command = self.command_queue.get_nowait()
+                command = self.command_queue.get(timeout=max(0.0, last_status_time + status_update_interval - time.time()))
                 self._process_command(command)
             except Empty: pass
             current_time = time.time()
             if current_time - last_status_time >= status_update_interval:
-                loggable = False
-                if current_time - self.last_log_time >= self.log_interval:
-                    loggable = True; self.last_log_time = current_time
-                self._publish_status(loggable)
+                self._publish_status(loggable=True)
                 last_status_time = current_time
-            time.sleep(0.05)
+            if time.monotonic() - last_save_time >= INTEGRATOR_SAVE_INTERVAL:
+                self.integrators.save(); last_save_time = time.monotonic()
+            if self.checkpoint and time.monotonic() - last_checkpoint_time >= (CHECKPOINT_MIN_INTERVAL if self._checkpoint_dirty else CHECKPOINT_INTERVAL):
+                self._save_checkpoint(); last_checkpoint_time = time.monotonic()
         self._shutdown()
         if self.log_queue: self.log_queue.put("STOP")
 
     def _process_command(self, command):
+        """
+        执行一条指令。参数缺失或取值错误 (以及驱动在执行中抛出的异常) 只让这条指令失败并上报 error，
+        不会结束控制器进程 (否则几条错误指令就会耗尽 ControllerSupervisor 的重启次数)。
+        """
         cmd_type = command.get('type')
         params = command.get('params', {})
         self._log(f"后台进程：收到指令: {cmd_type}，参数: {params}")
-        
-        # 对于全局指令，device_id可能不存在，但我们需要找到电源设备
-        power_device = next((dev for dev in self.devices.values() if isinstance(dev, GPD4303SPowerSupply)), None)
+        try:
+            if not isinstance(params, dict): raise TypeError(f"params 必须是对象，收到 {type(params).__name__}")
+            self._dispatch_command(cmd_type, params)
+        except Exception as e:
+            error_msg = f"指令失败：{cmd_type} 执行出错: {type(e).__name__}: {e}"
+            logger.exception("后台进程：%s", error_msg); self.status_queue.put({'error': error_msg})
 
+    def _dispatch_command(self, cmd_type, params):
         device_id = params.get('pump_id') or params.get('device_id')
         if device_id and device_id not in self.devices:
             error_msg = f"指令失败：设备 '{device_id}' 未连接或初始化失败。"
-            self._log(error_msg); self.status_queue.put({'error': error_msg}); return
-        target_device = self.devices.get(device_id)
-        
-        # ★★★ 核心修改 1: 新增全局电源控制指令 ★★★
-        if cmd_type == 'open_main_power':
-            if power_device:
-                power_device.set_output(True)
-            return
-        elif cmd_type == 'close_main_power':
-            if power_device:
-                power_device.set_voltage(1, 0.0)
-                power_device.set_voltage(2, 0.0)
-                power_device.set_output(False)
+            self._log(error_msg, logging.ERROR); self.status_queue.put({'error': error_msg}); return
+        if 'delay_seconds' in params or 'start_at' in params:
+            self._schedule_command(cmd_type, device_id, params); return
+
+        handler = self._controller_commands.get(cmd_type)
+        if handler is not None:
+            handler(device_id, params); self._note_command(cmd_type, device_id, params); return
+        entry = self._device_commands.get((device_id, cmd_type))
+        if entry is None:
+            if cmd_type not in self._device_command_types:
+                self._log(f"后台进程：收到未知指令: {cmd_type}", logging.WARNING)
+            else:
+                error_msg = f"指令失败：未找到目标设备 '{device_id}'。" if device_id is None else f"指令失败：设备 '{device_id}' 不支持指令 {cmd_type}。"
+                self._log(error_msg, logging.ERROR); self.status_queue.put({'error': error_msg})
             return
+        method, arg_names = entry
+        if arg_names is None: method(**{k: v for k, v in params.items() if k not in ROUTING_KEYS})
+        else: method(*[params[name] for name in arg_names])
+        self._note_command(cmd_type, device_id, params)
+        if cmd_type == 'start_pump' and params.get('auto_stop_seconds', 0) > 0:
+            self._arm(('pump_stop', device_id), params['auto_stop_seconds'], {'type': 'stop_pump', 'params': {'pump_id': device_id}},
+                      f"泵 {device_id} 将在 {params['auto_stop_seconds']} 秒后自动停止。")
+        elif cmd_type in ('start_pump', 'stop_pump'):
+            self.timers.cancel(('pump_stop', device_id))
+
+    def _note_command(self, cmd_type, device_id, params):
+        """指令执行成功后记录设定值，并让主循环尽快写入检查点。"""
+        self._checkpoint_dirty = True
+        if self.checkpoint: self.setpoints.record(cmd_type, device_id, params, self.devices, self.power_id)
+        if self.alarms and not self._interlocking and _is_start(cmd_type, params): self.alarms.rearm(device_id or self.power_id)
+
+    # --- 检查点 (由 ControllerSupervisor 监护时启用) ---
+    def _save_checkpoint(self):
+        now = time.time(); timers = []
+        for timer in self.timers.pending():
+            due = now + timer.remaining
+            if timer.callback == self._enqueue: timers.append({'key': timer.key, 'due': due, 'command': timer.args[0]})
+            elif timer.callback == self._protocol_step: timers.append({'key': timer.key, 'due': due, 'protocol_run': timer.args[0], 'index': timer.args[2]})
+        try:
+            self.checkpoint.save(self.setpoints.setpoints, timers, self._protocol_runs, self.integrators.snapshot(), self._protocol_tags)
+        except (OSError, TypeError, ValueError) as e:
+            self._log(f"后台进程：写入检查点失败: {e}", logging.WARNING)
+        self._checkpoint_dirty = False
 
-        if not target_device and cmd_type not in ['stop_all', 'shutdown', 'run_protocol']:
-            error_msg = f"指令失败：未找到目标设备 '{device_id}'。"; self._log(error_msg); self.status_queue.put({'error': error_msg}); return
-        
-        filtered_params = {k: v for k, v in params.items() if k not in ['pump_id', 'device_id', 'auto_off_seconds']}
-        
-        if cmd_type == 'start_pump': target_device.start(**filtered_params)
-        elif cmd_type == 'stop_pump': target_device.stop()
-        elif cmd_type == 'set_pump_params': target_device.set_parameters(**filtered_params)
-        elif cmd_type == 'set_power_voltage': target_device.set_voltage(params['channel'], params['voltage'])
-        elif cmd_type == 'set_power_current': target_device.set_current(params['channel'], params['current'])
-        elif cmd_type == 'set_channel_output':
-            channel = params.get('channel'); enable = params.get('enable')
-            if channel in self.channel_timers and self.channel_timers[channel].is_alive():
-                 self._log(f"后台进程: 检测到 CH{channel} 的新操作，正在停止旧的定时关闭任务。")
-            if enable:
-                target_device.set_output(True)
+    def _resume_from_checkpoint(self):
+        """
+        崩溃重启后从检查点恢复：恢复累计量；逐台读取实时状态，只对与设定值不一致的设备重新下发设定值
+        (仍在按设定运行的设备不发送任何指令)；按原到期时间重新安排定时任务和协议的下一步。
+        恢复成功以 'restart' 事件通知窗口；没有可用的检查点时才作为 'error' 上报。
+        """
+        data = self.checkpoint.load()
+        if data is None:
+            self._log(f"后台进程：控制器{self.resume}，但没有可用的检查点，按全新启动运行。", logging.WARNING)
+            self.status_queue.put({'error': f"控制器{self.resume}，已重启，但没有可用的检查点，设定值与协议位置未能恢复。"}); return
+        self.integrators.restore(data.get('integrators', {}))
+        self.setpoints.setpoints = data.get('setpoints', {})
+        reapplied = []
+        for dev_id, device in self.devices.items():
+            try:
+                if self.setpoints.satisfied(dev_id, device.get_status()): continue
+                self.setpoints.apply(dev_id, device); reapplied.append(dev_id)
+            except Exception as e:
+                self._log(f"后台进程：恢复设备 {dev_id} 的设定值失败: {e}", logging.ERROR)
+        self._protocol_runs = data.get('protocol_runs', 0)
+        self._protocol_tags = {int(run_id): tag for run_id, tag in data.get('protocol_tags', {}).items()}
+        now = time.time(); protocols = {}; rearmed = 0
+        for timer in data.get('timers', []):
+            delay = max(0.0, timer['due'] - now)
+            if 'command' in timer:
+                self.timers.schedule(delay, self._enqueue, timer['command'], key=timer['key'])
             else:
-                target_device.set_voltage(channel, 0.0)
-            if enable and 'auto_off_seconds' in params:
-                duration_seconds = params['auto_off_seconds']
-                if duration_seconds > 0:
-                    timer_thread = threading.Thread(target=self._channel_off_timer, args=(duration_seconds, device_id, channel)); timer_thread.daemon = True; self.channel_timers[channel] = timer_thread; timer_thread.start()
-        elif cmd_type == 'run_protocol':
-            threading.Thread(target=self._execute_protocol, args=(params.get('protocol', []),), daemon=True).start()
-        elif cmd_type == 'set_log_interval':
-            self.log_interval = params.get('interval', 30.0)
-            self._log(f"后台进程：数据记录间隔已更新为 {self.log_interval} 秒。")
-        elif cmd_type == 'stop_all':
-            for dev in self.devices.values():
-                if hasattr(dev, 'stop'): dev.stop()
-                if hasattr(dev, 'set_output'): dev.set_output(False)
-        elif cmd_type == 'shutdown': self._running = False
-        else: self._log(f"后台进程：收到未知指令: {cmd_type}")
-
-    def _channel_off_timer(self, duration_seconds, device_id, channel):
-        self._log(f"后台进程：CH{channel} 定时关闭任务已启动，将在 {duration_seconds} 秒后关闭。")
-        time.sleep(duration_seconds)
-        if self._running:
-            self._log(f"后台进程：CH{channel} 的 {duration_seconds} 秒时间到，正在发送关闭指令。")
-            self.command_queue.put({'type': 'set_channel_output', 'params': {'device_id': device_id, 'channel': channel, 'enable': False}})
+                run_id = timer['protocol_run']
+                if run_id not in protocols: protocols[run_id] = self.checkpoint.load_protocol(run_id)
+                if protocols[run_id] is None:
+                    self._log(f"后台进程：协议 {run_id} 的步骤表丢失，无法继续执行。", logging.ERROR); continue
+                self.timers.schedule(delay, self._protocol_step, run_id, protocols[run_id], timer['index'], key=timer['key'])
+            rearmed += 1
+        message = (f"控制器{self.resume}，已从 {now - data.get('saved_at', now):.1f} 秒前的检查点重启恢复：重新下发设定值的设备: {', '.join(reapplied) or '无'}；"
+                   f"恢复定时任务/协议步骤 {rearmed} 个。")
+        self._log(f"后台进程：{message}", logging.WARNING)
+        self.status_queue.put({'restart': message})
+
+    # --- 定时动作 (全部由 self.timers 触发，触发时把指令放回指令队列，由主循环串行执行) ---
+    def _enqueue(self, command):
+        if self._running: self.command_queue.put(command)
+
+    def _arm(self, key, delay, command, message=None):
+        """以 key 设置一个定时指令；同 key 的旧定时器被取消 (重新计时)。"""
+        if self.timers.cancel(key): self._log(f"后台进程：已取消旧的定时任务 {key}。")
+        self.timers.schedule(delay, self._enqueue, command, key=key)
+        if message: self._log(f"后台进程：{message}")
+
+    def _schedule_command(self, cmd_type, device_id, params):
+        """
+        延时执行指令：params 中的 delay_seconds (秒) 或 start_at (time.time() 时间戳) 指定执行时间。
+        timer_id 可选，默认按 (设备, 指令类型) 区分，同一设备的同一指令再次延时设置时替换尚未执行的旧设定。
+        """
+        delay = params['start_at'] - time.time() if 'start_at' in params else params['delay_seconds']
+        key = params.get('timer_id') or ('delayed', device_id, cmd_type)
+        command = {'type': cmd_type, 'params': {k: v for k, v in params.items() if k not in SCHEDULE_KEYS}}
+        self._arm(key, max(0.0, delay), command, f"指令 {cmd_type} 将在 {max(0.0, delay):.3f} 秒后执行 (定时器 {key})。")
+
+    # --- 控制器级指令 (签名统一为 (device_id, params)) ---
+    def _cmd_open_main_power(self, device_id, params):
+        if self.power_device:
+            self.power_device.set_output(True)
+
+    def _cmd_close_main_power(self, device_id, params):
+        if self.power_device:
+            self.power_device.set_voltage(1, 0.0)
+            self.power_device.set_voltage(2, 0.0)
+            self.power_device.set_output(False)
+
+    def _cmd_reset_integrators(self, device_id, params):
+        self.integrators.reset(device_id); self.integrators.save()
+        self._log(f"后台进程：已清零累计量 ({device_id or '全部设备'})。")
+
+    def _cmd_set_channel_output(self, device_id, params):
+        target_device = self.devices.get(device_id)
+        if target_device is None:
+            error_msg = f"指令失败：未找到目标设备 '{device_id}'。"; self._log(error_msg, logging.ERROR); self.status_queue.put({'error': error_msg}); return
+        channel = params.get('channel'); enable = params.get('enable')
+        # 通道上的任何新操作都会取消该通道尚未触发的定时关闭
+        key = ('channel_off', device_id, channel)
+        if self.timers.cancel(key): self._log(f"后台进程: 检测到 CH{channel} 的新操作，已取消旧的定时关闭任务。")
+        if enable:
+            target_device.set_output(True)
         else:
-            self._log(f"后台进程：CH{channel} 定时任务时间到，但主程序已关闭，取消自动关机。")
+            target_device.set_voltage(channel, 0.0)
+        if enable and params.get('auto_off_seconds', 0) > 0:
+            duration_seconds = params['auto_off_seconds']
+            self._arm(key, duration_seconds, {'type': 'set_channel_output', 'params': {'device_id': device_id, 'channel': channel, 'enable': False}},
+                      f"CH{channel} 定时关闭任务已启动，将在 {duration_seconds} 秒后关闭。")
+
+    def _cmd_run_protocol(self, device_id, params):
+        self._protocol_runs += 1
+        self._log(f"开始执行自动化协议...")
+        protocol = list(params.get('protocol', []))
+        if params.get('run_tag') is not None: self._protocol_tags[self._protocol_runs] = params['run_tag']
+        if self.checkpoint:
+            try:
+                self.checkpoint.save_protocol(self._protocol_runs, protocol)
+            except (OSError, TypeError, ValueError) as e:
+                self._log(f"后台进程：写入协议步骤表失败 (崩溃后无法恢复该协议): {e}", logging.WARNING)
+        self._protocol_step(self._protocol_runs, protocol, 0)
+
+    def _cmd_stop_all(self, device_id, params):
+        # 急停同时取消所有尚未触发的定时动作 (定时开启、延时设定值、协议后续步骤)，避免停机后又被重新启动
+        cancelled = self._cancel_timers(self.timers.pending(), '自动化协议已被急停中断。')
+        if cancelled: self._log(f"后台进程：急停，已取消 {cancelled} 个定时任务。", logging.WARNING)
+        for dev in self.devices.values():
+            if hasattr(dev, 'stop'): dev.stop()
+            if hasattr(dev, 'set_output'): dev.set_output(False)
+
+    def _cancel_timers(self, timers, reason):
+        """
+        取消给定的定时任务；其中的协议 (进行中的后续步骤与尚未开始的定时 run_protocol) 以 reason 按中断上报，
+        带 run_tag 的附上 protocol_done，与协议正常结束的事件格式相同。
+
+        :return: 实际取消的个数。
+        """
+        cancelled = 0
+        for timer in timers:
+            if not self.timers.cancel(timer): continue
+            cancelled += 1
+            if timer.callback == self._protocol_step:
+                outcome = self._protocol_outcome(timer.args[0], aborted=True)
+            elif timer.callback == self._enqueue and timer.args[0]['type'] == 'run_protocol' and timer.args[0]['params'].get('run_tag') is not None:
+                outcome = {'protocol_done': timer.args[0]['params']['run_tag'], 'finished_at': time.time(), 'aborted': True}
+            else: continue
+            if outcome: self.status_queue.put({'info': reason, **outcome})
+        return cancelled
+
+    def _cmd_cancel_timer(self, device_id, params):
+        """取消 timer_id 指定的定时任务；不带 timer_id 时取消全部定时任务。"""
+        timer_id = params.get('timer_id')
+        cancelled = self.timers.cancel(timer_id) if timer_id is not None else self.timers.cancel_all()
+        self._log(f"后台进程：取消定时任务 {timer_id if timer_id is not None else '(全部)'}: {cancelled}")
+
+    def _cmd_shutdown(self, device_id, params):
+        self._running = False
 
     def _publish_status(self, loggable=False):
-        system_status = {'timestamp': time.time(), 'devices': {}, 'loggable': loggable}
+        # 快照时间为开始轮询的时刻；每台设备另带自己那次读取的单调时间 (通讯开始与结束的中点)
+        system_status = {'timestamp': self.clock.wall_now(), 'devices': {}, 'loggable': loggable}
+        if not self.status_encoder: system_status['clock'] = self.clock.to_json()
         for dev_id, dev_obj in self.devices.items():
-            system_status['devices'][dev_id] = dev_obj.get_status()
-        self.status_queue.put(system_status)
+            start = time.monotonic_ns()
+            status = system_status['devices'][dev_id] = dev_obj.get_status()
+            end = time.monotonic_ns(); t_ns = status[SAMPLE_TIME_FIELD] = (start + end) // 2
+            self.integrators.update(dev_id, t_ns / 1e9, status)
+            if self.alarms:
+                fired = self.alarms.evaluate(dev_id, status, t_ns / 1e9)
+                if fired: self._trigger_alarms(fired, end)
+        frame = None
+        if self.status_encoder or self.recorder:
+            frame = (self.status_encoder or self.recorder.encoder).encode(system_status)
+        if self.recorder:
+            self.recorder.write_frame(frame); self.recorder.flush()
+        self.status_queue.put(frame if self.status_encoder else system_status)
+
+    def _trigger_alarms(self, fired, detected_ns):
+        """
+        联锁快速路径：在轮询循环中直接执行规则的动作 (不经过指令队列和 UI)，然后上报报警事件。
+
+        联锁执行时同时取消本系统集尚未执行的协议步骤与定时启动/设定 (与急停相同，协议按中断上报)，
+        避免停下的设备又被协议或定时任务重新启动；联锁自身的指令不解除报警锁存。
+
+        :param detected_ns: 触发样本读取完成的 monotonic_ns 时间，用于测量检测到动作完成的耗时。
+        """
+        alarms = []
+        self._interlocking = True
+        try:
+            for rule, value in fired:
+                for command in rule.actions:
+                    try:
+                        self._process_command(command)
+                    except Exception as e:
+                        self._log(f"后台进程：报警 {rule.name} 的联锁动作 {command.get('type')} 执行失败: {e}", logging.ERROR)
+                latency = (time.monotonic_ns() - detected_ns) / 1e9
+                self.alarms.record_latency(latency); alarms.append((rule, value, latency))
+        finally:
+            self._interlocking = False
+        starts = [timer for timer in self.timers.pending() if timer.callback == self._protocol_step
+                  or (timer.callback == self._enqueue and (timer.args[0]['type'] == 'run_protocol' or _is_start(timer.args[0]['type'], timer.args[0].get('params', {}))))]
+        cancelled = self._cancel_timers(starts, '自动化协议已被报警联锁中断。')
+        if cancelled: self._log(f"后台进程：报警联锁，已取消 {cancelled} 个协议步骤/定时启动任务。", logging.WARNING)
+        for rule, value, latency in alarms:
+            actions = ', '.join(command['type'] for command in rule.actions) or '无'
+            message = f"报警 [{rule.name}]: {rule.describe(value)}；已执行联锁动作: {actions} (检测到动作完成 {latency * 1000:.2f} ms)"
+            self._log(f"后台进程：{message}", logging.WARNING)
+            self.status_queue.put({'error': message, 'alarm': {'name': rule.name, 'device_id': rule.device_id, 'field': rule.field, 'value': value,
+                                                               'actions': [command['type'] for command in rule.actions], 'latency_s': latency}})
 
     def _shutdown(self):
         self._log(f"后台进程：正在安全关闭所有设备...")
+        if self.alarms: self._log(f"后台进程：{self.alarms.stats_text()}")
         self._running = False
+        if self.timers: self.timers.stop()
         for device in self.devices.values():
             if hasattr(device, 'is_connected') and device.is_connected:
                 device.disconnect()
+        if self.recorder: self.recorder.close()
+        self.integrators.save()
+        if self.checkpoint: self.checkpoint.discard()
         self._log(f"后台进程：已安全关闭。")
 
-    def _execute_protocol(self, protocol):
-        self._log(f"开始执行自动化协议...")
+    def _protocol_step(self, run_id, protocol, index):
+        """执行协议的第 index 步，并通过定时器轮安排下一步 (延时步骤不再占用线程)；急停会取消后续步骤。"""
         try:
-            for step in protocol:
-                if not self._running:
-                    self._log("协议执行被中断。"); break
-                command_type = step.get('command')
-                if not command_type: continue
-                if command_type == 'delay':
-                    duration = step.get('duration', 0)
-                    self._log(f" -> 协议步骤：延时 {duration} 秒")
-                    time.sleep(duration)
-                else:
-                    self._log(f" -> 协议步骤：发送指令 {command_type}")
-                    params = {k: v for k, v in step.items() if k != 'command'}
-                    if 'pump_id' not in params and 'device_id' not in params:
-                        pump_ids = [dev_id for dev_id in self.devices.keys() if 'pump' in dev_id]
-                        if len(pump_ids) == 1: params['pump_id'] = pump_ids[0]
-                    command_to_process = {'type': command_type, 'params': params}
-                    self.command_queue.put(command_to_process)
-                    time.sleep(0.5) 
-            if self._running:
-                self.status_queue.put({'info': '自动化协议执行完毕。'})
-                self._log(f"自动化协议执行完毕。")
+            if not self._running:
+                self._log("协议执行被中断。"); return
+            while index < len(protocol) and not protocol[index].get('command'): index += 1
+            if index >= len(protocol):
+                self.status_queue.put({'info': '自动化协议执行完毕。', **self._protocol_outcome(run_id)})
+                if self.checkpoint: self.checkpoint.drop_protocol(run_id)
+                self._log(f"自动化协议执行完毕。"); return
+            step = protocol[index]; command_type = step['command']
+            if command_type == 'delay':
+                duration = step.get('duration', 0)
+                self._log(f" -> 协议步骤：延时 {duration} 秒")
+                delay = duration
+            else:
+                self._log(f" -> 协议步骤：发送指令 {command_type}")
+                params = {k: v for k, v in step.items() if k != 'command'}
+                if 'pump_id' not in params and 'device_id' not in params:
+                    pump_ids = [dev_id for dev_id in self.devices.keys() if 'pump' in dev_id]
+                    if len(pump_ids) == 1: params['pump_id'] = pump_ids[0]
+                self._enqueue({'type': command_type, 'params': params})
+                delay = PROTOCOL_STEP_INTERVAL
+            self.timers.schedule(delay, self._protocol_step, run_id, protocol, index + 1, key=('protocol', run_id))
         except Exception as e:
-            error_msg = f"协议执行出错: {e}"; self.status_queue.put({'error': error_msg}); self._log(error_msg)
+            error_msg = f"协议执行出错: {e}"; self.status_queue.put({'error': error_msg, **self._protocol_outcome(run_id, aborted=True)}); self._log(error_msg, logging.ERROR)
+
+    def _protocol_outcome(self, run_id, aborted=False):
+        """协议结束事件的附加字段：带 run_tag 提交的协议附上 protocol_done (标签)、finished_at 与 aborted，其它协议为空。"""
+        tag = self._protocol_tags.pop(run_id, None)
+        return {} if tag is None else {'protocol_done': tag, 'finished_at': time.time(), 'aborted': aborted}
 
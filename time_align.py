@@ -0,0 +1,115 @@
+# file: time_align.py (采样时间戳与多设备时间对齐)
+'''
+控制器对每台设备的每次读取都在实际通讯时用 time.monotonic_ns() 打时间戳 (状态字段 t_ns，取通讯开始与结束的中点)，
+墙上时钟只在会话开始时与单调时钟配对一次 (status_codec.ClockAnchor，随 schema 发送并写入记录文件)。
+因此系统时间被调整 (NTP 校时、手动改时间) 不会让时间轴倒退或跳变，同一快照中各设备的读取时间也不再被抹成同一个值。
+
+    - ClockAnchor.to_wall(t_ns): 单调时间 -> 墙上时间 (秒)，支持 NumPy 数组；
+    - sample_times(): 从 StatusBatch 中取出某台设备的墙上采样时间 (没有 t_ns 时退回快照时间戳)；
+    - align(): 把多条各自采样时间不同的序列插值到同一个时间网格上 (线性或保持前值，可限制最大插值间隔)，
+      用于把压力突变与电流变化放在同一时间轴上比较，或导出等间隔的数据表；
+    - LiveAligner: 窗口的实时曲线与导出 (SampleStore) 按参考设备的采样时间逐批对齐其它设备的数据。
+'''
+
+import numpy as np
+
+from status_codec import SAMPLE_TIME_FIELD
+
+DEFAULT_MAX_GAP = 5.0           # 实时对齐时，相邻两次有效采样间隔超过它 (秒) 视为设备离线，不在其间插值
+
+
+def sample_times(batch, device_id, anchor):
+    """
+    一批快照中某台设备的墙上采样时间，形状 (n,)。
+
+    :param batch: status_batch.StatusBatch。
+    :param anchor: 会话的 ClockAnchor；为 None 或设备没有 t_ns 字段 (旧记录) 时返回快照时间戳。
+    """
+    if anchor is None: return batch.timestamps
+    t_ns = batch.select([(device_id, SAMPLE_TIME_FIELD)], default=np.nan)[0]
+    return np.where(np.isnan(t_ns), batch.timestamps, anchor.to_wall(t_ns))
+
+
+def common_grid(t0, t1, step):
+    """[t0, t1] 上间隔为 step 的等间隔时间网格。"""
+    n = int(np.floor((t1 - t0) / step + 1e-9)) + 1
+    return t0 + np.arange(max(n, 0)) * step
+
+
+def align(series, grid, method='linear', max_gap=None):
+    """
+    把多条序列插值到同一个时间网格上。
+
+    :param series: [(时间数组, 数值数组), ...]，每条序列的时间须单调递增；数值中的 NaN 视为缺失。
+    :param method: 'linear' 线性插值；'previous' 保持最近一个采样值 (适合开关量、设定值)。
+    :param max_gap: 相邻两个采样间隔超过它 (秒) 时，不在其间插值 (结果为 NaN)。
+    :return: (len(series), len(grid)) 数组，网格点超出某条序列的时间范围时为 NaN。
+    """
+    grid = np.asarray(grid, dtype=np.float64)
+    out = np.full((len(series), len(grid)), np.nan)
+    for row, (t, v) in enumerate(series):
+        t = np.asarray(t, dtype=np.float64); v = np.asarray(v, dtype=np.float64)
+        keep = ~np.isnan(v) & ~np.isnan(t)
+        t, v = t[keep], v[keep]
+        if not len(t): continue
+        right = np.searchsorted(t, grid, side='right')          # grid 落在 t[right-1] 与 t[right] 之间
+        inside = (right > 0) & ((right < len(t)) | (grid == t[-1]))
+        if method == 'previous':
+            out[row, inside] = v[right[inside] - 1]
+        elif method == 'linear':
+            out[row, inside] = np.interp(grid[inside], t, v)
+        else:
+            raise ValueError(f"未知的插值方法: {method}")
+        if max_gap is not None and len(t) > 1:
+            # 落在间隔过大的两个采样之间的网格点置为缺失 (恰好落在采样点上的除外)
+            lo = np.clip(right - 1, 0, len(t) - 2); prev = np.clip(right - 1, 0, len(t) - 1)
+            out[row, inside & (t[lo + 1] - t[lo] > max_gap) & (t[prev] != grid)] = np.nan
+    return out
+
+
+class LiveAligner:
+    """
+    实时数据的对齐: 把连续到来的状态批中若干 (设备, 字段) 对齐到参考设备 (pairs 中的第一台设备) 的采样时间上，
+    供实时曲线与导出使用 (SampleStore 只有一个时间列)。其它设备在参考时刻的值由各自前后两次采样线性插值；
+    还没有后一次采样的参考时刻留到下一批再输出 (最多延迟一个轮询周期)，跨批次的数据因此是连续的。
+    相邻两次有效采样间隔超过 max_gap (设备离线) 时，其间为 NaN。
+
+    :param pairs: [(device_id, field), ...]，第一台设备为参考设备。
+    """
+    def __init__(self, pairs, max_gap=DEFAULT_MAX_GAP):
+        self.pairs = list(pairs)
+        self.max_gap = max_gap
+        devices = list(dict.fromkeys(d for d, _ in self.pairs))
+        self._rows = [(d, [i for i, (dev_id, _) in enumerate(self.pairs) if dev_id == d]) for d in devices]
+        self._times = {d: np.empty(0) for d in devices}
+        self._values = {d: np.empty((len(rows), 0)) for d, rows in self._rows}
+        self._pending = np.empty(0)           # 尚未输出的参考时刻
+
+    def push(self, batch, anchor, mask=None):
+        """
+        加入一批快照。
+
+        :param anchor: 会话的 ClockAnchor (见 sample_times)。
+        :param mask: 可选，只使用其中的快照 (例如 batch.loggable)。
+        :return: (参考时刻数组, (len(pairs), n) 数组)，n 可能为 0。
+        """
+        values = batch.select(self.pairs, default=np.nan)
+        for i, (d, rows) in enumerate(self._rows):
+            t = sample_times(batch, d, anchor); v = values[rows]
+            if mask is not None: t, v = t[mask], v[:, mask]
+            self._times[d] = np.concatenate((self._times[d], t)); self._values[d] = np.concatenate((self._values[d], v), axis=1)
+            if i == 0: self._pending = np.concatenate((self._pending, t))
+        if any(not len(t) for t in self._times.values()): return np.empty(0), np.empty((len(self.pairs), 0))
+        known = min(t[-1] for t in self._times.values())
+        ready = self._pending <= known
+        grid = self._pending[ready]; self._pending = self._pending[~ready]
+        out = np.full((len(self.pairs), len(grid)), np.nan)
+        if len(grid):
+            for d, rows in self._rows:
+                out[rows] = align([(self._times[d], v) for v in self._values[d]], grid, 'linear', self.max_gap)
+        # 只保留下一个参考时刻之前的最后一次采样及其后的数据
+        cutoff = self._pending[0] if len(self._pending) else known
+        for d, _ in self._rows:
+            keep = max(0, int(np.searchsorted(self._times[d], cutoff, side='right')) - 1)
+            self._times[d] = self._times[d][keep:]; self._values[d] = self._values[d][:, keep:]
+        return grid, out
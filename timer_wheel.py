@@ -0,0 +1,220 @@
+# file: timer_wheel.py (控制器的定时器轮)
+'''
+控制器内所有定时动作 (通道定时关闭、泵定时停止、延时设定值、协议步骤与定时启动) 共用的单线程定时器轮。
+
+    - 哈希时间轮: 每个槽对应 tick (默认 1 ms)，共 slots 个槽，覆盖一圈 (默认约 1 s) 内到期的定时器；
+      更远的定时器先放在按到期时间排序的溢出堆中，进入一圈范围后再移入对应的槽。
+      添加、取消都是 O(1) (溢出堆为 O(log n))，上千个待触发定时器也只有一个线程；
+    - 线程只在下一个非空槽 (或溢出堆中最早的定时器进入时间轮) 时醒来，没有定时器时完全休眠；
+    - 定时器可以带 key：用同一个 key 再次 schedule 会先取消旧的定时器 (重新计时)，也可以按 key 取消。
+
+回调在定时器线程中执行，应当只做很轻的工作 (例如把指令放入控制器的指令队列)。
+'''
+
+import math
+import heapq
+import itertools
+import threading
+import time
+
+from log_pipeline import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_TICK = 0.001
+DEFAULT_SLOTS = 1024
+
+
+class Timer:
+    """一个待触发的定时器，由 TimerWheel.schedule 返回。"""
+    __slots__ = ('key', 'due', 'due_tick', 'callback', 'args', 'slot', 'active', '_wheel')
+
+    def __init__(self, wheel, key, due, due_tick, callback, args):
+        self._wheel = wheel
+        self.key = key
+        self.due = due                # time.monotonic() 时间
+        self.due_tick = due_tick
+        self.callback = callback
+        self.args = args
+        self.slot = None              # 所在槽的下标；None 表示在溢出堆中
+        self.active = True
+
+    def cancel(self):
+        return self._wheel.cancel(self)
+
+    @property
+    def remaining(self):
+        return max(0.0, self.due - time.monotonic())
+
+
+class TimerWheel:
+    """
+    单线程定时器轮。
+
+    :param tick: 时间分辨率 (秒)。
+    :param slots: 槽数，tick * slots 为时间轮一圈的跨度。
+    """
+    def __init__(self, tick=DEFAULT_TICK, slots=DEFAULT_SLOTS, name="timer-wheel"):
+        self.tick = tick
+        self.slots = slots
+        self.name = name
+        self._slots = [dict() for _ in range(slots)]
+        self._overflow = []                   # [(due_tick, seq, Timer)]
+        self._keys = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._origin = time.monotonic()
+        self._cursor = 0                      # 已处理到的 tick
+        self._count = 0
+        self._running = False
+        self._thread = None
+        self.fired = 0
+        self.max_lateness = 0.0               # 观测到的最大触发延迟 (秒)
+
+    # --- 生命周期 ---
+    def start(self):
+        with self._cond:
+            if self._running: return self
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, cancel_pending=True):
+        with self._cond:
+            self._running = False
+            if cancel_pending: self._clear()
+            self._cond.notify()
+        if self._thread and self._thread is not threading.current_thread(): self._thread.join(timeout=1)
+
+    # --- 定时器操作 ---
+    def schedule(self, delay, callback, *args, key=None):
+        """delay 秒后在定时器线程中调用 callback(*args)；key 不为 None 时替换同 key 的旧定时器。"""
+        return self.schedule_at(time.monotonic() + max(0.0, delay), callback, *args, key=key)
+
+    def schedule_at(self, due, callback, *args, key=None):
+        """在 time.monotonic() 到达 due 时调用 callback(*args)。"""
+        with self._cond:
+            if key is not None and key in self._keys: self._remove(self._keys[key])
+            due_tick = max(self._cursor + 1, math.ceil((due - self._origin) / self.tick))
+            timer = Timer(self, key, due, due_tick, callback, args)
+            self._insert(timer)
+            if key is not None: self._keys[key] = timer
+            self._count += 1
+            self._cond.notify()
+        return timer
+
+    def cancel(self, timer_or_key):
+        """取消定时器 (Timer 对象或 key)；已触发或不存在时返回 False。"""
+        with self._cond:
+            timer = timer_or_key if isinstance(timer_or_key, Timer) else self._keys.get(timer_or_key)
+            if timer is None or not timer.active: return False
+            self._remove(timer)
+            return True
+
+    def cancel_all(self, predicate=None):
+        """
+        取消全部 (或 key 满足 predicate 的) 定时器。
+
+        :return: 取消的个数。
+        """
+        with self._cond:
+            if predicate is None:
+                count = self._count; self._clear(); return count
+            victims = [t for slot in self._slots for t in slot.values() if predicate(t.key)]
+            victims += [t for _, _, t in self._overflow if t.active and predicate(t.key)]
+            for timer in victims: self._remove(timer)
+            return len(victims)
+
+    def get(self, key):
+        with self._cond:
+            return self._keys.get(key)
+
+    def pending(self):
+        """尚未触发的全部定时器 (按到期时间排序的副本)。"""
+        with self._cond:
+            timers = [t for slot in self._slots for t in slot.values()] + [t for _, _, t in self._overflow if t.active]
+        return sorted(timers, key=lambda t: t.due)
+
+    def __len__(self):
+        return self._count
+
+    # --- 内部实现 (调用方持有 self._cond) ---
+    def _insert(self, timer):
+        if timer.due_tick - self._cursor < self.slots:
+            timer.slot = timer.due_tick % self.slots
+            self._slots[timer.slot][id(timer)] = timer
+        else:
+            timer.slot = None
+            heapq.heappush(self._overflow, (timer.due_tick, next(self._seq), timer))
+
+    def _remove(self, timer):
+        if not timer.active: return
+        timer.active = False
+        if timer.slot is not None: self._slots[timer.slot].pop(id(timer), None)
+        # 溢出堆中的定时器延迟删除: 出堆时跳过 active=False 的项
+        if timer.key is not None and self._keys.get(timer.key) is timer: del self._keys[timer.key]
+        self._count -= 1
+
+    def _clear(self):
+        for slot in self._slots:
+            for timer in slot.values(): timer.active = False
+            slot.clear()
+        for _, _, timer in self._overflow: timer.active = False
+        self._overflow.clear(); self._keys.clear(); self._count = 0
+
+    def _collect_due(self, now_tick):
+        due = []
+        if now_tick - self._cursor >= self.slots:
+            # 线程被长时间阻塞 (例如系统休眠)：直接扫描全部槽
+            for slot in self._slots:
+                for timer in [t for t in slot.values() if t.due_tick <= now_tick]: due.append(timer)
+        else:
+            for t in range(self._cursor + 1, now_tick + 1):
+                slot = self._slots[t % self.slots]
+                if slot: due.extend(slot.values())
+        self._cursor = now_tick
+        while self._overflow and self._overflow[0][0] - self._cursor < self.slots:
+            _, _, timer = heapq.heappop(self._overflow)
+            if not timer.active: continue
+            if timer.due_tick <= self._cursor: due.append(timer)
+            else: self._insert(timer)
+        for timer in due: self._remove(timer)
+        return due
+
+    def _next_wakeup(self):
+        """返回下一次需要醒来的 monotonic 时间；没有待触发的定时器时返回 None。"""
+        if not self._count: return None
+        candidates = []
+        for distance in range(1, self.slots):
+            if self._slots[(self._cursor + distance) % self.slots]:
+                candidates.append(self._cursor + distance); break
+        while self._overflow and not self._overflow[0][2].active: heapq.heappop(self._overflow)
+        if self._overflow: candidates.append(self._overflow[0][0] - self.slots + 1)
+        if not candidates: return None
+        return self._origin + min(candidates) * self.tick
+
+    def _run(self):
+        with self._cond:
+            while self._running:
+                now = time.monotonic()
+                due = self._collect_due(int((now - self._origin) / self.tick))
+                if due:
+                    self._cond.release()
+                    try:
+                        self._fire(due)
+                    finally:
+                        self._cond.acquire()
+                    continue
+                wakeup = self._next_wakeup()
+                self._cond.wait(None if wakeup is None else max(0.0, wakeup - time.monotonic()))
+
+    def _fire(self, timers):
+        now = time.monotonic()
+        for timer in sorted(timers, key=lambda t: t.due):
+            self.max_lateness = max(self.max_lateness, now - timer.due)
+            self.fired += 1
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                logger.error("定时器回调出错 (key=%s): %s", timer.key, e)